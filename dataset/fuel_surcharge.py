@@ -0,0 +1,239 @@
+"""
+Fuel-surcharge (FSC) band tables from scraped carrier pages.
+
+Carrier FSC pages publish diesel-price bands with the surcharge percentage
+that applies inside each band, e.g. "Rs 85.01 - 90.00 ... 12.5%". The
+extractor turns those pages into band tables per carrier and effective date,
+and FscIndex compiles them into sorted arrays so that pricing millions of
+shipments is a vectorized binary search (np.searchsorted).
+"""
+import json
+import os
+import re
+import time
+from datetime import date, datetime
+
+import numpy as np
+
+INPUT_FOLDER = "cleaned_docs"
+OUTPUT_FILE = "fsc_tables.json"
+
+# Carrier name from the scraped filename (sanitize_filename → netloc + path)
+CARRIER_PATTERN = re.compile(r"^(?:www\.)?([a-z0-9-]+)\.", re.I)
+
+_NUM = r"(\d{2,3}(?:\.\d{1,2})?)"
+_CUR = r"(?:Rs\.?|INR|₹)?\s*"
+
+BAND_PATTERN = re.compile(
+    _CUR + _NUM + r"\s*(?:-|–|to)\s*" + _CUR + _NUM
+    + r"[\s|:/()A-Za-z.]{0,40}?" + r"(\d{1,2}(?:\.\d{1,2})?)\s*%"
+)
+OPEN_BAND_PATTERN = re.compile(
+    r"(above|over|more than|greater than|up ?to|below|less than)\s*" + _CUR + _NUM
+    + r"[\s|:/()A-Za-z.]{0,40}?" + r"(\d{1,2}(?:\.\d{1,2})?)\s*%",
+    re.I
+)
+EFFECTIVE_PATTERN = re.compile(
+    r"(?:effective|w\.?e\.?f\.?|with effect)\s*(?:from|date|on)?\s*:?\s*"
+    r"(\d{1,2}[-/.]\d{1,2}[-/.]\d{2,4}|\d{1,2}(?:st|nd|rd|th)?\s+[A-Za-z]{3,9},?\s+\d{4}|[A-Za-z]{3,9}\s+\d{1,2}(?:st|nd|rd|th)?,?\s+\d{4})",
+    re.I
+)
+DATE_FORMATS = ["%d-%m-%Y", "%d/%m/%Y", "%d.%m.%Y", "%d-%m-%y", "%d/%m/%y",
+                "%d %B %Y", "%d %b %Y", "%B %d %Y", "%b %d %Y"]
+
+# Bands like 85.01-90.00 / 90.01-95.00 are treated as contiguous
+BAND_GAP = 0.011
+
+
+def carrier_from_filename(filename):
+    match = CARRIER_PATTERN.match(os.path.basename(filename))
+    return match.group(1).lower() if match else "unknown"
+
+
+def parse_date(text):
+    text = re.sub(r"(\d)(st|nd|rd|th)", r"\1", text).replace(",", " ")
+    text = " ".join(text.split())
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def extract_bands(text):
+    """All (low, high, percent) diesel-price bands found in `text`."""
+    bands = []
+
+    for m in BAND_PATTERN.finditer(text):
+        low, high, pct = float(m.group(1)), float(m.group(2)), float(m.group(3))
+        if low < high:
+            bands.append((low, high, pct))
+
+    # Lookups treat bounds as inclusive; "above 95" must not claim 95.00
+    # itself, so open bands get the next float past the stated price
+    for m in OPEN_BAND_PATTERN.finditer(text):
+        word, price, pct = m.group(1).lower(), float(m.group(2)), float(m.group(3))
+        if word in ("above", "over", "more than", "greater than"):
+            bands.append((float(np.nextafter(price, np.inf)), float("inf"), pct))
+        elif word in ("below", "less than"):
+            bands.append((0.0, float(np.nextafter(price, -np.inf)), pct))
+        else:
+            bands.append((0.0, price, pct))
+
+    return sorted(set(bands))
+
+
+def extract_effective_date(text):
+    match = EFFECTIVE_PATTERN.search(text)
+    return parse_date(match.group(1)) if match else None
+
+
+def extract_tables(folder=INPUT_FOLDER):
+    """Band tables from every page in `folder` that publishes FSC bands."""
+    tables = []
+
+    for file in sorted(os.listdir(folder)):
+        if not file.endswith(".txt"):
+            continue
+
+        with open(os.path.join(folder, file), "r", encoding="utf-8") as f:
+            text = f.read()
+
+        # Only FSC pages; statutes are full of "sections 25 to 28 ... 10%"
+        if "fuel" not in file.lower() and "fuel surcharge" not in text.lower():
+            continue
+
+        bands = extract_bands(text)
+        if not bands:
+            continue
+
+        effective = extract_effective_date(text)
+        tables.append({
+            "carrier": carrier_from_filename(file),
+            "effective_date": effective.isoformat() if effective else None,
+            "bands": [{"low": lo, "high": hi, "percent": pct} for lo, hi, pct in bands],
+            "source": file
+        })
+
+    return tables
+
+
+def save_tables(tables, path=OUTPUT_FILE):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(tables, f, indent=4)
+
+
+def load_tables(path=OUTPUT_FILE):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class _CompiledTable:
+    """One band table as sorted arrays of lower bounds, upper bounds and %."""
+
+    def __init__(self, bands):
+        bands = sorted((b["low"], b["high"], b["percent"]) for b in bands)
+        lows = np.array([b[0] for b in bands], dtype=float)
+        highs = np.array([b[1] for b in bands], dtype=float)
+
+        if np.any(lows[1:] < highs[:-1] - BAND_GAP):
+            raise ValueError("Overlapping FSC bands")
+
+        # Close rounding gaps so 90.005 falls in the 85.01-90.00 band
+        uppers = highs.copy()
+        contiguous = lows[1:] - highs[:-1] <= BAND_GAP
+        uppers[:-1][contiguous] = lows[1:][contiguous]
+
+        self.lows = lows
+        self.highs = highs
+        self.uppers = uppers
+        self.percent = np.array([b[2] for b in bands], dtype=float)
+
+    def lookup(self, prices):
+        i = np.searchsorted(self.lows, prices, side="right") - 1
+        safe = np.clip(i, 0, None)
+        inside = (i >= 0) & ((prices < self.uppers[safe]) | (prices <= self.highs[safe]))
+        return np.where(inside, self.percent[safe], np.nan)
+
+
+class FscIndex:
+    """Price → FSC% lookups per carrier, honouring effective dates."""
+
+    def __init__(self, tables):
+        grouped = {}
+        for t in tables:
+            effective = t.get("effective_date")
+            day = date.fromisoformat(effective) if effective else date.min
+            grouped.setdefault(t["carrier"], []).append((day, t["bands"]))
+
+        self.carriers = {}
+        for carrier, entries in grouped.items():
+            entries.sort(key=lambda e: e[0])
+            self.carriers[carrier] = (
+                np.array([np.datetime64(d) for d, _ in entries], dtype="datetime64[D]"),
+                [_CompiledTable(bands) for _, bands in entries]
+            )
+
+    def lookup(self, carrier, prices, dates=None):
+        """
+        FSC percentage for each diesel price (NaN when no band applies).
+
+        `dates` (shipment dates, scalar or array) selects the table in force
+        on that day; by default the latest table is used.
+        """
+        effective, compiled = self.carriers[carrier]
+        prices = np.asarray(prices, dtype=float)
+
+        if dates is None:
+            return compiled[-1].lookup(prices)
+
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        if dates.ndim == 0:
+            t = np.searchsorted(effective, dates, side="right") - 1
+            return compiled[t].lookup(prices) if t >= 0 else np.full(prices.shape, np.nan)
+
+        which = np.searchsorted(effective, dates, side="right") - 1
+
+        out = np.full(prices.shape, np.nan)
+        for t in np.unique(which):
+            if t < 0:
+                continue
+            mask = which == t
+            out[mask] = compiled[t].lookup(prices[mask])
+        return out
+
+
+if __name__ == "__main__":
+    tables = extract_tables()
+    print(f"Extracted {len(tables)} FSC tables from {INPUT_FOLDER}/")
+    for t in tables:
+        print(f"  {t['carrier']} ({t['effective_date']}): {len(t['bands'])} bands from {t['source']}")
+    if tables:
+        save_tables(tables)
+        print(f"Saved → {OUTPUT_FILE}")
+
+    # Band boundaries: closed bands include both ends, open bands exclude theirs
+    edges = FscIndex([{"carrier": "edges", "effective_date": None, "bands": [
+        {"low": lo, "high": hi, "percent": pct} for lo, hi, pct in extract_bands(
+            "Below Rs 85.00 5% | Rs 85.00 - 90.00 10% | Rs 90.01 - 95.00 15% | Above Rs 95.00 30%")]}])
+    expected = {84.99: 5.0, 85.0: 10.0, 90.0: 10.0, 90.005: 10.0, 90.01: 15.0, 95.0: 15.0, 95.01: 30.0}
+    got = edges.lookup("edges", list(expected))
+    assert list(got) == list(expected.values()), dict(zip(expected, got))
+    print(f"Band boundaries OK ({len(expected)} prices)")
+
+    # Throughput on a synthetic 2.50-wide band table
+    sample_page = "Effective from 1st April 2024 " + " ".join(
+        f"Rs {p + 0.01:.2f} - {p + 2.5:.2f} {5 + i * 0.5:.1f}%" for i, p in enumerate(np.arange(60, 135, 2.5))
+    )
+    index = FscIndex([{
+        "carrier": "sample",
+        "effective_date": extract_effective_date(sample_page).isoformat(),
+        "bands": [{"low": lo, "high": hi, "percent": pct} for lo, hi, pct in extract_bands(sample_page)]
+    }])
+
+    prices = np.random.default_rng(0).uniform(61, 134, 5000000)
+    start = time.perf_counter()
+    fsc = index.lookup("sample", prices, dates="2024-06-01")
+    elapsed = time.perf_counter() - start
+    print(f"Priced {len(prices):,} shipments in {elapsed * 1000:.0f} ms ({len(prices) / elapsed:,.0f}/s), unmatched: {np.isnan(fsc).sum()}")
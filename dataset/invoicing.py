@@ -0,0 +1,296 @@
+"""
+Batch shipment rating with negotiated surcharges.
+
+Applies the seven terms produced by finalize_offer / negotiate_batch to
+columnar shipment data, chunk by chunk, with NumPy column operations:
+
+- fuel, peak season, risk and carbon: percentage of the chargeable freight
+- dimensional weight: multiplier on base freight for volumetric shipments
+- residential and congestion: flat ₹ fee per flagged shipment
+
+Input can be CSV, Parquet or Arrow IPC. Parquet/Arrow (and fast CSV) need
+pyarrow; plain CSV falls back to the csv module.
+"""
+import csv
+import os
+import time
+
+import numpy as np
+
+from negotiation import SURCHARGE_LIMITS, SURCHARGES
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    print("pyarrow not found. Parquet/Arrow input disabled. Install with: pip install pyarrow")
+    pa = None
+
+CHUNK_ROWS = 250000
+
+# Volumetric weight (kg) = L x W x H (cm) / divisor
+DIM_DIVISOR = 5000
+
+# flat term -> (flag column, output column)
+FLAT_TERMS = {
+    "residential_fee": ("residential", "residential_amount"),
+    "congestion_fee": ("congestion_zone", "congestion_amount"),
+}
+
+NUMERIC_COLUMNS = ["base_freight", "length_cm", "width_cm", "height_cm", "weight_kg", "diesel_price"]
+
+OUTPUT_COLUMNS = [
+    "chargeable_freight", "fuel_amount", "peak_season_amount", "risk_amount",
+    "carbon_amount", "residential_amount", "congestion_amount", "total"
+]
+
+
+def validate_terms(terms):
+    """Negotiated terms must cover every surcharge and respect SURCHARGE_LIMITS."""
+    missing = [s for s in SURCHARGES if s not in terms]
+    if missing:
+        raise ValueError(f"Missing negotiated surcharges: {missing}")
+
+    for s in SURCHARGES:
+        low, high = SURCHARGE_LIMITS[s]
+        if not low <= terms[s] <= high:
+            raise ValueError(f"{s}={terms[s]} outside limits {SURCHARGE_LIMITS[s]}")
+
+
+def check_fsc(fsc_index, carrier):
+    """A carrier FSC table is used only with the carrier it is looked up for."""
+    if fsc_index is None:
+        return
+    if carrier is None:
+        raise ValueError("carrier is required with fsc_index")
+    if carrier not in fsc_index.carriers:
+        raise ValueError(f"No FSC table for carrier {carrier!r}")
+
+
+def _flag(values):
+    values = np.asarray(values)
+    if values.dtype == bool:
+        return values
+    if values.dtype.kind in "iuf":
+        return values != 0
+    return np.isin(np.char.lower(values.astype(str)), ["1", "true", "yes", "y"])
+
+
+def rate_chunk(columns, terms, fsc_index=None, carrier=None):
+    """
+    Rate one chunk. `columns` maps column name → array; returns the
+    computed output columns as arrays of the same length.
+    """
+    check_fsc(fsc_index, carrier)
+    freight = np.asarray(columns["base_freight"], dtype=float)
+    n = len(freight)
+
+    if "dim_weighted" in columns:
+        volumetric = _flag(columns["dim_weighted"])
+    elif all(c in columns for c in ("length_cm", "width_cm", "height_cm", "weight_kg")):
+        volume = (np.asarray(columns["length_cm"], dtype=float)
+                  * np.asarray(columns["width_cm"], dtype=float)
+                  * np.asarray(columns["height_cm"], dtype=float))
+        volumetric = volume / DIM_DIVISOR > np.asarray(columns["weight_kg"], dtype=float)
+    else:
+        volumetric = np.zeros(n, dtype=bool)
+
+    chargeable = np.where(volumetric, freight * terms["dimensional_weight_fee"], freight)
+
+    fuel_rate = np.full(n, terms["fuel_surcharge"])
+    if fsc_index is not None and "diesel_price" in columns:
+        # Carrier FSC table wins where the diesel price falls in a band
+        table_rate = fsc_index.lookup(carrier, columns["diesel_price"], columns.get("ship_date")) / 100
+        fuel_rate = np.where(np.isnan(table_rate), fuel_rate, table_rate)
+
+    out = {
+        "chargeable_freight": chargeable,
+        "fuel_amount": chargeable * fuel_rate,
+        "peak_season_amount": chargeable * terms["peak_season_surcharge"],
+        "risk_amount": chargeable * terms["risk_surcharge"],
+        "carbon_amount": chargeable * terms["carbon_emission_fee"],
+    }
+
+    for term, (flag_column, name) in FLAT_TERMS.items():
+        flags = _flag(columns[flag_column]) if flag_column in columns else np.zeros(n, dtype=bool)
+        out[name] = np.where(flags, float(terms[term]), 0.0)
+
+    out["total"] = (
+        chargeable + out["fuel_amount"] + out["peak_season_amount"] + out["risk_amount"]
+        + out["carbon_amount"] + out["residential_amount"] + out["congestion_amount"]
+    )
+
+    for name in OUTPUT_COLUMNS:
+        out[name] = np.round(out[name], 2)
+    return out
+
+
+def _csv_chunks(path, chunk_rows):
+    """Stdlib fallback: yield dicts of NumPy columns."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        rows = []
+        for row in reader:
+            rows.append(row)
+            if len(rows) == chunk_rows:
+                yield _rows_to_columns(header, rows)
+                rows = []
+        if rows:
+            yield _rows_to_columns(header, rows)
+
+
+def _rows_to_columns(header, rows):
+    columns = {}
+    for i, name in enumerate(header):
+        values = np.array([r[i] for r in rows])
+        columns[name] = values.astype(float) if name in NUMERIC_COLUMNS else values
+    return columns
+
+
+def _batch_to_columns(batch):
+    return {name: batch.column(i).to_numpy(zero_copy_only=False) for i, name in enumerate(batch.schema.names)}
+
+
+def read_chunks(path, chunk_rows=CHUNK_ROWS):
+    """Yield column dicts of at most `chunk_rows` rows from CSV/Parquet/Arrow."""
+    ext = os.path.splitext(path)[1].lower()
+
+    if pa is None:
+        if ext != ".csv":
+            raise RuntimeError(f"pyarrow is required to read {ext} files")
+        yield from _csv_chunks(path, chunk_rows)
+        return
+
+    if ext == ".parquet":
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield _batch_to_columns(batch)
+    elif ext in (".arrow", ".feather", ".ipc"):
+        with pa.memory_map(path) as source:
+            reader = pa_ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                table = pa.Table.from_batches([reader.get_batch(i)])
+                for batch in table.to_batches(max_chunksize=chunk_rows):
+                    yield _batch_to_columns(batch)
+    elif ext == ".csv":
+        # Block size bounds memory; re-slice to the requested row count
+        options = pa_csv.ReadOptions(block_size=64 << 20)
+        for batch in pa_csv.open_csv(path, read_options=options):
+            for offset in range(0, batch.num_rows, chunk_rows):
+                yield _batch_to_columns(batch.slice(offset, chunk_rows))
+    else:
+        raise ValueError(f"Unsupported shipment file: {path}")
+
+
+class _Writer:
+    """Append rated chunks to a CSV or Parquet file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.lower().endswith(".parquet")
+        self._writer = None
+        self._file = None
+
+    def write(self, columns):
+        if self.parquet:
+            table = pa.table(columns)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+            return
+
+        if self._file is None:
+            self._file = open(self.path, "w", encoding="utf-8", newline="")
+            self._csv = csv.writer(self._file)
+            self._csv.writerow(list(columns))
+        self._csv.writerows(zip(*[np.asarray(v).tolist() for v in columns.values()]))
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+
+
+def rate_file(path, terms, output=None, chunk_rows=CHUNK_ROWS, fsc_index=None, carrier=None,
+              keep_columns=("shipment_id",)):
+    """
+    Rate every shipment in `path` with the negotiated `terms`.
+
+    Only one chunk is held in memory at a time. When `output` is given the
+    rated rows (kept input columns + charges) are written there. Returns a
+    report with row count, rows/sec and total charges per component.
+    """
+    validate_terms(terms)
+    check_fsc(fsc_index, carrier)
+
+    writer = _Writer(output) if output else None
+    totals = {name: 0.0 for name in OUTPUT_COLUMNS}
+    rows = 0
+    start = time.perf_counter()
+
+    try:
+        for columns in read_chunks(path, chunk_rows):
+            rated = rate_chunk(columns, terms, fsc_index, carrier)
+            rows += len(rated["total"])
+            for name in OUTPUT_COLUMNS:
+                totals[name] += float(rated[name].sum())
+
+            if writer:
+                kept = {c: columns[c] for c in keep_columns if c in columns}
+                writer.write({**kept, **rated})
+    finally:
+        if writer:
+            writer.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(rows / elapsed) if elapsed else None,
+        "totals": {k: round(v, 2) for k, v in totals.items()}
+    }
+
+
+if __name__ == "__main__":
+    import json
+    import tempfile
+
+    terms = {
+        "fuel_surcharge": 0.1457,
+        "peak_season_surcharge": 0.0987,
+        "residential_fee": 110.0,
+        "dimensional_weight_fee": 1.25,
+        "congestion_fee": 150.0,
+        "risk_surcharge": 0.05,
+        "carbon_emission_fee": 0.0125
+    }
+
+    rows = 2000000
+    rng = np.random.default_rng(0)
+    shipments = {
+        "shipment_id": np.arange(rows),
+        "base_freight": rng.uniform(80, 5000, rows).round(2),
+        "length_cm": rng.uniform(5, 120, rows).round(1),
+        "width_cm": rng.uniform(5, 80, rows).round(1),
+        "height_cm": rng.uniform(2, 60, rows).round(1),
+        "weight_kg": rng.uniform(0.2, 40, rows).round(2),
+        "residential": rng.random(rows) < 0.4,
+        "congestion_zone": rng.random(rows) < 0.2,
+    }
+
+    folder = tempfile.mkdtemp()
+    if pa is not None:
+        path = os.path.join(folder, "shipments.parquet")
+        pq.write_table(pa.table(shipments), path)
+    else:
+        path = os.path.join(folder, "shipments.csv")
+        writer = _Writer(path)
+        writer.write(shipments)
+        writer.close()
+
+    report = rate_file(path, terms)
+    print(f"Rated {path}")
+    print(json.dumps(report, indent=4))
@@ -0,0 +1,279 @@
+"""
+Cached, concurrent market signals for live negotiations.
+
+The fuel, weather, traffic and season indices are fetched in parallel,
+cached with a TTL per signal, and keyed by a geohash cell so that lanes
+starting close to each other share one lookup. Entries that are about to
+expire are served as-is while a background refresh runs.
+
+Providers are pluggable: LiveSignalProvider calls the external APIs used in
+scrape.ipynb, LocalSignalProvider is a deterministic offline stand-in.
+"""
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+
+GLOBAL_FUEL_API = "https://api.globalfuelprices.com/india/diesel"
+OPENWEATHER_API = "https://api.openweathermap.org/data/2.5/weather"
+TOMTOM_API = "https://api.tomtom.com/traffic/services/4/flowSegmentData/relative/10/json"
+
+# signal -> (ttl seconds, geohash precision; 0 = one global value)
+SIGNAL_CONFIG = {
+    "fuel": (6 * 3600, 0),
+    "season": (24 * 3600, 0),
+    "weather": (15 * 60, 4),      # ~39 km cells
+    "traffic": (5 * 60, 5),       # ~5 km cells
+}
+
+# Serve cached values and refresh in the background after this share of the TTL
+REFRESH_AHEAD = 0.8
+
+# Failed fetches are cached briefly so a down API is not hammered
+ERROR_TTL = 60
+
+Location = namedtuple("Location", ["city", "lat", "lon"])
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash(lat, lon, precision=5):
+    """Standard base32 geohash of a coordinate."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    bits, bit, even = 0, 0, True
+    chars = []
+
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(_BASE32[bits])
+            bits, bit = 0, 0
+
+    return "".join(chars)
+
+
+def geohash_center(cell):
+    """Centre (lat, lon) of a geohash cell."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for ch in cell:
+        code = _BASE32.index(ch)
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (code >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+
+class LiveSignalProvider:
+    """External APIs (diesel price, OpenWeather, TomTom flow)."""
+
+    def __init__(self, openweather_key=None, tomtom_key=None, timeout=10):
+        self.openweather_key = openweather_key or os.environ.get("OPENWEATHER_KEY", "")
+        self.tomtom_key = tomtom_key or os.environ.get("TOMTOM_KEY", "")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def fuel(self, location):
+        resp = self.session.get(GLOBAL_FUEL_API, timeout=self.timeout).json()
+        # Normalize diesel price (100 = baseline)
+        return resp["price"] / 100
+
+    def season(self, location):
+        return random.uniform(1.0, 1.25)
+
+    def weather(self, location):
+        """Weather → increases risk surcharge."""
+        params = {"appid": self.openweather_key}
+        if location.lat is not None:
+            params.update(lat=location.lat, lon=location.lon)
+        else:
+            params["q"] = location.city
+
+        resp = self.session.get(OPENWEATHER_API, params=params, timeout=self.timeout).json()
+        weather = resp["weather"][0]["main"].lower()
+
+        if any(w in weather for w in ["rain", "storm", "flood", "cyclone"]):
+            return 1.35
+        if "snow" in weather:
+            return 1.28
+        return 1.0
+
+    def traffic(self, location):
+        """TomTom returns current vs free-flow speed."""
+        resp = self.session.get(
+            TOMTOM_API,
+            params={"point": f"{location.lat},{location.lon}", "key": self.tomtom_key},
+            timeout=self.timeout
+        ).json()
+
+        flow = resp["flowSegmentData"]
+        congestion_index = flow["freeFlowSpeed"] / flow["currentSpeed"]
+        return min(max(congestion_index, 1.0), 1.5)
+
+
+class LocalSignalProvider:
+    """Deterministic offline stand-in: same cell and seed → same value."""
+
+    RANGES = {
+        "fuel": (0.9, 1.2),
+        "season": (1.0, 1.25),
+        "traffic": (1.05, 1.25),
+    }
+    WEATHER_LEVELS = (1.0, 1.0, 1.1, 1.28, 1.35)
+
+    def __init__(self, seed=0, fixed=None):
+        self.seed = seed
+        self.fixed = fixed or {}
+
+    def _rng(self, signal, location):
+        # Seeded by the cell centre only, so lookup order never changes a value
+        return random.Random(f"{self.seed}:{signal}:{location.lat}:{location.lon}")
+
+    def _value(self, signal, location):
+        if signal in self.fixed:
+            return self.fixed[signal]
+        if signal == "weather":
+            return self._rng(signal, location).choice(self.WEATHER_LEVELS)
+        low, high = self.RANGES[signal]
+        return self._rng(signal, location).uniform(low, high)
+
+    def fuel(self, location):
+        return self._value("fuel", location)
+
+    def season(self, location):
+        return self._value("season", location)
+
+    def weather(self, location):
+        return self._value("weather", location)
+
+    def traffic(self, location):
+        return self._value("traffic", location)
+
+
+class MarketSignals:
+    """TTL cache + concurrent fetcher in front of a signal provider."""
+
+    def __init__(self, provider=None, fallback=None, config=None, max_workers=8):
+        self.provider = provider or LocalSignalProvider()
+        self.fallback = fallback or LocalSignalProvider()
+        self.config = {**SIGNAL_CONFIG, **(config or {})}
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="market-signal")
+
+        self._cache = {}       # (signal, cell) -> (value, fetched_at, ttl)
+        self._inflight = {}    # (signal, cell) -> Future
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "refreshes": 0, "errors": 0}
+
+    def _key(self, signal, city, lat, lon):
+        precision = self.config[signal][1]
+        if precision == 0:
+            return (signal, "*"), Location(city, None, None)
+
+        cell = geohash(lat, lon, precision)
+        center_lat, center_lon = geohash_center(cell)
+        return (signal, cell), Location(city, round(center_lat, 4), round(center_lon, 4))
+
+    def _fetch(self, signal, key, location):
+        ttl = self.config[signal][0]
+        try:
+            try:
+                value = getattr(self.provider, signal)(location)
+            except Exception:
+                with self._lock:
+                    self.stats["errors"] += 1
+                value = getattr(self.fallback, signal)(location)
+                ttl = min(ttl, ERROR_TTL)
+
+            with self._lock:
+                self._cache[key] = (value, time.monotonic(), ttl)
+            return value
+        finally:
+            # A failed future must not stay in flight: later gets would re-raise it
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _submit(self, signal, key, location):
+        # Caller holds the lock; concurrent requests share one in-flight fetch
+        future = self._inflight.get(key)
+        if future is None:
+            future = self.pool.submit(self._fetch, signal, key, location)
+            self._inflight[key] = future
+        return future
+
+    def _lookup(self, signal, city, lat, lon, now):
+        """Cached value, or a Future for it. Caller holds the lock."""
+        key, location = self._key(signal, city, lat, lon)
+        entry = self._cache.get(key)
+
+        if entry is not None:
+            value, fetched_at, ttl = entry
+            age = now - fetched_at
+            if age < ttl:
+                self.stats["hits"] += 1
+                if age > ttl * REFRESH_AHEAD and key not in self._inflight:
+                    self.stats["refreshes"] += 1
+                    self._submit(signal, key, location)
+                return value
+
+        self.stats["misses"] += 1
+        return self._submit(signal, key, location)
+
+    def get_many(self, locations, signals=None):
+        """
+        Signals for many (city, lat, lon) lanes. Every missing (signal, cell)
+        is fetched once and all fetches run concurrently.
+        """
+        signals = signals or list(self.config)
+        now = time.monotonic()
+
+        with self._lock:
+            rows = [
+                {s: self._lookup(s, city, lat, lon, now) for s in signals}
+                for city, lat, lon in locations
+            ]
+
+        return [
+            {s: v.result() if isinstance(v, Future) else v for s, v in row.items()}
+            for row in rows
+        ]
+
+    def get(self, city="Mumbai", lat=19.07, lon=72.87, signals=None):
+        """All requested signals for one location."""
+        return self.get_many([(city, lat, lon)], signals)[0]
+
+    def expected_for_lanes(self, locations):
+        """(lanes x surcharges) expected matrix for negotiation.negotiate_batch."""
+        from negotiation import expected_surcharges
+
+        rows = self.get_many(locations)
+        return expected_surcharges(
+            fuel_idx=[r["fuel"] for r in rows],
+            season_idx=[r["season"] for r in rows],
+            congestion_idx=[r["traffic"] for r in rows],
+            risk_idx=[r["weather"] for r in rows]
+        )
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def close(self):
+        self.pool.shutdown(wait=False)
@@ -0,0 +1,223 @@
+"""
+Batch surcharge negotiation.
+
+Vectorized version of the live bargaining loop in scrape.ipynb: offers are
+held as (lanes x surcharges) arrays and every lane is negotiated at once.
+Per-lane parameters may be passed as scalars or as arrays of shape (lanes,).
+"""
+import time
+
+import numpy as np
+
+SURCHARGES = [
+    "fuel_surcharge",
+    "peak_season_surcharge",
+    "residential_fee",
+    "dimensional_weight_fee",
+    "congestion_fee",
+    "risk_surcharge",
+    "carbon_emission_fee"
+]
+
+SURCHARGE_LIMITS = {
+    "fuel_surcharge": (0.05, 0.25),
+    "peak_season_surcharge": (0.00, 0.20),
+    "residential_fee": (20, 200),
+    "dimensional_weight_fee": (1.0, 1.5),
+    "congestion_fee": (0, 300),
+    "risk_surcharge": (0.00, 0.10),
+    "carbon_emission_fee": (0.005, 0.02)
+}
+
+# Utility weights (α carrier, γ shipper) in SURCHARGES order
+CARRIER_WEIGHTS = np.array([8, 4, 2, 6, 3, 5, 1], dtype=float)
+SHIPPER_WEIGHTS = np.array([10, 6, 3, 7, 4, 5, 2], dtype=float)
+
+LOW = np.array([SURCHARGE_LIMITS[s][0] for s in SURCHARGES], dtype=float)
+HIGH = np.array([SURCHARGE_LIMITS[s][1] for s in SURCHARGES], dtype=float)
+MID = (LOW + HIGH) / 2
+
+DEFAULTS = {
+    "carrier_open": 1.25,
+    "shipper_open": 0.55,
+    "carrier_step": 0.08,
+    "shipper_step": 0.09,
+    "carrier_power": 0.55,
+    "shipper_power": 0.45,
+    "max_rounds": 10,
+    "tolerance": 0.05
+}
+
+
+def to_matrix(offers):
+    """List of surcharge dicts → (lanes, 7) array."""
+    return np.array([[o[s] for s in SURCHARGES] for o in offers], dtype=float)
+
+
+def to_dicts(matrix):
+    """(lanes, 7) array → list of surcharge dicts."""
+    return [dict(zip(SURCHARGES, row)) for row in np.asarray(matrix).tolist()]
+
+
+def _lane_param(value, lanes):
+    return np.broadcast_to(np.asarray(value, dtype=float), (lanes,))[:, None]
+
+
+def expected_surcharges(fuel_idx=1.0, season_idx=1.0, congestion_idx=1.0, risk_idx=1.0):
+    """Market indices (scalars or per-lane arrays) → expected surcharges."""
+    idx = np.broadcast_arrays(*[np.asarray(i, dtype=float) for i in (fuel_idx, season_idx, congestion_idx, risk_idx)])
+    lanes = idx[0].size
+    expected = np.tile(MID, (lanes, 1))
+
+    expected[:, 0] *= idx[0].ravel()
+    expected[:, 1] *= idx[1].ravel()
+    expected[:, 4] *= idx[2].ravel()
+    expected[:, 5] *= idx[3].ravel()
+    return expected
+
+
+def carrier_utility(offers, weights=CARRIER_WEIGHTS):
+    """Carrier prefers higher surcharges (more revenue)."""
+    return np.asarray(offers) @ weights
+
+
+def shipper_utility(offers, weights=SHIPPER_WEIGHTS):
+    """Shipper prefers lower surcharges (less cost)."""
+    return -(np.asarray(offers) @ weights)
+
+
+def generate_initial_offers(expected, carrier_open=1.25, shipper_open=0.55):
+    lanes = expected.shape[0]
+    carrier_offer = np.minimum(HIGH, expected * _lane_param(carrier_open, lanes))
+    shipper_offer = np.maximum(LOW, expected * _lane_param(shipper_open, lanes))
+    return carrier_offer, shipper_offer
+
+
+def counter_offer(prev, direction="down", strength=0.10):
+    """Counter-offer for every lane, clamped to SURCHARGE_LIMITS."""
+    strength = _lane_param(strength, prev.shape[0])
+    factor = 1 - strength if direction == "down" else 1 + strength
+    return np.minimum(np.maximum(prev * factor, LOW), HIGH)
+
+
+def finalize_offer(c_offer, s_offer, carrier_power=0.55, shipper_power=0.45):
+    """Weighted average based on negotiation strength."""
+    lanes = c_offer.shape[0]
+    wc = _lane_param(carrier_power, lanes)
+    ws = _lane_param(shipper_power, lanes)
+    return np.round(c_offer * wc + s_offer * ws, 4)
+
+
+def negotiate_batch(expected, **params):
+    """
+    Negotiate every lane of `expected` (lanes x 7) at once.
+
+    Lanes stop moving in the round they converge, exactly like the scalar
+    loop returning early, so results match lane-by-lane negotiation.
+    """
+    p = {**DEFAULTS, **params}
+    expected = np.atleast_2d(np.asarray(expected, dtype=float))
+    lanes = expected.shape[0]
+
+    max_rounds = np.broadcast_to(np.asarray(p["max_rounds"], dtype=int), (lanes,))
+    tolerance = np.broadcast_to(np.asarray(p["tolerance"], dtype=float), (lanes,))
+
+    carrier_offer, shipper_offer = generate_initial_offers(expected, p["carrier_open"], p["shipper_open"])
+
+    # Iterate on (surcharges x lanes) so each surcharge row is contiguous
+    # and the bounds broadcast as one scalar per row.
+    carrier_t = np.ascontiguousarray(carrier_offer.T)
+    shipper_t = np.ascontiguousarray(shipper_offer.T)
+    low, high = LOW[:, None], HIGH[:, None]
+    up = 1 + np.broadcast_to(np.asarray(p["carrier_step"], dtype=float), (lanes,))
+    down = 1 - np.broadcast_to(np.asarray(p["shipper_step"], dtype=float), (lanes,))
+
+    rounds = max_rounds.copy()
+    converged = np.zeros(lanes, dtype=bool)
+    active = max_rounds >= 1
+
+    for r in range(1, int(max_rounds.max(initial=0)) + 1):
+        active &= max_rounds >= r
+        if not active.any():
+            break
+
+        diff = np.abs(carrier_t - shipper_t).sum(axis=0)
+        just_converged = active & (diff < tolerance)
+        converged |= just_converged
+        rounds[just_converged] = r
+        active &= ~just_converged
+
+        if active.all():
+            np.multiply(shipper_t, up, out=carrier_t)
+            np.minimum(np.maximum(carrier_t, low, out=carrier_t), high, out=carrier_t)
+            np.multiply(carrier_t, down, out=shipper_t)
+            np.minimum(np.maximum(shipper_t, low, out=shipper_t), high, out=shipper_t)
+        else:
+            cols = np.flatnonzero(active)
+            carrier_t[:, cols] = np.minimum(np.maximum(shipper_t[:, cols] * up[cols], low), high)
+            shipper_t[:, cols] = np.minimum(np.maximum(carrier_t[:, cols] * down[cols], low), high)
+
+    carrier_offer, shipper_offer = carrier_t.T, shipper_t.T
+    final = finalize_offer(carrier_offer, shipper_offer, p["carrier_power"], p["shipper_power"])
+
+    return {
+        "final": final,
+        "rounds": rounds,
+        "converged": converged,
+        "carrier_utility": carrier_utility(final),
+        "shipper_utility": shipper_utility(final)
+    }
+
+
+def negotiate_lane(expected, **params):
+    """Scalar reference: one lane as dicts, same rules as the notebook loop."""
+    p = {**DEFAULTS, **params}
+    carrier_offer, shipper_offer = {}, {}
+
+    for s in SURCHARGES:
+        low, high = SURCHARGE_LIMITS[s]
+        carrier_offer[s] = min(high, expected[s] * p["carrier_open"])
+        shipper_offer[s] = max(low, expected[s] * p["shipper_open"])
+
+    def counter(prev, factor):
+        return {s: max(SURCHARGE_LIMITS[s][0], min(SURCHARGE_LIMITS[s][1], prev[s] * factor)) for s in SURCHARGES}
+
+    for r in range(1, p["max_rounds"] + 1):
+        diff = sum(abs(carrier_offer[s] - shipper_offer[s]) for s in SURCHARGES)
+        if diff < p["tolerance"]:
+            break
+        carrier_offer = counter(shipper_offer, 1 + p["carrier_step"])
+        shipper_offer = counter(carrier_offer, 1 - p["shipper_step"])
+
+    wc, ws = p["carrier_power"], p["shipper_power"]
+    return {s: round(carrier_offer[s] * wc + shipper_offer[s] * ws, 4) for s in SURCHARGES}
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(7)
+    lanes = 100000
+
+    expected = expected_surcharges(
+        fuel_idx=rng.uniform(0.9, 1.2, lanes),
+        season_idx=rng.uniform(1.0, 1.25, lanes),
+        congestion_idx=rng.uniform(1.05, 1.25, lanes),
+        risk_idx=rng.choice([1.0, 1.1, 1.28, 1.35], lanes)
+    )
+    carrier_step = rng.uniform(0.05, 0.12, lanes)
+
+    start = time.perf_counter()
+    batch = negotiate_batch(expected, carrier_step=carrier_step)
+    batch_time = time.perf_counter() - start
+
+    sample = 2000
+    rows = to_dicts(expected[:sample])
+    start = time.perf_counter()
+    scalar = [negotiate_lane(rows[i], carrier_step=float(carrier_step[i])) for i in range(sample)]
+    scalar_time = (time.perf_counter() - start) * lanes / sample
+
+    max_err = np.abs(to_matrix(scalar) - batch["final"][:sample]).max()
+
+    print(f"Lanes: {lanes}")
+    print(f"Batch:  {batch_time * 1000:.1f} ms ({lanes / batch_time:,.0f} lanes/s)")
+    print(f"Scalar: {scalar_time * 1000:.1f} ms (extrapolated from {sample} lanes)")
+    print(f"Speedup: {scalar_time / batch_time:.0f}x | max abs diff vs scalar: {max_err:.2e}")
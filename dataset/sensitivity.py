@@ -0,0 +1,259 @@
+"""
+Monte Carlo sensitivity sweeps over the bargaining model.
+
+Every point of a parameter grid is negotiated against sampled market signals
+with negotiation.negotiate_batch. Work is split into chunks that run on a
+process pool; each chunk returns fixed-bin histograms, so aggregation is a
+sum and memory does not grow with the number of scenarios. Offers are
+clamped to SURCHARGE_LIMITS and the final surcharge is carrier_power x
+carrier offer + shipper_power x shipper offer, so the bins span the limits
+scaled by carrier_power + shipper_power. Quantiles are read off the merged
+histograms.
+"""
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from negotiation import (
+    CARRIER_WEIGHTS, DEFAULTS, HIGH, LOW, SHIPPER_WEIGHTS, SURCHARGES,
+    expected_surcharges, negotiate_batch
+)
+
+# Sampling ranges for market indices (uniform); a scalar fixes the index
+MARKET_RANGES = {
+    "fuel_idx": (0.8, 1.3),
+    "season_idx": (0.9, 1.4),
+    "congestion_idx": (1.0, 1.5),
+    "risk_idx": (0.7, 1.5),
+}
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+BINS = 4096
+CHUNK_SIZE = 100000
+
+SWEEP_KEYS = set(DEFAULTS) | set(MARKET_RANGES) | {"carrier_weights", "shipper_weights"}
+
+# (point, scenarios, seed, market, chunk_size, quantiles) -> summary
+_MEMO = {}
+
+
+def parameter_grid(**axes):
+    """Cartesian product of axis values → list of parameter dicts."""
+    unknown = set(axes) - SWEEP_KEYS
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {sorted(unknown)}")
+
+    names = sorted(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[n] for n in names))]
+
+
+def _freeze(point):
+    return tuple(sorted((k, tuple(v) if isinstance(v, (list, tuple, np.ndarray)) else v) for k, v in point.items()))
+
+
+def validate_point(point):
+    """Reject parameters the bargaining model (and the histogram bounds) cannot take."""
+    unknown = set(point) - SWEEP_KEYS
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {sorted(unknown)}")
+    p = {**DEFAULTS, **point}
+    if p["carrier_power"] < 0 or p["shipper_power"] < 0 or p["carrier_power"] + p["shipper_power"] <= 0:
+        raise ValueError("carrier_power and shipper_power must be >= 0, not both 0")
+    if p["carrier_step"] < 0 or not 0 <= p["shipper_step"] < 1:
+        raise ValueError("carrier_step must be >= 0 and shipper_step in [0, 1)")
+    if p["max_rounds"] < 0 or p["tolerance"] < 0:
+        raise ValueError("max_rounds and tolerance must be >= 0")
+    for name in ("carrier_weights", "shipper_weights"):
+        if name in point:
+            weights = np.asarray(point[name], dtype=float)
+            if weights.shape != (len(SURCHARGES),) or np.any(weights < 0):
+                raise ValueError(f"{name} needs {len(SURCHARGES)} non-negative weights")
+
+
+def _bounds(point):
+    """(low, high) of each final surcharge: the limits scaled by the powers."""
+    scale = point.get("carrier_power", DEFAULTS["carrier_power"]) \
+        + point.get("shipper_power", DEFAULTS["shipper_power"])
+    return LOW * scale, HIGH * scale
+
+
+def _utility_range(weights, low, high):
+    return float(low @ weights), float(high @ weights)
+
+
+def _histogram(values, low, high):
+    # Clip so float rounding at the bounds cannot drop a value from the counts
+    return np.histogram(np.clip(values, low, high), bins=BINS, range=(low, high))[0]
+
+
+def _is_range(value):
+    """A (low, high) market range: any length-2 sequence, tuple or list."""
+    return not isinstance(value, str) and np.ndim(value) == 1 and len(value) == 2
+
+
+def _run_chunk(point, market, size, seed):
+    """Negotiate one chunk of scenarios and return its histograms."""
+    rng = np.random.default_rng(seed)
+
+    indices = {}
+    for name, spec in market.items():
+        value = point.get(name, spec)
+        indices[name] = rng.uniform(*value, size) if _is_range(value) else np.full(size, value)
+
+    params = {k: v for k, v in point.items() if k in DEFAULTS}
+    result = negotiate_batch(expected_surcharges(**indices), **params)
+    final = result["final"]
+
+    carrier_w = np.asarray(point.get("carrier_weights", CARRIER_WEIGHTS), dtype=float)
+    shipper_w = np.asarray(point.get("shipper_weights", SHIPPER_WEIGHTS), dtype=float)
+
+    low, high = _bounds(point)
+    surcharges = np.stack([_histogram(final[:, j], low[j], high[j]) for j in range(len(SURCHARGES))])
+    utilities = np.stack([
+        _histogram(final @ carrier_w, *_utility_range(carrier_w, low, high)),
+        _histogram(final @ shipper_w, *_utility_range(shipper_w, low, high)),
+    ])
+
+    return {
+        "surcharges": surcharges,
+        "sums": final.sum(axis=0),
+        "utilities": utilities,
+        "rounds": np.bincount(result["rounds"]),
+        "converged": int(result["converged"].sum()),
+    }
+
+
+def _merge(parts):
+    merged = {
+        "surcharges": sum(p["surcharges"] for p in parts),
+        "sums": sum(p["sums"] for p in parts),
+        "utilities": sum(p["utilities"] for p in parts),
+        "converged": sum(p["converged"] for p in parts),
+    }
+    width = max(len(p["rounds"]) for p in parts)
+    merged["rounds"] = sum(np.pad(p["rounds"], (0, width - len(p["rounds"]))) for p in parts)
+    return merged
+
+
+def _hist_quantiles(counts, low, high, quantiles):
+    """Quantiles from a fixed-bin histogram (linear within the bin)."""
+    cdf = np.cumsum(counts)
+    total = cdf[-1]
+    if total == 0:
+        raise ValueError("Empty histogram: no values within the bins")
+    edges = np.linspace(low, high, len(counts) + 1)
+    out = {}
+    for q in quantiles:
+        target = q * total
+        i = int(np.searchsorted(cdf, target))
+        i = min(i, len(counts) - 1)
+        before = cdf[i - 1] if i else 0
+        frac = (target - before) / counts[i] if counts[i] else 0.0
+        out[q] = round(float(edges[i] + frac * (edges[i + 1] - edges[i])), 6)
+    return out
+
+
+def _negated_quantiles(counts, weights, low, high, quantiles):
+    # Shipper utility is the negated cost: its q-quantile is -(1-q cost quantile)
+    cost = _hist_quantiles(counts, *_utility_range(weights, low, high), [1 - q for q in quantiles])
+    return {q: -v for q, v in zip(quantiles, cost.values())}
+
+
+def _summarize(point, merged, scenarios, quantiles):
+    carrier_w = np.asarray(point.get("carrier_weights", CARRIER_WEIGHTS), dtype=float)
+    shipper_w = np.asarray(point.get("shipper_weights", SHIPPER_WEIGHTS), dtype=float)
+    rounds = merged["rounds"]
+    low, high = _bounds(point)
+
+    return {
+        "params": point,
+        "scenarios": scenarios,
+        "quantiles": {
+            s: _hist_quantiles(merged["surcharges"][j], low[j], high[j], quantiles)
+            for j, s in enumerate(SURCHARGES)
+        },
+        "mean": {s: float(merged["sums"][j] / scenarios) for j, s in enumerate(SURCHARGES)},
+        "carrier_utility": _hist_quantiles(merged["utilities"][0], *_utility_range(carrier_w, low, high), quantiles),
+        "shipper_utility": _negated_quantiles(merged["utilities"][1], shipper_w, low, high, quantiles),
+        "rounds": {
+            "mean": float((np.arange(len(rounds)) * rounds).sum() / scenarios),
+            "histogram": {int(r): int(c) for r, c in enumerate(rounds) if c},
+        },
+        "converged_share": merged["converged"] / scenarios,
+    }
+
+
+def sweep(grid=None, scenarios=100000, market=None, seed=0, workers=None,
+          chunk_size=CHUNK_SIZE, quantiles=QUANTILES, memoize=True):
+    """
+    Run `scenarios` sampled negotiations for every parameter point in `grid`.
+
+    grid:   list of parameter dicts (see parameter_grid); None = defaults only
+    market: overrides for MARKET_RANGES, a (low, high) range or a fixed value
+    Returns one summary per point: surcharge quantiles and means, utility
+    quantiles, rounds to convergence and the converged share.
+    """
+    grid = grid or [{}]
+    for point in grid:
+        validate_point(point)
+    market = {**MARKET_RANGES, **(market or {})}
+    market_key = _freeze(market)
+
+    keys = [(_freeze(point), scenarios, seed, market_key, chunk_size, tuple(quantiles)) for point in grid]
+    todo = {}
+    for key, point in zip(keys, grid):
+        if key not in todo and not (memoize and key in _MEMO):
+            todo[key] = point
+
+    summaries = {}
+    if todo:
+        # Chunk seeds derive from (seed, chunk) only, so a point's samples do
+        # not depend on which other points are in the sweep.
+        chunks = [(key, min(chunk_size, scenarios - start), [seed, i])
+                  for key in todo
+                  for i, start in enumerate(range(0, scenarios, chunk_size))]
+
+        parts = {key: [] for key in todo}
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            futures = [
+                (key, pool.submit(_run_chunk, todo[key], market, size, chunk_seed))
+                for key, size, chunk_seed in chunks
+            ]
+            for key, future in futures:
+                parts[key].append(future.result())
+
+        for key, point in todo.items():
+            summaries[key] = _summarize(point, _merge(parts[key]), scenarios, quantiles)
+        if memoize:
+            _MEMO.update(summaries)
+
+    return [summaries[key] if key in summaries else _MEMO[key] for key in keys]
+
+
+def clear_memo():
+    _MEMO.clear()
+
+
+if __name__ == "__main__":
+    grid = parameter_grid(
+        carrier_power=[0.45, 0.55, 0.65],
+        carrier_step=[0.06, 0.08, 0.10],
+    )
+    scenarios = 1000000 // len(grid)
+
+    start = time.perf_counter()
+    results = sweep(grid, scenarios=scenarios)
+    elapsed = time.perf_counter() - start
+
+    total = scenarios * len(grid)
+    print(f"{total:,} scenarios over {len(grid)} points in {elapsed:.1f}s ({total / elapsed:,.0f}/s)")
+    for r in results:
+        fuel = r["quantiles"]["fuel_surcharge"]
+        print(f"{r['params']} fuel p5/p50/p95: {fuel[0.05]:.4f}/{fuel[0.5]:.4f}/{fuel[0.95]:.4f} rounds: {r['rounds']['mean']:.2f}")
+
+    start = time.perf_counter()
+    sweep(grid, scenarios=scenarios)
+    print(f"Repeat (memoized): {(time.perf_counter() - start) * 1000:.1f} ms")
@@ -0,0 +1,246 @@
+"""
+Deterministic answer synthesis for standard penalty / force-majeure checks.
+
+Uses the interpreted query (delay reason, weather, event, category) and the
+top clause (category, risk type, summary) to produce the generate_answer
+JSON without an LLM call:
+
+1. The clause names the cause: it decides when its wording is clear. An
+   exclusion of that cause ("delays due to rain will not attract
+   penalties", "except for delays caused by floods") means no penalty; no
+   exclusion wording at all means the penalty applies. Any other hedge
+   ("unless otherwise agreed", "is not a force majeure event") is left to
+   the LLM.
+2. Otherwise the rule from the answer prompt: weather / natural events and
+   other force-majeure causes mean no penalty; negligence, non-compliance
+   and other avoidable causes mean a penalty.
+
+`synthesize` returns (answer, confidence); callers fall back to the LLM
+when confidence is below RULE_THRESHOLD.
+
+    python answer_rules.py queries.jsonl   # rules vs LLM latency/agreement
+"""
+import os
+import re
+
+import query_analyzer
+
+RULE_THRESHOLD = float(os.environ.get("RULE_THRESHOLD", 0.7))
+
+# Below this rerank score the top clause is a weak match
+MIN_RERANK = float(os.environ.get("RULE_MIN_RERANK", 0.5))
+
+PENALTY_QUESTIONS = {"Penalty", "Force Majeure", "Liability", "SLA", "Exceptions"}
+
+EXCUSED_CAUSES = set(query_analyzer.WEATHER_TERMS) | {
+    "strike", "strikes", "union strike", "protest", "protests", "natural disaster", "act of god",
+    "acts of god", "border closure", "border closures", "disruption", "disruptions", "landslide",
+}
+FAULT_CAUSES = {
+    "negligence", "improper handling", "mishandling", "non-compliance", "compliance", "missing documents",
+    "documentation", "loose packaging", "packaging", "malfunction", "accident", "driver shortage",
+    "capacity shortage",
+}
+
+# Clause categories that back each outcome
+EXCUSED_CLAUSES = {"Force Majeure", "Exceptions"}
+PENALTY_CLAUSES = {"Penalty", "SLA", "Liability"}
+
+# Wording that releases the carrier, when in the same sentence as the cause
+NO_PENALTY_PATTERN = re.compile(
+    r"\b(?:no|not|never|without)\b[^.;]{0,40}?\b(?:penalt\w*|liab\w*|deduct\w*|fine|charge\w*|attract|incur)"
+    r"|\bexempt\w*|\bexcus\w*|\bwaive\w*|\brelieved\b",
+    re.I
+)
+# "does not exempt", "shall not be excused": a release that is denied
+NEGATED_RELEASE_PATTERN = re.compile(
+    r"\b(?:no|not|never|nor|cannot|without)\b[^.;]{0,30}?\b(?:exempt\w*|excus\w*|waive\w*|relieve\w*)",
+    re.I
+)
+FORCE_MAJEURE_PATTERN = re.compile(r"\bforce majeure\b", re.I)
+NOT_FORCE_MAJEURE_PATTERN = re.compile(r"\b(?:not|never|no)\b[^.;]{0,30}?\bforce majeure\b", re.I)
+# Hedges that carve something out; they exclude the cause only when they name it
+EXCEPTION_WORDS = r"\b(?:unless|except|excepting|excluding|other than|save for|but not)\b"
+EXCEPTION_PATTERN = re.compile(EXCEPTION_WORDS, re.I)
+SENTENCE_SPLIT = re.compile(r"(?<=[.;])\s+")
+RATE_PATTERN = re.compile(
+    r"(?:(?:Rs\.?|INR|₹|\$)\s?\d+(?:,\d{3})*(?:\.\d+)?|\b\d{1,3}(?:\.\d+)?%)"
+    r"(?:\s+per\s+(?:day|hour|week|month|shipment|delivery|consignment))?",
+    re.I
+)
+
+
+def _as_list(value):
+    if not value:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _term(term):
+    return re.compile(rf"\b{re.escape(term)}\b", re.I)
+
+
+def clause_decides(summary, cause):
+    """
+    Penalty applicable per the clause text for a cause it names: True,
+    False (the clause excludes the cause), or None when the wording hedges
+    in a way the rules cannot read.
+    """
+    cause_re = _term(cause)
+    excluded = re.compile(EXCEPTION_WORDS + r"[^.;]{0,60}?\b" + re.escape(cause) + r"\b", re.I)
+    for sentence in SENTENCE_SPLIT.split(summary):
+        if not cause_re.search(sentence):
+            continue
+        if NOT_FORCE_MAJEURE_PATTERN.search(sentence) or NEGATED_RELEASE_PATTERN.search(sentence):
+            return None
+        if excluded.search(sentence) or NO_PENALTY_PATTERN.search(sentence) \
+                or FORCE_MAJEURE_PATTERN.search(sentence):
+            return False
+    if NO_PENALTY_PATTERN.search(summary) or FORCE_MAJEURE_PATTERN.search(summary) \
+            or EXCEPTION_PATTERN.search(summary):
+        return None
+    return True
+
+
+def _incident(entities):
+    """What the cause led to, for the answer wording ("the delay", "the damage")."""
+    events = _as_list(entities.get("event"))
+    if events:
+        return f"the {events[0]}"
+    if entities.get("damage_type"):
+        return "the damage"
+    return "the incident"
+
+
+def _causes(ner):
+    entities = ner.get("entities", {})
+    causes = []
+    for field in ("delay_reason", "weather_condition"):
+        for value in _as_list(entities.get(field)):
+            value = str(value).lower()
+            if value not in causes:
+                causes.append(value)
+    return causes
+
+
+def synthesize(ner, top_clause):
+    """(answer dict in the generate_answer schema, rule confidence 0..1)."""
+    summary = top_clause.get("summary") or ""
+    clause_category = top_clause.get("category") or "unknown"
+    risk_type = (top_clause.get("risk_type") or "").lower()
+
+    if ner.get("category") not in PENALTY_QUESTIONS and "penalt" not in str(ner.get("intent", "")):
+        return None, 0.0
+
+    causes = _causes(ner)
+    excused = [c for c in causes if c in EXCUSED_CAUSES]
+    fault = [c for c in causes if c in FAULT_CAUSES]
+    if not causes or (excused and fault):
+        return None, 0.3 if causes else 0.0
+
+    named = [c for c in causes if _term(c).search(summary)]
+
+    if named:
+        # The clause speaks to this cause directly
+        applicable = clause_decides(summary, named[0])
+        if applicable is None:
+            return None, 0.5
+        confidence = 0.9
+        basis = f"the clause addresses {named[0]} directly"
+    elif excused:
+        applicable = False
+        in_line = clause_category in EXCUSED_CLAUSES or risk_type == "weather"
+        confidence = 0.85 if in_line else 0.7
+        basis = f"{excused[0]} is a force-majeure / excused event"
+    elif fault:
+        applicable = True
+        in_line = clause_category in PENALTY_CLAUSES
+        confidence = 0.85 if in_line else 0.7
+        basis = f"{fault[0]} is within the carrier's control"
+    else:
+        return None, 0.4
+
+    rerank = top_clause.get("rerank_score")
+    if rerank is not None and rerank < MIN_RERANK:
+        confidence *= 0.7
+    confidence = round(confidence, 2)
+
+    cause = (named or excused or fault)[0]
+    caused = f"{_incident(ner.get('entities', {}))} was caused by {cause}"
+    rate = RATE_PATTERN.search(summary)
+    if applicable:
+        answer = f"A penalty applies: {caused}, and {basis}."
+        if rate:
+            answer += f" The clause sets {rate.group().strip()}."
+        final = f"Yes, a penalty is applicable because {caused}."
+    else:
+        answer = f"No penalty applies: {caused}, and {basis}."
+        final = f"No, a penalty is not applicable because {caused}."
+
+    return {
+        "answer": answer,
+        "clause_used": summary,
+        "is_penalty_applicable": applicable,
+        "reasoning": f"Rule-based: cause '{cause}' from the query; top clause is {clause_category}"
+                     + (f" ({risk_type} risk)" if risk_type else "") + f"; {basis}.",
+        "confidence": confidence,
+        "final_output": final,
+    }, confidence
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+    import time
+
+    # Clause wording the rules must read right (or leave to the LLM: None)
+    SELF_CHECK = [
+        ("rain", "Delays caused by heavy rain will not attract penalties.", False),
+        ("rain", "Late delivery costs 1% per day except for delays due to rain.", False),
+        ("negligence", "Delays caused by negligence attract a penalty of 2% per day.", True),
+        ("negligence", "Carrier shall pay 2% per day for delays due to negligence unless otherwise agreed.", None),
+        ("strike", "A strike by carrier staff is not a force majeure event.", None),
+        ("rain", "Delays caused by heavy rain do not exempt the carrier from penalties.", None),
+        ("rain", "The carrier shall not be excused for delays due to heavy rain and a penalty of Rs 500 "
+                 "per day applies.", None),
+    ]
+    for cause, clause, expected in SELF_CHECK:
+        assert clause_decides(clause, cause) is expected, (clause, clause_decides(clause, cause))
+    print(f"Self-check OK ({len(SELF_CHECK)} clauses)")
+
+    import contract_engine
+
+    if len(sys.argv) != 2:
+        print("usage: python answer_rules.py queries.jsonl   (needs Ollama + Milvus or VECTOR_BACKEND=memory)")
+        sys.exit(1)
+
+    with open(sys.argv[1], "r", encoding="utf-8") as f:
+        queries = [(json.loads(l).get("query") or json.loads(l).get("text")) if l.startswith("{") else l.strip()
+                   for l in f if l.strip()]
+
+    rows = []
+    for query in queries:
+        ner = contract_engine.interpret_query(query)
+        hits = contract_engine.rerank(query, contract_engine.search_milvus(contract_engine.embed(query)))
+        if not hits:
+            continue
+
+        start = time.perf_counter()
+        rule_answer, confidence = synthesize(ner, hits[0])
+        rule_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        llm_answer = contract_engine.generate_answer(query, ner, hits[0])
+        llm_seconds = time.perf_counter() - start
+
+        rows.append((confidence, rule_answer, llm_answer, rule_seconds, llm_seconds))
+
+    confident = [r for r in rows if r[0] >= RULE_THRESHOLD]
+    agree = sum(1 for r in confident if r[1]["is_penalty_applicable"] == r[2].get("is_penalty_applicable"))
+    n = len(rows)
+    print(f"{n} queries, threshold {RULE_THRESHOLD}")
+    print(f"  answered by rules: {len(confident)} ({len(confident) / n:.0%})" if n else "  no results")
+    if confident:
+        print(f"  is_penalty_applicable agreement with LLM: {agree / len(confident):.0%}")
+        print(f"  mean latency: rules {sum(r[3] for r in confident) / len(confident) * 1000:.2f} ms, "
+              f"LLM {sum(r[4] for r in confident) / len(confident) * 1000:.0f} ms")
@@ -8,17 +8,25 @@ from bs4 import BeautifulSoup
 from urllib.parse import urlparse
 import pdfplumber
 import textstat
-import re
 from datetime import datetime
 
+import clause_segmenter
+import local_embedder
+import metrics
+import near_duplicates
+import ollama_client
+import text_cleaner
+
 app = Flask(__name__)
 CORS(app)
+metrics.instrument_app(app)
 
 # Configuration
 SAVE_FOLDER = "raw_docs_scraped"
 COMBINED_FOLDER = "raw_docs_combined"
 CLEANED_FOLDER = "cleaned_docs"
 CLAUSE_FOLDER = "clauses"
+SPANS_FILE = os.path.join(CLAUSE_FOLDER, "spans.jsonl")
 METADATA_FOLDER = "metadata"
 
 OLLAMA_URL = "http://localhost:11434/api/generate"
@@ -38,6 +46,29 @@ HEADERS = {
 for folder in [SAVE_FOLDER, COMBINED_FOLDER, CLEANED_FOLDER, CLAUSE_FOLDER, METADATA_FOLDER]:
     os.makedirs(folder, exist_ok=True)
 
+# Files per pipeline folder, listed once at startup and kept current by the
+# endpoints that write them, so /api/status never touches the filesystem
+FILE_SUFFIXES = {
+    SAVE_FOLDER: ".txt",
+    COMBINED_FOLDER: ".txt",
+    CLEANED_FOLDER: ".txt",
+    CLAUSE_FOLDER: ".jsonl",
+    METADATA_FOLDER: ".json",
+}
+FILE_INDEX = {
+    folder: {f for f in os.listdir(folder) if f.endswith(suffix)}
+    for folder, suffix in FILE_SUFFIXES.items()
+}
+
+# Clauses are (doc_id, start, end, path) spans into the memory-mapped
+# cleaned documents, not copies of their text
+DOCUMENTS = clause_segmenter.DocumentStore(CLEANED_FOLDER)
+SPAN_COUNT = sum(1 for _ in clause_segmenter.load_spans(SPANS_FILE)) if os.path.exists(SPANS_FILE) else 0
+
+def track_file(folder, filename):
+    if filename.endswith(FILE_SUFFIXES[folder]):
+        FILE_INDEX[folder].add(filename)
+
 def sanitize_filename(url):
     parsed = urlparse(url)
     safe = parsed.netloc + parsed.path.replace("/", "_").replace("?", "_")
@@ -45,66 +76,49 @@ def sanitize_filename(url):
 
 def scrape_url(url):
     try:
-        response = requests.get(url, headers=HEADERS, timeout=20)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.text, "html.parser")
-        
-        for tag in soup(["script", "style", "nav", "header", "footer", "img"]):
-            tag.decompose()
-        
-        text = soup.get_text(separator="\n")
-        lines = [line.strip() for line in text.splitlines() if line.strip()]
-        cleaned = "\n".join(lines)
-        
-        filename = sanitize_filename(url) + ".txt"
-        path = os.path.join(SAVE_FOLDER, filename)
-        
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(cleaned)
+        with metrics.stage("scrape"):
+            response = requests.get(url, headers=HEADERS, timeout=20)
+            response.raise_for_status()
+            
+            soup = BeautifulSoup(response.text, "html.parser")
+            
+            for tag in soup(["script", "style", "nav", "header", "footer", "img"]):
+                tag.decompose()
+            
+            text = soup.get_text(separator="\n")
+            lines = [line.strip() for line in text.splitlines() if line.strip()]
+            cleaned = "\n".join(lines)
+            
+            filename = sanitize_filename(url) + ".txt"
+            path = os.path.join(SAVE_FOLDER, filename)
+            
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(cleaned)
         
+        track_file(SAVE_FOLDER, filename)
         return {"success": True, "filename": filename, "path": path}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 def process_pdf(file_path):
     try:
-        text = ""
-        with pdfplumber.open(file_path) as pdf:
-            for page in pdf.pages:
-                text += page.extract_text() + "\n"
-        
-        filename = os.path.basename(file_path).replace(".pdf", ".txt")
-        output_path = os.path.join(COMBINED_FOLDER, filename)
-        
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write(text)
+        with metrics.stage("extract"):
+            text = ""
+            with pdfplumber.open(file_path) as pdf:
+                for page in pdf.pages:
+                    text += page.extract_text() + "\n"
+            
+            filename = os.path.basename(file_path).replace(".pdf", ".txt")
+            output_path = os.path.join(COMBINED_FOLDER, filename)
+            
+            with open(output_path, "w", encoding="utf-8") as f:
+                f.write(text)
         
+        track_file(COMBINED_FOLDER, filename)
         return {"success": True, "filename": filename, "path": output_path}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
-def clean_text(text):
-    text = re.sub(r"\s+", " ", text)
-    text = re.sub(r"Page \d+ of \d+", "", text)
-    text = re.sub(r"©.*?\n", "", text)
-    text = text.replace("•", "- ")
-    return text.strip()
-
-def split_into_clauses(text):
-    patterns = [
-        r"\.\s",
-        r";\s",
-        r"\n-\s",
-        r"\n\d+\.\s",
-        r"\n\([a-z]\)\s",
-    ]
-    
-    regex = "|".join(patterns)
-    parts = re.split(regex, text)
-    clauses = [p.strip() for p in parts if len(p.strip()) > 20]
-    return clauses
-
 def classify_clause(clause_text):
     prompt = f"""
 You are a legal-logistics contract classifier.
@@ -133,19 +147,13 @@ Clause:
 "{clause_text}"
 """
     
-    payload = {
-        "model": MODEL,
-        "prompt": prompt,
-        "stream": False
-    }
-    
     try:
-        response = requests.post(OLLAMA_URL, json=payload)
-        result = response.json()["response"]
-        
-        json_start = result.find("{")
-        json_end = result.rfind("}") + 1
-        metadata = json.loads(result[json_start:json_end])
+        with metrics.stage("classify"):
+            result = ollama_client.generate(prompt, model=MODEL, url=OLLAMA_URL)
+            
+            json_start = result.find("{")
+            json_end = result.rfind("}") + 1
+            metadata = json.loads(result[json_start:json_end])
         
         return metadata
     except Exception as e:
@@ -153,11 +161,8 @@ Clause:
 
 def generate_embedding(text):
     try:
-        response = requests.post(EMBED_URL, json={
-            "model": EMBED_MODEL,
-            "input": text
-        })
-        return response.json()["embeddings"][0]
+        with metrics.stage("embed"):
+            return local_embedder.embed(text, model=EMBED_MODEL, url=EMBED_URL)[0]
     except Exception as e:
         return None
 
@@ -196,142 +201,177 @@ def api_process_pdfs():
 @app.route('/api/clean-docs', methods=['POST'])
 def api_clean_docs():
     results = []
+    DOCUMENTS.close()  # cleaned files are rewritten below
+    
+    files = [f for f in os.listdir(COMBINED_FOLDER) if f.endswith(".txt")]
+    # First pass: lines repeated across documents (navigation, footers)
+    with metrics.stage("boilerplate"):
+        table = text_cleaner.build_table([os.path.join(COMBINED_FOLDER, f) for f in files])
     
-    for file in os.listdir(COMBINED_FOLDER):
-        if file.endswith(".txt"):
-            input_path = os.path.join(COMBINED_FOLDER, file)
-            output_path = os.path.join(CLEANED_FOLDER, file)
+    for file in files:
+        input_path = os.path.join(COMBINED_FOLDER, file)
+        output_path = os.path.join(CLEANED_FOLDER, file)
+        
+        try:
+            with metrics.stage("clean"):
+                stats = text_cleaner.clean_file(input_path, output_path, table)
             
-            try:
-                with open(input_path, "r", encoding="utf-8") as f:
-                    text = f.read()
-                
-                cleaned = clean_text(text)
-                
-                with open(output_path, "w", encoding="utf-8") as f:
-                    f.write(cleaned)
-                
-                results.append({"file": file, "success": True})
-            except Exception as e:
-                results.append({"file": file, "success": False, "error": str(e)})
+            track_file(CLEANED_FOLDER, file)
+            results.append({"file": file, "success": True, "boilerplate": stats["boilerplate"]})
+        except Exception as e:
+            results.append({"file": file, "success": False, "error": str(e)})
     
     return jsonify({"results": results})
 
 @app.route('/api/split-clauses', methods=['POST'])
 def api_split_clauses():
+    global SPAN_COUNT
     results = []
     total_clauses = 0
     
-    for file in os.listdir(CLEANED_FOLDER):
-        if file.endswith(".txt"):
-            path = os.path.join(CLEANED_FOLDER, file)
-            
+    with open(SPANS_FILE, "w", encoding="utf-8") as out:
+        for doc_id in DOCUMENTS.doc_ids():
             try:
-                with open(path, "r", encoding="utf-8") as f:
-                    text = f.read()
-                
-                clauses = split_into_clauses(text)
-                
-                for clause in clauses:
-                    clause_id = str(uuid.uuid4())
-                    clause_path = os.path.join(CLAUSE_FOLDER, clause_id + ".txt")
-                    
-                    with open(clause_path, "w", encoding="utf-8") as f:
-                        f.write(clause)
-                    
-                    total_clauses += 1
+                with metrics.stage("split"):
+                    spans = list(DOCUMENTS.segment(doc_id))
                 
-                results.append({"file": file, "clauses": len(clauses), "success": True})
+                for span in spans:
+                    out.write(json.dumps(span._asdict()) + "\n")
+                total_clauses += len(spans)
+            
+                results.append({"file": doc_id + ".txt", "clauses": len(spans), "success": True})
             except Exception as e:
-                results.append({"file": file, "success": False, "error": str(e)})
+                results.append({"file": doc_id + ".txt", "success": False, "error": str(e)})
     
+    track_file(CLAUSE_FOLDER, os.path.basename(SPANS_FILE))
+    SPAN_COUNT = total_clauses
     return jsonify({"results": results, "total_clauses": total_clauses})
 
 @app.route('/api/classify-clauses', methods=['POST'])
 def api_classify_clauses():
     results = []
     processed = 0
+    saved = 0
+    
+    spans = clause_segmenter.load_spans(SPANS_FILE) if os.path.exists(SPANS_FILE) else []
+    # Near-duplicate clause groups for this run; only each group's
+    # representative is classified, the others copy its fresh metadata.
+    # Span IDs repeat across re-splits, so groups from an earlier run would
+    # point edited clauses at stale metadata.
+    clause_index = near_duplicates.NearDuplicateIndex()
+    written = set()     # clause IDs whose metadata this run wrote
     
-    for file in os.listdir(CLAUSE_FOLDER):
-        if file.endswith(".txt"):
-            clause_path = os.path.join(CLAUSE_FOLDER, file)
+    for span in spans:
+        clause_id = clause_segmenter.span_id(span)
+        
+        try:
+            clause_text = DOCUMENTS.text(span)
             
-            try:
-                with open(clause_path, "r", encoding="utf-8") as f:
-                    clause_text = f.read().strip()
-                
-                clause_id = file.replace(".txt", "")
+            representative = clause_index.add(clause_id, clause_text)
+            
+            # A representative that failed this run may still have a file
+            # from an earlier one; classify the clause itself instead
+            if representative != clause_id and representative in written:
+                rep_path = os.path.join(METADATA_FOLDER, representative + ".json")
+                with open(rep_path, "r", encoding="utf-8") as f:
+                    metadata = json.load(f)
+                metadata["duplicate_of"] = representative
+                saved += 1
+                metrics.inc("dedup_saved_calls_total", call="classify")
+            else:
                 metadata = classify_clause(clause_text)
+            
+            if metadata:
+                metadata.update(span._asdict())
+                metadata["clause_id"] = clause_id
+                metadata["text"] = clause_text
+                metadata["flesch_score"] = textstat.flesch_reading_ease(clause_text)
+                metadata["industry"] = "Logistics"
+                metadata["timestamp"] = datetime.now().isoformat()
                 
-                if metadata:
-                    metadata["clause_id"] = clause_id
-                    metadata["text"] = clause_text
-                    metadata["flesch_score"] = textstat.flesch_reading_ease(clause_text)
-                    metadata["industry"] = "Logistics"
-                    metadata["timestamp"] = datetime.now().isoformat()
-                    
-                    output_path = os.path.join(METADATA_FOLDER, clause_id + ".json")
-                    with open(output_path, "w", encoding="utf-8") as f:
-                        json.dump(metadata, f, indent=4)
-                    
-                    processed += 1
-                    results.append({"clause_id": clause_id, "success": True})
-                else:
-                    results.append({"clause_id": clause_id, "success": False, "error": "Classification failed"})
-                    
-            except Exception as e:
-                results.append({"clause_id": file, "success": False, "error": str(e)})
+                output_path = os.path.join(METADATA_FOLDER, clause_id + ".json")
+                with open(output_path, "w", encoding="utf-8") as f:
+                    json.dump(metadata, f, indent=4)
+                
+                track_file(METADATA_FOLDER, clause_id + ".json")
+                written.add(clause_id)
+                processed += 1
+                results.append({"clause_id": clause_id, "success": True})
+            else:
+                results.append({"clause_id": clause_id, "success": False, "error": "Classification failed"})
+                
+        except Exception as e:
+            results.append({"clause_id": clause_id, "success": False, "error": str(e)})
     
-    return jsonify({"results": results, "processed": processed})
+    return jsonify({"results": results, "processed": processed, "llm_calls_saved": saved,
+                    "duplicate_groups": clause_index.stats()})
 
 @app.route('/api/generate-embeddings', methods=['POST'])
 def api_generate_embeddings():
     results = []
     processed = 0
+    saved = 0
+    embeddings = {}
+    
+    # Near-duplicates are moved to the end of the list so they can reuse
+    # their representative's vector
+    files = [f for f in os.listdir(METADATA_FOLDER) if f.endswith(".json")]
+    deferred = set()
     
-    for file in os.listdir(METADATA_FOLDER):
-        if file.endswith(".json"):
-            metadata_path = os.path.join(METADATA_FOLDER, file)
+    for file in files:
+        metadata_path = os.path.join(METADATA_FOLDER, file)
+        
+        try:
+            with open(metadata_path, "r", encoding="utf-8") as f:
+                metadata = json.load(f)
             
-            try:
-                with open(metadata_path, "r", encoding="utf-8") as f:
-                    metadata = json.load(f)
+            representative = metadata.get("duplicate_of")
+            if representative and file not in deferred:
+                deferred.add(file)
+                files.append(file)
+                continue
+            
+            embedding = embeddings.get(representative)
+            if embedding:
+                saved += 1
+                metrics.inc("dedup_saved_calls_total", call="embed")
+            else:
+                embedding = generate_embedding(metadata.get("text", ""))
+            
+            if embedding:
+                embeddings[metadata.get("clause_id", file[:-5])] = embedding
+                metadata["embedding"] = embedding
+                metadata["embedding_model"] = EMBED_MODEL
+                metadata["embedding_timestamp"] = datetime.now().isoformat()
                 
-                text = metadata.get("text", "")
-                embedding = generate_embedding(text)
+                with open(metadata_path, "w", encoding="utf-8") as f:
+                    json.dump(metadata, f, indent=4)
                 
-                if embedding:
-                    metadata["embedding"] = embedding
-                    metadata["embedding_model"] = EMBED_MODEL
-                    metadata["embedding_timestamp"] = datetime.now().isoformat()
-                    
-                    with open(metadata_path, "w", encoding="utf-8") as f:
-                        json.dump(metadata, f, indent=4)
-                    
-                    processed += 1
-                    results.append({"file": file, "success": True})
-                else:
-                    results.append({"file": file, "success": False, "error": "Embedding generation failed"})
-                    
-            except Exception as e:
-                results.append({"file": file, "success": False, "error": str(e)})
+                processed += 1
+                results.append({"file": file, "success": True})
+            else:
+                results.append({"file": file, "success": False, "error": "Embedding generation failed"})
+                
+        except Exception as e:
+            results.append({"file": file, "success": False, "error": str(e)})
     
-    return jsonify({"results": results, "processed": processed})
+    return jsonify({"results": results, "processed": processed, "embed_calls_saved": saved})
 
 @app.route('/api/status', methods=['GET'])
 def api_status():
     status = {
         "files": {
-            "raw_docs": len([f for f in os.listdir(SAVE_FOLDER) if f.endswith('.txt')]) if os.path.exists(SAVE_FOLDER) else 0,
-            "combined_docs": len([f for f in os.listdir(COMBINED_FOLDER) if f.endswith('.txt')]) if os.path.exists(COMBINED_FOLDER) else 0,
-            "cleaned_docs": len([f for f in os.listdir(CLEANED_FOLDER) if f.endswith('.txt')]) if os.path.exists(CLEANED_FOLDER) else 0,
-            "clauses": len([f for f in os.listdir(CLAUSE_FOLDER) if f.endswith('.txt')]) if os.path.exists(CLAUSE_FOLDER) else 0,
-            "metadata": len([f for f in os.listdir(METADATA_FOLDER) if f.endswith('.json')]) if os.path.exists(METADATA_FOLDER) else 0,
+            "raw_docs": len(FILE_INDEX[SAVE_FOLDER]),
+            "combined_docs": len(FILE_INDEX[COMBINED_FOLDER]),
+            "cleaned_docs": len(FILE_INDEX[CLEANED_FOLDER]),
+            "clauses": SPAN_COUNT,
+            "metadata": len(FILE_INDEX[METADATA_FOLDER]),
         },
         "models": {
             "llama": MODEL,
             "embedding": EMBED_MODEL
         },
+        "metrics": metrics.snapshot(),
         "timestamp": datetime.now().isoformat()
     }
     
@@ -339,7 +379,9 @@ def api_status():
 
 @app.route('/api/clear', methods=['POST'])
 def api_clear():
+    global SPAN_COUNT
     try:
+        DOCUMENTS.close()
         folders_to_clear = [SAVE_FOLDER, COMBINED_FOLDER, CLEANED_FOLDER, CLAUSE_FOLDER, METADATA_FOLDER]
         
         for folder in folders_to_clear:
@@ -348,6 +390,8 @@ def api_clear():
                     file_path = os.path.join(folder, file)
                     if os.path.isfile(file_path):
                         os.remove(file_path)
+            FILE_INDEX[folder].clear()
+        SPAN_COUNT = 0
         
         return jsonify({"success": True, "message": "All data cleared successfully"})
     except Exception as e:
@@ -0,0 +1,241 @@
+"""
+Structure-aware clause segmentation over memory-mapped cleaned documents.
+
+One compiled (bytes) pattern finds every structural marker at a line start:
+CHAPTER / PART / ARTICLE / SCHEDULE headings, sections ("7.", "II."),
+sub-sections ("(1)", "1.1"), clauses ("(a)"), sub-clauses ("(iv)") and
+bullets. Footnotes ("1. Subs. by Act 3 of 2016 ...") and page numbers are
+skipped, and text after a page break continues the interrupted clause's
+path. A marker only counts when the previous line ends a sentence or list
+item, so "clause\\n(a) of sub-section (1)" stays one clause.
+
+Clauses are emitted as Span(doc_id, start, end, path) byte offsets into the
+cleaned document; the text is read back from the memory map when needed:
+
+    store = DocumentStore("cleaned_docs")
+    for span in store.segment_all():
+        print(span.path, store.text(span))
+
+    python clause_segmenter.py cleaned_docs/   # throughput per document
+"""
+import json
+import mmap
+import os
+import re
+import uuid
+from collections import namedtuple
+
+Span = namedtuple("Span", ["doc_id", "start", "end", "path"])
+
+MIN_CLAUSE_CHARS = 20
+MAX_CLAUSE_CHARS = 1500     # longer spans are split at sentence ends
+
+MARKER_PATTERN = re.compile(
+    rb"^(?:"
+    rb"(?P<page>\d{1,4})[ \t]*$"
+    rb"|(?P<footnote>\d{1,2}\.[ \t]+(?:Subs\.|Ins\.|Omitted|Rep\.|The words?|Added|Cl\.|See|\d{1,2}(?:st|nd|rd|th)\b"
+    rb"|(?=[^\n]*(?:w\.[ ]?e\.[ ]?f\.|ibid\.))))"
+    rb"|(?P<heading>(?:CHAPTER|PART|ARTICLE|SCHEDULE|ANNEX(?:URE)?)\b[^\n]{0,80}?)(?=\.?[ \t]*(?:\xe2\x80\x94|\n|$))"
+    rb"|(?:\d+\[)?(?P<clause>\d+\.\d+)\.?[ \t]+"
+    rb"|(?:\d+\[)?(?P<section>\d{1,3}[A-Z]{0,2}|[IVX]{1,5})\.[ \t]+"
+    rb"|(?:\d+\[)?\((?P<sub>\d{1,3}[A-Z]?)\)[ \t]*"
+    rb"|(?:\d+\[)?\((?P<item>[a-z]{1,5})\)[ \t]*"
+    rb"|(?P<bullet>[-*][ \t]+)"
+    rb")",
+    re.M
+)
+
+# "3. Receipt of written communications.—(1) Unless ..."
+INLINE_SUB_PATTERN = re.compile(rb"[^\n]*?\xe2\x80\x94(?:\d+\[)?\((\d{1,3}[A-Z]?)\)")
+
+SENTENCE_END_PATTERN = re.compile(rb"[.;:](?=\s)")
+
+# A new marker must follow a short line (title, page number) or a line
+# ending like one of these; a long line without them was wrapped mid-sentence
+LINE_ENDINGS = tuple(c.encode() for c in ".:;,-])—”\"") + (b" or", b" and")
+SHORT_LINE = 60
+
+LEVELS = {"heading": 0, "section": 1, "clause": 2, "sub": 2, "item": 3, "roman": 4, "bullet": 5}
+ROMAN = {"i", "ii", "iii", "iv", "v", "vi", "vii", "viii", "ix", "x", "xi", "xii", "xiii", "xiv", "xv"}
+
+
+def _ends_item(data, pos):
+    line = data[data.rfind(b"\n", 0, max(pos - 1, 0)) + 1:pos].rstrip()
+    return len(line) < SHORT_LINE or line.endswith(LINE_ENDINGS)
+
+
+def _label(kind, m, path):
+    """(level, label) for a marker match; tells (i) the letter from (i) the numeral."""
+    if kind == "heading":
+        return 0, m.group("heading").decode("utf-8", "replace").strip()
+    if kind == "item":
+        letter = m.group("item").decode()
+        prev = path[3]
+        expected = chr(ord(prev[-2]) + 1) if prev else "a"
+        if letter in ROMAN and letter != expected:
+            return LEVELS["roman"], f"({letter})"
+        return LEVELS["item"], f"({letter})"
+    if kind == "bullet":
+        prev = path[5]
+        return LEVELS["bullet"], f"-{int(prev[1:]) + 1 if prev else 1}"
+    if kind == "sub":
+        return LEVELS["sub"], f"({m.group('sub').decode()})"
+    return LEVELS[kind], m.group(kind).decode()
+
+
+def _emit(data, doc_id, start, end, path):
+    while start < end and data[start:start + 1].isspace():
+        start += 1
+    while end > start and data[end - 1:end].isspace():
+        end -= 1
+    if end - start < MIN_CLAUSE_CHARS:
+        return
+
+    joined = "/".join(p for p in path if p)
+    while end - start > MAX_CLAUSE_CHARS:
+        cut = None
+        for s in SENTENCE_END_PATTERN.finditer(data, start + MIN_CLAUSE_CHARS, start + MAX_CLAUSE_CHARS):
+            cut = s.end()
+        if cut is None:
+            break
+        yield Span(doc_id, start, cut, joined)
+        start = cut
+        while start < end and data[start:start + 1].isspace():
+            start += 1
+    if end - start >= MIN_CLAUSE_CHARS:
+        yield Span(doc_id, start, end, joined)
+
+
+def segment(data, doc_id):
+    """Yield clause Spans for one document (bytes or mmap, UTF-8)."""
+    path = [None] * (max(LEVELS.values()) + 1)
+    start = 0
+    kind = None
+
+    for m in MARKER_PATTERN.finditer(data):
+        new_kind = m.lastgroup
+        if new_kind not in ("page", "footnote", "heading") and not _ends_item(data, m.start()):
+            continue
+
+        # Close the previous segment
+        if kind == "page":
+            line_end = data.find(b"\n", start)
+            if line_end != -1:
+                yield from _emit(data, doc_id, line_end + 1, m.start(), path)
+        elif kind != "footnote":
+            yield from _emit(data, doc_id, start, m.start(), path)
+
+        kind = new_kind
+        start = m.start()
+        if kind in ("page", "footnote"):
+            continue
+
+        level, label = _label(kind, m, path)
+        path[level] = label
+        for deeper in range(level + 1, len(path)):
+            path[deeper] = None
+        if kind == "section":
+            inline = INLINE_SUB_PATTERN.match(data, m.end())
+            if inline:
+                path[LEVELS["sub"]] = f"({inline.group(1).decode()})"
+
+    if kind == "page":
+        line_end = data.find(b"\n", start)
+        if line_end != -1:
+            yield from _emit(data, doc_id, line_end + 1, len(data), path)
+    elif kind != "footnote":
+        yield from _emit(data, doc_id, start, len(data), path)
+
+
+class DocumentStore:
+    """Cleaned documents in a folder, memory-mapped on first use."""
+
+    def __init__(self, folder, suffix=".txt"):
+        self.folder = folder
+        self.suffix = suffix
+        self._maps = {}
+
+    def doc_ids(self):
+        return sorted(f[:-len(self.suffix)] for f in os.listdir(self.folder) if f.endswith(self.suffix))
+
+    def open(self, doc_id):
+        data = self._maps.get(doc_id)
+        if data is None:
+            with open(os.path.join(self.folder, doc_id + self.suffix), "rb") as f:
+                try:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except ValueError:      # empty file
+                    data = b""
+            self._maps[doc_id] = data
+        return data
+
+    def text(self, span):
+        """The clause text, whitespace (including line breaks) collapsed."""
+        raw = self.open(span.doc_id)[span.start:span.end].decode("utf-8", "replace")
+        return " ".join(raw.split())
+
+    def segment(self, doc_id):
+        return segment(self.open(doc_id), doc_id)
+
+    def segment_all(self):
+        for doc_id in self.doc_ids():
+            yield from self.segment(doc_id)
+
+    def close(self):
+        for data in self._maps.values():
+            if isinstance(data, mmap.mmap):
+                data.close()
+        self._maps.clear()
+
+
+def span_id(span):
+    """Stable clause ID: the same span always gets the same ID."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{span.doc_id}:{span.start}:{span.end}"))
+
+
+def save_spans(spans, path):
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for span in spans:
+            f.write(json.dumps(span._asdict()) + "\n")
+            count += 1
+    return count
+
+
+def load_spans(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield Span(**json.loads(line))
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    folder = sys.argv[1] if len(sys.argv) > 1 else "cleaned_docs"
+    verbose = "-v" in sys.argv
+    store = DocumentStore(folder)
+
+    docs = sorted(store.doc_ids(), key=lambda d: -len(store.open(d)))
+    total_bytes = total_spans = 0
+    total_seconds = 0.0
+    print(f"{'document':50s} {'KB':>7s} {'spans':>6s} {'depth':>5s} {'MB/s':>7s}")
+    for doc_id in docs:
+        data = store.open(doc_id)
+        start = time.perf_counter()
+        for _ in range(5):
+            spans = list(segment(data, doc_id))
+        seconds = (time.perf_counter() - start) / 5
+        depth = max((s.path.count("/") + 1 for s in spans if s.path), default=0)
+        total_bytes += len(data)
+        total_spans += len(spans)
+        total_seconds += seconds
+        print(f"{doc_id[:50]:50s} {len(data) / 1024:7.0f} {len(spans):6d} {depth:5d} "
+              f"{len(data) / 1e6 / max(seconds, 1e-9):7.1f}")
+        if verbose:
+            for span in spans[:40]:
+                print(f"    {span.path:28s} {store.text(span)[:70]}")
+    print(f"{'total':50s} {total_bytes / 1024:7.0f} {total_spans:6d} {'':5s} "
+          f"{total_bytes / 1e6 / max(total_seconds, 1e-9):7.1f}")
+    store.close()
@@ -8,8 +8,15 @@ import spacy
 from datetime import datetime
 import re
 
+import metrics
+import tracing
+from contract_engine import ContractEngine, add_ask_routes
+from contract_template import ContractTemplate, clause_key, section_cache
+
 app = Flask(__name__)
 CORS(app)
+metrics.instrument_app(app)
+tracing.instrument_app(app)
 
 # Configuration
 OLLAMA_URL = "http://localhost:11434/api/generate"
@@ -24,6 +31,9 @@ except OSError:
     print("spaCy model not found. Install with: python -m spacy download en_core_web_sm")
     nlp = None
 
+contract_engine = ContractEngine()
+add_ask_routes(app, contract_engine)
+
 # Contract templates and clauses
 CONTRACT_CLAUSES = {
     "penalty": {
@@ -141,12 +151,10 @@ def generate_negotiation_summary(query, clauses):
     
     return summary
 
-def generate_contract(query, entities, clauses):
-    """Generate a full contract based on analysis"""
-    contract_template = f"""
+AGREEMENT_TEMPLATE = ContractTemplate("""
 LOGISTICS SERVICE AGREEMENT
 
-This Logistics Service Agreement ("Agreement") is entered into on {datetime.now().strftime('%B %d, %Y')} between [CLIENT NAME] ("Client") and [SERVICE PROVIDER] ("Provider").
+This Logistics Service Agreement ("Agreement") is entered into on {date} between [CLIENT NAME] ("Client") and [SERVICE PROVIDER] ("Provider").
 
 RECITALS
 WHEREAS, Client requires logistics and delivery services; and
@@ -167,13 +175,7 @@ Provider shall provide the following services:
 2.3 Proof of Delivery: Electronic confirmation required for all deliveries
 
 3. PENALTIES AND SERVICE LEVEL AGREEMENTS
-"""
-    
-    # Add relevant clauses
-    for clause in clauses[:3]:  # Top 3 relevant clauses
-        contract_template += f"\n3.{len(clauses)} {clause['category']}: {clause['text']}\n"
-    
-    contract_template += """
+{clauses}
 4. PRICING AND PAYMENT
 4.1 Service Fees: As specified in Schedule A
 4.2 Fuel Surcharges: Applied based on current fuel prices
@@ -207,9 +209,19 @@ _________________         _________________
 Date: ___________         Date: ___________
 
 [Additional 30+ pages of detailed terms, schedules, and appendices would follow...]
-"""
-    
-    return contract_template.strip()
+""")
+
+@section_cache()
+def render_clause_section(clauses, total):
+    """Render the matched clauses for section 3"""
+    return "".join(f"\n3.{total} {category}: {text}\n" for category, text in clauses)
+
+def generate_contract(query, entities, clauses):
+    """Generate a full contract based on analysis"""
+    return AGREEMENT_TEMPLATE.render(
+        date=datetime.now().strftime('%B %d, %Y'),
+        clauses=render_clause_section(clause_key(clauses, 3), len(clauses))
+    )
 
 @app.route('/')
 def index():
@@ -225,13 +237,16 @@ def analyze_query():
             return jsonify({"error": "Query is required"}), 400
         
         # 1. NER Analysis
-        entities = extract_entities(query)
+        with tracing.span("ner"):
+            entities = extract_entities(query)
         
         # 2. Find relevant clauses
-        relevant_clauses = find_relevant_clauses(query)
+        with tracing.span("retrieval"):
+            relevant_clauses = find_relevant_clauses(query)
         
         # 3. Generate negotiation summary
-        negotiation_summary = generate_negotiation_summary(query, relevant_clauses)
+        with tracing.span("negotiation"):
+            negotiation_summary = generate_negotiation_summary(query, relevant_clauses)
         
         # 4. Generate final answer
         final_answer = {
@@ -243,7 +258,8 @@ def analyze_query():
         }
         
         # 5. Generate contract
-        contract_text = generate_contract(query, entities, relevant_clauses)
+        with tracing.span("contract"):
+            contract_text = generate_contract(query, entities, relevant_clauses)
         
         return jsonify({
             "ner_result": {
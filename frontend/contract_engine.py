@@ -0,0 +1,696 @@
+"""
+Retrieval-augmented contract Q&A (ported from dataset/scrape.ipynb).
+
+ContractEngine.ask runs: query interpretation (regex/lexicon fast path, LLaMA
+only for what it cannot fill) → embedding → Milvus vector search → LLM
+reranking → structured answer generation. Every stage is a tracing span, so
+a slow request shows where the time went.
+
+ContractEngine.ask_batch answers many queries at once: duplicates are
+collapsed, all queries are embedded in one call and searched in one
+multi-vector search, and the LLM calls run on a shared bounded pool.
+"""
+import contextvars
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import answer_rules
+import local_embedder
+import metrics
+import ollama_client
+import partitions
+import query_analyzer
+import tracing
+
+try:
+    from pymilvus import Collection, connections
+    from pymilvus.exceptions import MilvusException
+except ImportError:
+    print("pymilvus not found. Vector search disabled. Install with: pip install pymilvus")
+    Collection = None
+
+# "milvus", "memory" to search VECTOR_FILE in process (no Milvus server), or
+# "quantized" to search compressed codes in VECTOR_DIR (quantized_store.py)
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "milvus")
+VECTOR_FILE = os.environ.get("VECTOR_FILE", "embeddings.jsonl")
+VECTOR_DIR = os.environ.get("VECTOR_DIR", "vectors")
+QUANT_MODE = os.environ.get("QUANT_MODE", "int8")      # int8, binary or pq
+
+MILVUS_HOST = "127.0.0.1"
+MILVUS_PORT = "19540"
+COLLECTION_NAME = "logistics_clauses"
+TOP_K = 10
+
+# Backends search whatever this alias points at (reembed.py swaps it);
+# before the first migration it does not exist and COLLECTION_NAME is used
+SERVING_ALIAS = os.environ.get("SERVING_ALIAS", "logistics_clauses_serving")
+SERVING_REFRESH = float(os.environ.get("SERVING_REFRESH", 30))
+
+# Concurrent Ollama calls per process, shared by all batches
+LLM_WORKERS = int(os.environ.get("LLM_WORKERS", 8))
+MAX_BATCH = 1000
+BATCH_WINDOW = LLM_WORKERS
+# Longest wait for the next answer of a batch before the rest are failed
+BATCH_TIMEOUT = float(os.environ.get("BATCH_TIMEOUT", 300))
+
+_serving = None     # (collection, embed model, resolved at)
+_serving_lock = threading.Lock()
+_llm_pool = None
+_llm_pool_lock = threading.Lock()
+
+# Mean latency of interpretation LLM calls, to estimate what a skip saves
+_llm_seconds = {}
+_llm_seconds_lock = threading.Lock()
+
+
+def llama_json_call(prompt: str):
+    """
+    Calls LLaMA through Ollama and attempts to parse the reply as JSON.
+    Returns the raw text when it is not JSON.
+    """
+    full_text = ollama_client.generate(prompt).strip()
+
+    # Try JSON
+    try:
+        return json.loads(full_text)
+    except:
+        return full_text
+
+
+def extract_dates(text):
+    return query_analyzer.analyze(text)[0]["entities"]["dates"]
+
+def extract_money(text):
+    return query_analyzer.analyze(text)[0]["entities"]["amounts"]
+
+def extract_percentage(text):
+    return query_analyzer.analyze(text)[0]["entities"]["percentages"]
+
+def extract_duration(text):
+    return query_analyzer.analyze(text)[0]["entities"]["duration"]
+
+def extract_jurisdiction(text):
+    return query_analyzer.analyze(text)[0]["jurisdiction"]
+
+
+def classify_query_with_llama(query):
+    prompt = f"""
+Classify the user query into:
+- intent
+- category
+
+User Query: "{query}"
+
+Return JSON only:
+{{
+  "intent": "...",
+  "category": "..."
+}}
+"""
+    resp = llama_json_call(prompt)
+
+    if isinstance(resp, dict):
+        return resp
+
+    try:
+        return json.loads(resp)
+    except:
+        return {"intent": "unknown", "category": "unknown"}
+
+
+def llama_entity_extract(query):
+    prompt = f"""
+Extract the following entities:
+
+- event
+- shipment_type
+- damage_type
+- delay_reason
+- weather_condition
+- party_names
+
+Return JSON only.
+Query: "{query}"
+"""
+    resp = llama_json_call(prompt)
+
+    if isinstance(resp, dict):
+        return resp
+
+    try:
+        return json.loads(resp)
+    except:
+        return {}
+
+
+def _record_llm_call(call, seconds=None, stage="interpret"):
+    """Count a made (with its latency) or skipped LLM call."""
+    with _llm_seconds_lock:
+        total, count = _llm_seconds.get(call, (0.0, 0))
+        if seconds is not None:
+            _llm_seconds[call] = (total + seconds, count + 1)
+    if seconds is not None:
+        metrics.inc(f"{stage}_llm_calls_total", call=call, outcome="called")
+    else:
+        metrics.inc(f"{stage}_llm_calls_total", call=call, outcome="skipped")
+        if count:
+            metrics.inc(f"{stage}_llm_saved_seconds_total", total / count, call=call)
+
+
+def interpret_query(query):
+    """
+    Regex/lexicon fast path first; the LLM is only asked for fields the
+    fast path could not fill with confidence. Adds `confidence` per field
+    and `llm_fields` (the fields the LLM filled).
+    """
+    with tracing.span("interpret.fast_path"):
+        result, confidence, missing = query_analyzer.analyze(query)
+
+    llm_fields = []
+
+    if "intent" in missing or "category" in missing:
+        start = time.perf_counter()
+        with tracing.span("interpret.llm_classify"):
+            cls = classify_query_with_llama(query)
+        _record_llm_call("classify", time.perf_counter() - start)
+        for field in ("intent", "category"):
+            if field in missing and cls.get(field):
+                result[field] = cls[field]
+                llm_fields.append(field)
+    else:
+        _record_llm_call("classify")
+
+    if any(f in missing for f in query_analyzer.ENTITY_FIELDS):
+        start = time.perf_counter()
+        with tracing.span("interpret.llm_entities"):
+            llm_entities = llama_entity_extract(query)
+        _record_llm_call("entities", time.perf_counter() - start)
+        entities = result["entities"]
+        for field, value in llm_entities.items():
+            if field in missing or field not in entities:
+                entities[field] = value
+                llm_fields.append(field)
+    else:
+        _record_llm_call("entities")
+
+    metrics.inc("interpret_total", path="llm" if llm_fields else "fast")
+    result["confidence"] = confidence
+    result["llm_fields"] = llm_fields
+    return result
+
+
+def embed(text, model=None):
+    return local_embedder.embed(text, model=model or serving()[1])[0]
+
+
+def embed_many(texts, model=None):
+    """One Ollama call (or one ONNX batch) for all `texts`."""
+    return local_embedder.embed(list(texts), model=model or serving()[1])
+
+
+def collection_info(collection):
+    """
+    Embedding model, dimension, real name and predecessor of a collection,
+    kept as JSON in its description by reembed.py. The notebook's
+    COLLECTION_NAME has a plain description and the default model.
+    """
+    try:
+        info = json.loads(collection.description)
+    except (TypeError, ValueError):
+        info = None
+    if not isinstance(info, dict) or "embed_model" not in info:
+        info = {"embed_model": ollama_client.EMBED_MODEL, "collection": COLLECTION_NAME}
+    return info
+
+
+def resolve_serving():
+    """(loaded collection, info) behind SERVING_ALIAS, else COLLECTION_NAME."""
+    if Collection is None:
+        raise RuntimeError("pymilvus is required for vector search")
+    connections.connect("default", host=MILVUS_HOST, port=MILVUS_PORT)
+    try:
+        aliased = Collection(SERVING_ALIAS)
+    except MilvusException:
+        aliased = Collection(COLLECTION_NAME)
+    info = collection_info(aliased)
+
+    # Pin the real collection so an alias swap changes vectors and query
+    # model together, at the next refresh
+    collection = Collection(info["collection"])
+    collection.load()
+    return collection, info
+
+
+def serving():
+    """(collection, embed model) for search, re-resolved every SERVING_REFRESH s."""
+    global _serving
+    with _serving_lock:
+        if _serving is None and VECTOR_BACKEND == "memory":
+            from vector_store import InMemoryCollection
+            _serving = (InMemoryCollection.from_embeddings_file(VECTOR_FILE), ollama_client.EMBED_MODEL, 0.0)
+        elif _serving is None and VECTOR_BACKEND == "quantized":
+            from quantized_store import QuantizedCollection
+            _serving = (QuantizedCollection(VECTOR_DIR, QUANT_MODE), ollama_client.EMBED_MODEL, 0.0)
+        elif VECTOR_BACKEND not in ("memory", "quantized") and (_serving is None or time.monotonic() - _serving[2] > SERVING_REFRESH):
+            try:
+                collection, info = resolve_serving()
+                _serving = (collection, info["embed_model"], time.monotonic())
+            except Exception:
+                if _serving is None:
+                    raise
+                # Milvus unreachable: keep serving what we have
+                _serving = (_serving[0], _serving[1], time.monotonic())
+        return _serving[0], _serving[1]
+
+
+def get_collection():
+    """Connect to Milvus and load the serving clause collection on first use."""
+    return serving()[0]
+
+
+def search_milvus_many(query_embeddings, top_k=TOP_K, collection=None, partition_names=None):
+    """
+    One multi-vector search; a list of hits per query embedding. With
+    `partition_names` (partitions.route) only those partitions are probed;
+    queries they cannot fill to top_k are searched again in full.
+    """
+    if collection is None:
+        collection = get_collection()
+    probe = partitions.probe(collection, partition_names)
+    hits = _search(collection, query_embeddings, top_k, probe)
+
+    if probe is None:
+        metrics.inc("search_total", len(hits), route="full")
+        return hits
+
+    short = [i for i, h in enumerate(hits) if len(h) < top_k]
+    if short:
+        # Counted as fallback only, not again as full searches
+        refills = _search(collection, [query_embeddings[i] for i in short], top_k, None)
+        for i, refilled in zip(short, refills):
+            hits[i] = refilled
+    metrics.inc("search_total", len(hits) - len(short), route="routed")
+    metrics.inc("search_total", len(short), route="fallback")
+    return hits
+
+
+def _search(collection, query_embeddings, top_k, probe):
+    # Milvus has no per-call request header; the ID is kept on the span
+    with tracing.span("milvus.search", request_id=tracing.current_request_id(), top_k=top_k,
+                      vectors=len(query_embeddings), partitions=len(probe) if probe else "all"):
+        results = list(collection.search(
+            data=list(query_embeddings),
+            anns_field="embedding",
+            param={"metric_type": "COSINE", "params": {"nprobe": 10}},
+            limit=top_k,
+            output_fields=["category", "risk_type", "summary", "jurisdiction"],
+            partition_names=probe
+        ))
+    return _hits(results)
+
+
+def _hits(results):
+    return [
+        [
+            {
+                "id": hit.id,
+                "distance": hit.distance,
+                "category": hit.entity.get("category"),
+                "risk_type": hit.entity.get("risk_type"),
+                "summary": hit.entity.get("summary"),
+                "jurisdiction": hit.entity.get("jurisdiction")
+            }
+            for hit in hits
+        ]
+        for hits in results
+    ]
+
+
+def search_milvus(query_embedding, top_k=TOP_K, collection=None, partition_names=None):
+    return search_milvus_many([query_embedding], top_k, collection, partition_names)[0]
+
+
+def rerank_score(query, hit):
+    prompt = f"""
+Rate how relevant this clause summary is to the query (0-1 scale).
+
+Query: {query}
+Clause Summary: {hit['summary']}
+
+Return only a NUMBER.
+"""
+    resp = llama_json_call(prompt)
+
+    try:
+        return float(resp)
+    except:
+        return 0.0
+
+
+def rerank(query, hits):
+    scored = []
+    for h in hits:
+        h["rerank_score"] = rerank_score(query, h)
+        scored.append(h)
+
+    scored.sort(key=lambda x: x["rerank_score"], reverse=True)
+    return scored
+
+
+def generate_answer(query, ner, top_clause):
+    prompt = f"""
+You are an AI Contract Analyst.
+
+Your job is to generate a structured JSON output with the following format:
+
+{{
+  "answer": "Short human-friendly answer.",
+  "clause_used": "The clause summary used to generate the answer.",
+  "is_penalty_applicable": true/false,
+  "reasoning": "Why this answer was generated.",
+  "confidence": 0.0 to 1.0,
+  "final_output": "Clean final sentence replying to the user."
+}}
+
+Instructions:
+- Use ONLY information from the clause and NER.
+- If weather-related delays, strikes, floods, or natural disasters appear → often no penalty.
+- If delay_reason includes negligence, compliance issue, or avoidable event → penalty may apply.
+- Confidence must be a number between 0 and 1.
+
+User Query:
+{query}
+
+NER Extracted:
+{json.dumps(ner, indent=2)}
+
+Relevant Clause Summary:
+{top_clause['summary']}
+
+Generate STRICT JSON only.
+"""
+
+    resp = llama_json_call(prompt)
+
+    # Ensure final output is JSON dict
+    if isinstance(resp, dict):
+        return resp
+
+    try:
+        return json.loads(resp)
+    except:
+        return {
+            "answer": "Unable to parse model output.",
+            "clause_used": top_clause['summary'],
+            "is_penalty_applicable": False,
+            "reasoning": "Model returned unstructured output.",
+            "confidence": 0.0,
+            "final_output": "System error occurred."
+        }
+
+
+def rule_answer(ner, top_clause, threshold=None):
+    """The rule-based answer, or None when rule confidence is below threshold."""
+    threshold = answer_rules.RULE_THRESHOLD if threshold is None else threshold
+    with tracing.span("answer.rules"):
+        answer, confidence = answer_rules.synthesize(ner, top_clause)
+    if answer is None or confidence < threshold:
+        return None
+    _record_llm_call("answer", stage="answer")
+    metrics.inc("answer_total", source="rules")
+    return answer
+
+
+def llm_answer(query, ner, top_clause):
+    start = time.perf_counter()
+    with tracing.span("answer.llm"):
+        answer = generate_answer(query, ner, top_clause)
+    _record_llm_call("answer", time.perf_counter() - start, stage="answer")
+    metrics.inc("answer_total", source="llm")
+    return answer
+
+
+def answer_query(query, ner, top_clause, threshold=None):
+    """Rule-based answer when confident, otherwise the LLM (generate_answer)."""
+    return rule_answer(ner, top_clause, threshold) or llm_answer(query, ner, top_clause)
+
+
+def llm_pool():
+    """Process-wide pool bounding concurrent LLM calls (created after fork)."""
+    global _llm_pool
+    with _llm_pool_lock:
+        if _llm_pool is None:
+            _llm_pool = ThreadPoolExecutor(max_workers=LLM_WORKERS, thread_name_prefix="llm")
+    return _llm_pool
+
+
+def _submit(fn, *args):
+    # Run in a copy of the caller's context so spans join the request trace
+    return llm_pool().submit(contextvars.copy_context().run, fn, *args)
+
+
+def normalize_query(query):
+    return " ".join(query.split()).lower()
+
+
+class _BatchItem:
+    """LLM work for one unique query: interpret + one rerank per hit, then answer."""
+
+    def __init__(self, query, indices, hits, done, context):
+        self.query = query
+        self.indices = indices
+        self.hits = hits
+        self.done = done
+        self.context = context
+        self.ner = None
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.error = None
+
+    # The callbacks run in executor done-callbacks, which swallow exceptions:
+    # every failure has to reach self.done or the batch waits for nothing.
+    # They also run outside the request context, so submits and the answer
+    # step go through self.context; each run takes a fresh copy because a
+    # Context cannot be entered by two threads at once.
+
+    def start(self):
+        self.context.copy().run(self._start)
+
+    def _start(self):
+        if not self.hits:
+            self.done(self, None, RuntimeError("No clauses found"))
+            return
+        self.pending = len(self.hits) + 1
+        try:
+            _submit(interpret_query, self.query).add_done_callback(self._interpreted)
+            for hit in self.hits:
+                _submit(rerank_score, self.query, hit).add_done_callback(
+                    lambda f, hit=hit: self._scored(hit, f))
+        except Exception as e:
+            # Nothing submitted yet has to finish before the error is reported
+            self.error = e
+            with self.lock:
+                self.pending = 0
+            self.done(self, None, e)
+
+    def _interpreted(self, future):
+        try:
+            self.ner = future.result()
+        except Exception as e:
+            self.error = self.error or e
+        self._step()
+
+    def _scored(self, hit, future):
+        try:
+            hit["rerank_score"] = future.result()
+        except Exception as e:
+            self.error = self.error or e
+        self._step()
+
+    def _step(self):
+        with self.lock:
+            if self.pending <= 0:
+                return
+            self.pending -= 1
+            if self.pending:
+                return
+        self.context.copy().run(self._finish)
+
+    def _finish(self):
+        try:
+            if self.error:
+                raise self.error
+            self.hits.sort(key=lambda x: x.get("rerank_score", 0.0), reverse=True)
+            answer = rule_answer(self.ner, self.hits[0])
+            if answer is not None:
+                self.done(self, {"answer": answer, "supporting_clause": self.hits[0], "ner": self.ner}, None)
+                return
+            _submit(llm_answer, self.query, self.ner, self.hits[0]).add_done_callback(self._answered)
+        except Exception as e:
+            self.done(self, None, e)
+
+    def _answered(self, future):
+        try:
+            answer = future.result()
+        except Exception as e:
+            self.done(self, None, e)
+            return
+        self.done(self, {"answer": answer, "supporting_clause": self.hits[0], "ner": self.ner}, None)
+
+
+class ContractEngine:
+
+    def ask(self, query):
+        # Outside a request (notebook, scripts) each ask is its own trace
+        trace = None
+        if tracing.current_trace() is None:
+            trace = tracing.start_trace("ContractEngine.ask")
+
+        try:
+            with tracing.span("ask"):
+                with tracing.span("interpret"):
+                    ner = interpret_query(query)                 # 1. NER
+                collection, model = serving()                    # same model as the vectors
+                with tracing.span("embed"):
+                    vec = embed(query, model)                    # 2. Embedding
+                with tracing.span("search"):                     # 3. Vector search, pruned to the
+                    results = search_milvus(vec, collection=collection,  # query's jurisdiction/category
+                                            partition_names=partitions.route(ner))
+                with tracing.span("rerank", hits=len(results)):
+                    ranked = rerank(query, results)              # 4. Reranking
+                with tracing.span("answer"):
+                    answer = answer_query(query, ner, ranked[0])   # 5. Final answer (rules, else LLM)
+        finally:
+            # A failed ask must not leave its trace as the thread's current one
+            if trace is not None:
+                try:
+                    tracing.dump(trace.finish())
+                finally:
+                    tracing.end_trace()
+
+        return {
+            "answer": answer,
+            "supporting_clause": ranked[0],
+            "ner": ner
+        }
+
+    def ask_batch(self, queries, top_k=TOP_K):
+        """
+        Answer many queries; returns an iterator yielding one result per
+        input query as soon as its answer is ready (not in input order).
+        Each result carries the input `index`; duplicates share one pipeline
+        run. Embedding and search run before this returns, so their errors
+        raise here rather than from the iterator.
+        """
+        if len(queries) > MAX_BATCH:
+            raise ValueError(f"At most {MAX_BATCH} queries per batch")
+
+        unique = {}
+        for i, q in enumerate(queries):
+            unique.setdefault(normalize_query(q), (q, []))[1].append(i)
+        items = list(unique.values())
+
+        with tracing.span("ask_batch", queries=len(queries), unique=len(items)):
+            collection, model = serving()
+            with tracing.span("embed", count=len(items)):
+                vectors = embed_many([q for q, _ in items], model)
+            with tracing.span("search", count=len(items)):
+                # One search per partition route, from the regex fast path
+                # (the full interpretation runs later, per item)
+                routes = {}
+                for i, (q, _) in enumerate(items):
+                    result, confidence, _ = query_analyzer.analyze(q)
+                    names = partitions.route(dict(result, confidence=confidence))
+                    routes.setdefault(tuple(names) if names else None, []).append(i)
+                all_hits = [None] * len(items)
+                for names, indices in routes.items():
+                    found = search_milvus_many([vectors[i] for i in indices], top_k, collection,
+                                               list(names) if names else None)
+                    for i, hits in zip(indices, found):
+                        all_hits[i] = hits
+
+        # Answers are started while the caller iterates (e.g. while a response
+        # streams); run them in this context so their spans join the trace
+        return self._answers(queries, items, all_hits, contextvars.copy_context())
+
+    def _answers(self, queries, items, all_hits, context):
+        # Keep a window of queries in flight so answers stream out early
+        finished = queue.Queue()
+        pending = iter(zip(items, all_hits))
+
+        def start_next():
+            for (query, indices), hits in pending:
+                _BatchItem(query, indices, hits, lambda *done: finished.put(done), context).start()
+                return
+
+        for _ in range(BATCH_WINDOW):
+            start_next()
+
+        reported = set()
+        for _ in items:
+            try:
+                item, result, error = finished.get(timeout=BATCH_TIMEOUT)
+            except queue.Empty:
+                error = TimeoutError(f"No answer within {BATCH_TIMEOUT:g}s")
+                for _, indices in items:
+                    if indices[0] not in reported:
+                        for i in indices:
+                            yield {"index": i, "query": queries[i], "error": str(error)}
+                return
+            reported.add(item.indices[0])
+            start_next()
+            for i in item.indices:
+                if error is not None:
+                    yield {"index": i, "query": queries[i], "error": str(error)}
+                else:
+                    yield {"index": i, "query": queries[i], **result}
+
+
+def add_ask_routes(app, engine):
+    """/api/ask and the streaming /api/ask/batch for a Flask app."""
+    from flask import Response, jsonify, request, stream_with_context
+
+    @app.route('/api/ask', methods=['POST'])
+    def ask_engine():
+        """RAG answer from the Milvus clause collection (ContractEngine.ask)."""
+        try:
+            data = request.json
+            query = data.get('query', '')
+
+            if not query:
+                return jsonify({"error": "Query is required"}), 400
+
+            return jsonify(engine.ask(query))
+
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    @app.route('/api/ask/batch', methods=['POST'])
+    def ask_engine_batch():
+        """Answer many queries; streams one JSON line per query as it completes."""
+        try:
+            data = request.json
+            queries = data.get('queries', [])
+
+            if not queries or not all(isinstance(q, str) and q.strip() for q in queries):
+                return jsonify({"error": "queries must be a non-empty list of strings"}), 400
+            if len(queries) > MAX_BATCH:
+                return jsonify({"error": f"At most {MAX_BATCH} queries per batch"}), 400
+
+            # Embedding/search errors surface here, before the stream starts
+            results = engine.ask_batch(queries)
+
+            def stream():
+                for result in results:
+                    yield json.dumps(result) + "\n"
+
+            return Response(stream_with_context(stream()), mimetype="application/x-ndjson")
+
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    return app
@@ -0,0 +1,64 @@
+"""
+Precompiled contract templates.
+
+A template is parsed once into static text segments and named `{slot}`
+placeholders. Rendering only fills the slots, so the work done per contract
+depends on the number of slots rather than on how long the agreement is.
+"""
+import string
+from functools import lru_cache
+
+_FORMATTER = string.Formatter()
+
+
+class ContractTemplate:
+    """Agreement text compiled into static segments and clause slots."""
+
+    def __init__(self, source, strip=True):
+        if strip:
+            source = source.strip()
+
+        statics = []
+        slots = []
+        pending = []
+
+        for literal, field, spec, conversion in _FORMATTER.parse(source):
+            if literal:
+                pending.append(literal)
+            if field is None:
+                continue
+            if not field or spec or conversion:
+                raise ValueError(f"Unsupported placeholder in template: {{{field}}}")
+
+            statics.append("".join(pending))
+            slots.append(field)
+            pending = []
+
+        statics.append("".join(pending))
+
+        self.statics = tuple(statics)
+        self.slots = tuple(slots)
+
+    def stream(self, **values):
+        """Yield the contract piece by piece without building the full text."""
+        statics = self.statics
+        for i, slot in enumerate(self.slots):
+            if statics[i]:
+                yield statics[i]
+            yield values[slot]
+        if statics[-1]:
+            yield statics[-1]
+
+    def render(self, **values):
+        """Return the complete contract text."""
+        return "".join(self.stream(**values))
+
+
+def section_cache(maxsize=256):
+    """Cache a section renderer keyed by its (hashable) inputs."""
+    return lru_cache(maxsize=maxsize)
+
+
+def clause_key(clauses, limit):
+    """Hashable (category, text) key for the first `limit` clauses."""
+    return tuple((c["category"], c["text"]) for c in clauses[:limit])
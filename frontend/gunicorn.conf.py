@@ -0,0 +1,79 @@
+"""
+Gunicorn settings for the contract backends (pre-fork, threaded workers).
+
+    BACKEND=simple WORKERS=4 THREADS=32 gunicorn -c gunicorn.conf.py wsgi:app
+
+Each worker runs THREADS request threads, so a slow Ollama call only
+occupies one thread. On SIGTERM a worker reports draining on /healthz for
+DRAIN_DELAY seconds (load balancer stops routing), then stops accepting and
+finishes in-flight requests within graceful_timeout.
+
+Metrics are kept per worker; METRICS_DIR (a fresh temporary directory by
+default) is where the workers share them, so /metrics and /api/status
+report totals for the whole server whichever worker answers.
+"""
+import glob
+import multiprocessing
+import os
+import signal
+import tempfile
+import threading
+
+bind = os.environ.get("BIND", "0.0.0.0:5001")
+workers = int(os.environ.get("WORKERS", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.environ.get("THREADS", 32))
+
+# Load spaCy / NER and the app once in the master, before forking
+preload_app = True
+
+DRAIN_DELAY = float(os.environ.get("DRAIN_DELAY", 5))
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", 60))
+timeout = int(os.environ.get("TIMEOUT", 120))
+keepalive = int(os.environ.get("KEEPALIVE", 5))
+
+accesslog = os.environ.get("ACCESS_LOG")
+
+# Set before the app (and metrics.py) is imported by preload_app
+# (a configured directory is used as is, no stray temporary one is made)
+if not os.environ.get("METRICS_DIR"):
+    os.environ["METRICS_DIR"] = tempfile.mkdtemp(prefix="contract_metrics_")
+
+
+def on_starting(server):
+    # Values of a previous server run would be summed in
+    os.makedirs(os.environ["METRICS_DIR"], exist_ok=True)
+    for path in glob.glob(os.path.join(os.environ["METRICS_DIR"], "*.json")):
+        os.remove(path)
+
+
+def child_exit(server, worker):
+    import metrics
+    metrics.mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    import metrics
+    metrics.flush()
+
+
+def post_worker_init(worker):
+    import limits
+    import metrics
+
+    # Start from zero: anything recorded in the master while preloading is
+    # not this worker's
+    metrics.reset()
+    metrics.start_flusher()
+
+    stop = worker.handle_exit
+
+    def drain_then_exit(sig, frame):
+        if limits.is_draining():
+            return
+        limits.start_draining()
+        worker.log.info("Worker %s draining for %.1fs", worker.pid, DRAIN_DELAY)
+        threading.Timer(DRAIN_DELAY, stop, args=(sig, frame)).start()
+
+    signal.signal(signal.SIGTERM, drain_then_exit)
+    signal.siginterrupt(signal.SIGTERM, False)
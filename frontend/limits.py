@@ -0,0 +1,90 @@
+"""
+Per-route concurrency limits and graceful draining.
+
+Each limited route gets a semaphore (per worker process). A request that
+cannot get a slot within QUEUE_TIMEOUT seconds is rejected with 503 and
+Retry-After instead of piling up behind slow Ollama calls. Once draining
+starts (SIGTERM), /healthz reports 503 so the load balancer stops routing
+here while in-flight requests finish.
+"""
+import os
+import threading
+
+import metrics
+
+# ROUTE_LIMITS="/api/analyze=16,/api/ask=4"
+# /api/ask matches the default THREADS: keep-alive connections stick to one
+# worker, so a worker can get far more than its share of slow /ask calls and
+# a tighter limit sheds them even when the server as a whole is not busy
+DEFAULT_LIMITS = {"/api/analyze": 32, "/api/ask": 32, "/api/ask/batch": 2}
+QUEUE_TIMEOUT = float(os.environ.get("QUEUE_TIMEOUT", "2.0"))
+
+_draining = threading.Event()
+
+
+def parse_limits(text):
+    limits = {}
+    for part in filter(None, text.split(",")):
+        route, _, value = part.partition("=")
+        limits[route.strip()] = int(value)
+    return limits
+
+
+def route_limits():
+    text = os.environ.get("ROUTE_LIMITS")
+    return parse_limits(text) if text else dict(DEFAULT_LIMITS)
+
+
+def start_draining():
+    _draining.set()
+
+
+def is_draining():
+    return _draining.is_set()
+
+
+def limit_routes(app, limits=None, queue_timeout=QUEUE_TIMEOUT):
+    """Cap concurrent requests per URL rule; adds /healthz."""
+    from flask import g, jsonify, request
+
+    limits = route_limits() if limits is None else limits
+    slots = {route: threading.BoundedSemaphore(n) for route, n in limits.items()}
+    inflight = {route: 0 for route in limits}
+    lock = threading.Lock()
+
+    def _update(route, delta):
+        with lock:
+            inflight[route] += delta
+            metrics.set_gauge("inflight_requests", inflight[route], route=route)
+
+    @app.before_request
+    def _acquire_slot():
+        route = request.url_rule.rule if request.url_rule else None
+        slot = slots.get(route)
+        if slot is None:
+            return None
+
+        if not slot.acquire(timeout=queue_timeout):
+            metrics.inc("rejected_requests_total", route=route)
+            response = jsonify({"error": "Too many concurrent requests", "route": route})
+            response.status_code = 503
+            response.headers["Retry-After"] = "1"
+            return response
+
+        g._route_slot = route
+        _update(route, 1)
+
+    @app.teardown_request
+    def _release_slot(exc):
+        route = g.pop("_route_slot", None)
+        if route is not None:
+            _update(route, -1)
+            slots[route].release()
+
+    @app.route('/healthz')
+    def healthz():
+        if is_draining():
+            return jsonify({"status": "draining"}), 503
+        return jsonify({"status": "ok", "limits": limits})
+
+    return app
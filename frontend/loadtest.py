@@ -0,0 +1,492 @@
+"""
+Load-testing benchmark for the contract backends.
+
+Starts a backend in a subprocess against a local stub Ollama (fixed,
+configurable latency) and the in-memory vector store, then drives
+/api/analyze, /api/clauses/search and /api/ask with a weighted query mix at
+each concurrency level. Reports throughput and p50/p95/p99 latency, appends
+every run to loadtest_results.jsonl and compares it with the previous run of
+the same configuration so regressions are visible.
+
+    python loadtest.py --backend simple --concurrency 1,8,32 --duration 10
+    python loadtest.py --backend contract --mix analyze=0.5,search=0.3,ask=0.2
+    python loadtest.py --batch 200 --llm-latency 0.2
+"""
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKENDS = {"simple": "simple-backend.py", "contract": "contract-backend.py"}
+RESULTS_FILE = os.path.join(HERE, "loadtest_results.jsonl")
+
+# Real user-style queries: the NER corpus plus the history examples
+DEFAULT_QUERY_FILES = [os.path.join(HERE, "..", "dataset", "ner_dataset.jsonl")]
+HISTORY_QUERIES = [
+    "What are the penalty clauses for delivery delays?",
+    "SLA requirements for logistics services",
+    "Force majeure clauses for weather delays",
+    "What penalty applies if delivery is delayed 3 days due to heavy rain?",
+]
+SEARCH_TERMS = ["penalty", "sla", "liability", "delay", "force majeure", "damage", "surcharge", "payment"]
+
+ENDPOINTS = {
+    "analyze": ("/api/analyze", lambda q: {"query": q}),
+    "search": ("/api/clauses/search", lambda q: {"search_term": q}),
+    "ask": ("/api/ask", lambda q: {"query": q}),
+}
+
+EMBED_DIM = 1024
+REGRESSION_THRESHOLD = 0.2
+
+
+# ---------------------------------------------------------------------------
+# Local stand-ins
+# ---------------------------------------------------------------------------
+
+def hashed_embedding(text, dim=EMBED_DIM):
+    """Deterministic bag-of-words vector, so similar texts land close together."""
+    vec = [0.0] * dim
+    for token in re.findall(r"\w+", text.lower()):
+        h = int.from_bytes(hashlib.md5(token.encode()).digest()[:4], "little")
+        vec[h % dim] += 1.0 if h & (1 << 31) else -1.0
+    return vec
+
+
+def stub_reply(prompt):
+    if "Classify the user query" in prompt:
+        return json.dumps({"intent": "penalty_query", "category": "Penalty"})
+    if "Extract the following entities" in prompt:
+        return json.dumps({"event": "delay", "delay_reason": "weather"})
+    if "Rate how relevant" in prompt:
+        return str(round(int(hashlib.md5(prompt.encode()).hexdigest()[:4], 16) / 0xFFFF, 3))
+    if "AI Contract Analyst" in prompt:
+        return json.dumps({
+            "answer": "No penalty for weather delays.", "clause_used": "force majeure",
+            "is_penalty_applicable": False, "reasoning": "stub", "confidence": 0.8,
+            "final_output": "No penalty applies."
+        })
+    return "Penalty"
+
+
+class StubOllama:
+    """Ollama-compatible /api/generate and /api/embed with a fixed latency."""
+
+    def __init__(self, latency=0.05, embed_latency=0.01):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if self.path == "/api/embed":
+                    time.sleep(stub.embed_latency)
+                    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+                    data = {"embeddings": [hashed_embedding(t) for t in inputs], "prompt_eval_count": len(inputs)}
+                else:
+                    time.sleep(stub.latency)
+                    data = {"response": stub_reply(body["prompt"]), "prompt_eval_count": len(body["prompt"]) // 4,
+                            "eval_count": 20}
+                payload = json.dumps(data).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.latency = latency
+        self.embed_latency = embed_latency
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+
+
+def build_vector_file(path, limit=5000):
+    """embeddings.jsonl from cleaned_docs sentences, embedded like the stub does."""
+    folder = os.path.join(HERE, "..", "dataset", "cleaned_docs")
+    categories = ["Penalty", "SLA", "Liability", "Force Majeure", "Payment", "Surcharge"]
+    count = 0
+
+    with open(path, "w", encoding="utf-8") as out:
+        for file in sorted(os.listdir(folder)) if os.path.isdir(folder) else []:
+            with open(os.path.join(folder, file), "r", encoding="utf-8") as f:
+                sentences = [s.strip() for s in re.split(r"(?<=[.;])\s+", f.read()) if len(s.strip()) > 40]
+            for text in sentences:
+                out.write(json.dumps({
+                    "id": f"c{count}",
+                    "values": hashed_embedding(text),
+                    "metadata": {"category": categories[count % len(categories)], "jurisdiction": "India",
+                                 "summary": text[:500]}
+                }) + "\n")
+                count += 1
+                if count >= limit:
+                    return count
+    return count
+
+
+# ---------------------------------------------------------------------------
+# Backend process
+# ---------------------------------------------------------------------------
+
+def serve(backend, port):
+    """Run a backend without the debug reloader (used by start_backend)."""
+    sys.path.insert(0, HERE)
+    os.chdir(HERE)
+    spec = importlib.util.spec_from_file_location(backend.replace("-", "_"), os.path.join(HERE, BACKENDS[backend]))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.app.run(host="127.0.0.1", port=port, threaded=True, debug=False, use_reloader=False)
+
+
+def start_backend(backend, port, env, log_path, server="flask", workers=4, threads=32, timeout=60):
+    """Start the backend on the Flask threaded server or gunicorn (wsgi.py)."""
+    if server == "gunicorn":
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}", "wsgi:app"]
+        env = {**env, "BACKEND": backend, "WORKERS": str(workers), "THREADS": str(threads)}
+    else:
+        command = [sys.executable, os.path.abspath(__file__), "serve", backend, "--port", str(port)]
+
+    log = open(log_path, "w")
+    proc = subprocess.Popen(command, cwd=HERE, env={**os.environ, **env}, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            break
+        try:
+            requests.get(f"http://127.0.0.1:{port}/metrics", timeout=1)
+            return proc
+        except requests.RequestException:
+            time.sleep(0.2)
+
+    proc.kill()
+    with open(log_path, "r") as f:
+        raise RuntimeError(f"{backend} backend did not start:\n{f.read()[-2000:]}")
+
+
+# ---------------------------------------------------------------------------
+# Load generation
+# ---------------------------------------------------------------------------
+
+def load_queries(paths=None):
+    """Queries from JSONL ("query" or "text" field) or plain-text files."""
+    queries = list(HISTORY_QUERIES)
+    for path in paths or DEFAULT_QUERY_FILES:
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                if line.startswith("{"):
+                    rec = json.loads(line)
+                    line = rec.get("query") or rec.get("text") or ""
+                if line:
+                    queries.append(line)
+    return queries
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint in mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def run_load(base_url, queries, mix, concurrency, duration, seed=0):
+    """Closed-loop load: `concurrency` workers send requests back to back for `duration` s."""
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    records = []
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def worker(i):
+        rng = random.Random(seed * 1000 + i)
+        session = requests.Session()
+        local = []
+        while time.perf_counter() < stop_at:
+            name = rng.choices(names, weights)[0]
+            path, body = ENDPOINTS[name]
+            query = rng.choice(SEARCH_TERMS) if name == "search" else rng.choice(queries)
+            start = time.perf_counter()
+            try:
+                code = session.post(base_url + path, json=body(query), timeout=60).status_code
+            except requests.RequestException:
+                code = None
+            local.append((name, time.perf_counter() - start, code))
+        with lock:
+            records.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return records, time.perf_counter() - start
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(int(round(q / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(records, elapsed):
+    def stats(rows):
+        # Latency percentiles over successful requests; 503s are load shedding
+        latencies = sorted(r[1] for r in rows if r[2] == 200)
+        return {
+            "requests": len(rows),
+            "errors": sum(1 for r in rows if r[2] not in (200, 503)),
+            "rejected": sum(1 for r in rows if r[2] == 503),
+            "rps": round(len(latencies) / elapsed, 1),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+            **{f"p{q}_ms": round(percentile(latencies, q) * 1000, 2) if latencies else None for q in (50, 95, 99)}
+        }
+
+    out = {"all": stats(records)}
+    for name in sorted({r[0] for r in records}):
+        out[name] = stats([r for r in records if r[0] == name])
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Stored results
+# ---------------------------------------------------------------------------
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def config_key(result):
+    c = result["config"]
+    return (c["backend"], c["server"], json.dumps(c["mix"], sort_keys=True), c["concurrency"], c["llm_latency"],
+            c.get("workers"), c.get("threads"))
+
+
+def previous_result(result, path=RESULTS_FILE):
+    if not os.path.exists(path):
+        return None
+    previous = None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            rec = json.loads(line)
+            if config_key(rec) == config_key(result):
+                previous = rec
+    return previous
+
+
+def compare(result, previous, threshold=REGRESSION_THRESHOLD):
+    """
+    Relative changes vs. the previous run; flags p95 or throughput regressions.
+    A run without a successful request has no p95 and always counts as a
+    regression; against such a previous run only throughput is compared.
+    """
+    now, before = result["summary"]["all"], previous["summary"]["all"]
+    rps = (now["rps"] - before["rps"]) / before["rps"] if before["rps"] else 0.0
+    if now["p95_ms"] is None:
+        p95, slower = None, True
+    elif not before["p95_ms"]:
+        p95, slower = None, False
+    else:
+        p95 = (now["p95_ms"] - before["p95_ms"]) / before["p95_ms"]
+        slower = p95 > threshold
+    return {
+        "previous_revision": previous.get("revision"),
+        "rps_change": round(rps, 3),
+        "p95_change": round(p95, 3) if p95 is not None else None,
+        "regression": rps < -threshold or slower
+    }
+
+
+def save_result(result, path=RESULTS_FILE):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(result) + "\n")
+
+
+@contextmanager
+def local_stack(backend="simple", llm_latency=0.05, port=5099, server="flask", workers=4, threads=32):
+    """Stub Ollama + in-memory vectors + backend process; yields (base_url, vector count)."""
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    vector_file = os.path.join(workdir, "embeddings.jsonl")
+    vectors = build_vector_file(vector_file)
+
+    stub = StubOllama(latency=llm_latency)
+    env = {
+        "OLLAMA_URL": stub.url + "/api/generate",
+        "EMBED_URL": stub.url + "/api/embed",
+        "VECTOR_BACKEND": "memory",
+        "VECTOR_FILE": vector_file,
+    }
+    proc = start_backend(backend, port, env, os.path.join(workdir, "server.log"), server, workers, threads)
+    try:
+        yield f"http://127.0.0.1:{port}", vectors
+    finally:
+        proc.terminate()
+        proc.wait()
+        stub.close()
+
+
+def benchmark(backend="simple", concurrency=(1, 8, 32), duration=10.0, mix=None, queries=None,
+              llm_latency=0.05, port=5099, warmup=2.0, save=True, server="flask", workers=4, threads=32):
+    mix = mix or {"analyze": 0.7, "search": 0.3}
+    queries = queries or load_queries()
+
+    results = []
+    with local_stack(backend, llm_latency, port, server, workers, threads) as (base_url, vectors):
+        run_load(base_url, queries, mix, min(concurrency), warmup)
+        for level in concurrency:
+            records, elapsed = run_load(base_url, queries, mix, level, duration)
+            result = {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "revision": git_revision(),
+                "config": {"backend": backend, "server": server, "mix": mix, "concurrency": level,
+                           "duration": duration, "llm_latency": llm_latency, "queries": len(queries),
+                           "vectors": vectors},
+                "summary": summarize(records, elapsed),
+            }
+            if server == "gunicorn":
+                result["config"].update(workers=workers, threads=threads)
+            previous = previous_result(result) if save else None
+            if previous:
+                result["comparison"] = compare(result, previous)
+            if save:
+                save_result(result)
+            results.append(result)
+            print_result(result)
+
+    return results
+
+
+def batch_benchmark(size=100, backend="simple", queries=None, llm_latency=0.05, port=5099, seed=0):
+    """Queries/minute: looping over /api/ask vs one streamed /api/ask/batch call."""
+    rng = random.Random(seed)
+    batch = [rng.choice(queries or load_queries()) for _ in range(size)]
+
+    with local_stack(backend, llm_latency, port) as (base_url, _):
+        session = requests.Session()
+
+        start = time.perf_counter()
+        for q in batch:
+            session.post(base_url + "/api/ask", json={"query": q}, timeout=600).raise_for_status()
+        loop_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        first = None
+        answered = 0
+        with session.post(base_url + "/api/ask/batch", json={"queries": batch}, stream=True, timeout=600) as r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if line:
+                    answered += "error" not in json.loads(line)
+                    first = first or time.perf_counter() - start
+        batch_seconds = time.perf_counter() - start
+
+    report = {
+        "queries": size,
+        "unique": len({" ".join(q.split()).lower() for q in batch}),
+        "llm_latency": llm_latency,
+        "loop_qpm": round(size / loop_seconds * 60),
+        "batch_qpm": round(size / batch_seconds * 60),
+        "batch_answered": answered,
+        "batch_first_result_s": round(first, 2) if first else None,
+        "speedup": round(loop_seconds / batch_seconds, 1),
+    }
+    print(json.dumps(report, indent=4))
+    return report
+
+
+def print_result(result):
+    c = result["config"]
+    server = c["server"] + (f" {c['workers']}x{c['threads']}" if c.get("workers") else "")
+    print(f"\n{c['backend']} backend ({server}), concurrency {c['concurrency']}, {c['duration']}s, "
+          f"LLM latency {c['llm_latency'] * 1000:.0f} ms")
+    print(f"  {'endpoint':<10} {'req':>7} {'err':>5} {'503':>5} {'ok/s':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name, s in result["summary"].items():
+        # No successful requests, no latencies
+        p50, p95, p99 = (f"{s[k]}ms" if s[k] is not None else "n/a" for k in ("p50_ms", "p95_ms", "p99_ms"))
+        print(f"  {name:<10} {s['requests']:>7} {s['errors']:>5} {s['rejected']:>5} {s['rps']:>8} "
+              f"{p50:>9} {p95:>9} {p99:>9}")
+    cmp = result.get("comparison")
+    if cmp:
+        flag = "REGRESSION" if cmp["regression"] else "ok"
+        p95 = f"{cmp['p95_change']:+.1%}" if cmp["p95_change"] is not None else "n/a"
+        print(f"  vs {cmp['previous_revision']}: req/s {cmp['rps_change']:+.1%}, p95 {p95} [{flag}]")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        serve_args = argparse.ArgumentParser()
+        serve_args.add_argument("cmd")
+        serve_args.add_argument("backend", choices=list(BACKENDS))
+        serve_args.add_argument("--port", type=int, default=5099)
+        a = serve_args.parse_args()
+        serve(a.backend, a.port)
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Load-test the contract backends")
+    parser.add_argument("--backend", choices=list(BACKENDS), default="simple")
+    parser.add_argument("--server", choices=["flask", "gunicorn"], default="flask")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=32, help="gunicorn threads per worker")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated levels")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per level")
+    parser.add_argument("--mix", default="analyze=0.7,search=0.3", help="endpoint=weight,...")
+    parser.add_argument("--queries", nargs="*", help="JSONL/text query files (default: NER corpus)")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="stub Ollama latency in seconds")
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument("--batch", type=int, help="compare N looped /api/ask calls with one /api/ask/batch")
+    args = parser.parse_args()
+
+    if args.batch:
+        batch_benchmark(args.batch, args.backend, load_queries(args.queries), args.llm_latency, args.port)
+        sys.exit(0)
+
+    results = benchmark(
+        backend=args.backend,
+        concurrency=[int(c) for c in args.concurrency.split(",")],
+        duration=args.duration,
+        mix=parse_mix(args.mix),
+        queries=load_queries(args.queries),
+        llm_latency=args.llm_latency,
+        port=args.port,
+        save=not args.no_save,
+        server=args.server,
+        workers=args.workers,
+        threads=args.threads
+    )
+    if any(r.get("comparison", {}).get("regression") for r in results):
+        sys.exit(1)
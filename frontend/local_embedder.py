@@ -0,0 +1,233 @@
+"""
+Optional in-process CPU embeddings from an ONNX export of the embedding model.
+
+With EMBED_BACKEND=onnx, embeddings for ONNX_MODEL_NAME skip the HTTP
+round-trip to Ollama and no longer queue behind LLM generations. Other models
+(e.g. during a reembed.py migration) still go to Ollama.
+
+    EMBED_BACKEND=onnx ONNX_MODEL_DIR=models/mxbai-embed-large-v1 python simple-backend.py
+
+ONNX_MODEL_DIR holds model.onnx (or model_quantized.onnx) and tokenizer.json,
+as published under onnx/ in mixedbread-ai/mxbai-embed-large-v1. Vectors are
+CLS-pooled and L2-normalized like Ollama's mxbai-embed-large, so they are
+cosine-compatible with the stored ones (not bit-identical: Ollama runs GGUF
+weights). `python local_embedder.py bench` reports the cosine agreement and
+the latency/throughput of both paths.
+
+- Thread pinning: ONNX Runtime's intra-op threads and the batching thread
+  are pinned to ONNX_CPUS (e.g. "0-3"), away from the request threads.
+- Dynamic batching: concurrent callers' texts are merged into one
+  session.run of up to MAX_BATCH texts, waiting at most BATCH_WAIT_MS.
+- Tokenizer cache: token IDs for the last TOKEN_CACHE texts are reused.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from functools import lru_cache
+
+import numpy as np
+
+import metrics
+import ollama_client
+import tracing
+
+try:
+    import onnxruntime
+    from tokenizers import Tokenizer
+except ImportError:
+    onnxruntime = None
+
+EMBED_BACKEND = os.environ.get("EMBED_BACKEND", "ollama")   # or "onnx"
+ONNX_MODEL_DIR = os.environ.get("ONNX_MODEL_DIR", "models/mxbai-embed-large-v1")
+ONNX_MODEL_NAME = os.environ.get("ONNX_MODEL_NAME", ollama_client.EMBED_MODEL)
+ONNX_CPUS = os.environ.get("ONNX_CPUS", "")                 # "0-3" or "0,2,4"; empty = no pinning
+ONNX_THREADS = int(os.environ.get("ONNX_THREADS", 4))       # used when ONNX_CPUS is empty
+
+MAX_LENGTH = 512
+MAX_BATCH = int(os.environ.get("ONNX_MAX_BATCH", 32))
+BATCH_WAIT_MS = float(os.environ.get("ONNX_BATCH_WAIT_MS", 2.0))   # latency added to a lone request
+TOKEN_CACHE = 4096
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def parse_cpus(text):
+    cpus = []
+    for part in filter(None, text.replace(" ", "").split(",")):
+        low, _, high = part.partition("-")
+        cpus.extend(range(int(low), int(high or low) + 1))
+    return cpus
+
+
+class OnnxEmbedder:
+    """ONNX Runtime session plus a batching thread that owns it."""
+
+    def __init__(self, model_dir=ONNX_MODEL_DIR, cpus=None, threads=ONNX_THREADS,
+                 max_batch=MAX_BATCH, wait_ms=BATCH_WAIT_MS):
+        if onnxruntime is None:
+            raise RuntimeError("EMBED_BACKEND=onnx needs: pip install onnxruntime tokenizers")
+
+        model_path = next((os.path.join(model_dir, name) for name in ("model.onnx", "model_quantized.onnx")
+                           if os.path.exists(os.path.join(model_dir, name))), None)
+        if model_path is None:
+            raise FileNotFoundError(f"No model.onnx or model_quantized.onnx in {model_dir}")
+
+        self.cpus = parse_cpus(ONNX_CPUS) if cpus is None else cpus
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = len(self.cpus) or threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if len(self.cpus) > 1:
+            # One entry per extra intra-op thread; ORT numbers processors from 1
+            options.add_session_config_entry(
+                "session.intra_op_thread_affinities", ";".join(str(c + 1) for c in self.cpus[1:]))
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        outputs = [o.name for o in self.session.get_outputs()]
+        self.output_name = "last_hidden_state" if "last_hidden_state" in outputs else outputs[0]
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(MAX_LENGTH)
+        self.tokenizer.no_padding()
+        self.encode = lru_cache(maxsize=TOKEN_CACHE)(self._encode)
+
+        self.max_batch = max_batch
+        self.wait = wait_ms / 1000
+        self.requests = queue.Queue()
+        self.batches = 0
+        threading.Thread(target=self._run, name="onnx-embedder", daemon=True).start()
+
+    def _encode(self, text):
+        encoding = self.tokenizer.encode(text)
+        return tuple(encoding.ids), tuple(encoding.type_ids)
+
+    def embed(self, texts):
+        """Normalized CLS embeddings for `texts` (merged with concurrent callers)."""
+        futures = []
+        for text in texts:
+            future = Future()
+            self.requests.put((text, future))
+            futures.append(future)
+        return [f.result() for f in futures]
+
+    def _run(self):
+        if self.cpus and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, {self.cpus[0]})    # this thread is ORT's main intra-op thread
+
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.monotonic() + self.wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                try:
+                    batch.append(self.requests.get(timeout=timeout) if timeout > 0 else self.requests.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                vectors = self._infer([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+    def _infer(self, texts):
+        encoded = [self.encode(t) for t in texts]
+        width = max(len(ids) for ids, _ in encoded)
+        input_ids = np.zeros((len(texts), width), dtype=np.int64)
+        type_ids = np.zeros((len(texts), width), dtype=np.int64)
+        mask = np.zeros((len(texts), width), dtype=np.int64)
+        for row, (ids, types) in enumerate(encoded):
+            input_ids[row, :len(ids)] = ids
+            type_ids[row, :len(types)] = types
+            mask[row, :len(ids)] = 1
+
+        feed = {"input_ids": input_ids, "attention_mask": mask, "token_type_ids": type_ids}
+        hidden = self.session.run([self.output_name], {k: v for k, v in feed.items() if k in self.input_names})[0]
+        cls = hidden[:, 0, :] if hidden.ndim == 3 else hidden
+        cls = cls / np.maximum(np.linalg.norm(cls, axis=1, keepdims=True), 1e-12)
+        self.batches += 1
+        return cls.tolist()
+
+
+def get_embedder():
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            _embedder = OnnxEmbedder()
+    return _embedder
+
+
+def embed(text, model=ollama_client.EMBED_MODEL, **ollama_kwargs):
+    """
+    Embedding(s) for `text` (a string or a list of strings): in process when
+    EMBED_BACKEND=onnx and the ONNX model is `model`, otherwise via Ollama.
+    """
+    if EMBED_BACKEND != "onnx" or model != ONNX_MODEL_NAME:
+        return ollama_client.embed(text, model=model, **ollama_kwargs)
+
+    texts = [text] if isinstance(text, str) else list(text)
+    start = time.perf_counter()
+    try:
+        with tracing.span("onnx.embed", model=model, texts=len(texts)):
+            vectors = get_embedder().embed(texts)
+    except Exception:
+        metrics.record_llm_call("embed", "onnx:" + model, time.perf_counter() - start, error=True)
+        raise
+    metrics.record_llm_call("embed", "onnx:" + model, time.perf_counter() - start)
+    return vectors
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    from concurrent.futures import ThreadPoolExecutor
+
+    parser = argparse.ArgumentParser(description="ONNX vs Ollama embedding benchmark")
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("--texts", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--no-ollama", action="store_true")
+    args = parser.parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(here, "..", "dataset", "ner_dataset.jsonl"), "r", encoding="utf-8") as f:
+        texts = [json.loads(line)["text"] for line in f if line.strip()][:args.texts]
+
+    def percentile(values, q):
+        values = sorted(values)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def measure(name, fn):
+        single = []
+        for text in texts[:50]:
+            start = time.perf_counter()
+            fn([text])
+            single.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            vectors = list(pool.map(lambda t: fn([t])[0], texts))
+        elapsed = time.perf_counter() - start
+        print(f"{name:8s} single p50 {percentile(single, 0.5) * 1000:7.1f} ms  p95 {percentile(single, 0.95) * 1000:7.1f} ms"
+              f"  |  {len(texts) / elapsed:7.1f} texts/s at concurrency {args.concurrency}")
+        return np.array(vectors)
+
+    embedder = get_embedder()
+    local = measure("onnx", embedder.embed)
+    runs = embedder.batches - 50
+    print(f"         concurrent: {runs} session runs, mean batch {len(texts) / max(runs, 1):.1f}; "
+          f"tokenizer cache {embedder.encode.cache_info().hits} hits")
+
+    if not args.no_ollama:
+        remote = measure("ollama", lambda t: ollama_client.embed(t, model=ONNX_MODEL_NAME))
+        if remote.shape != local.shape:
+            raise SystemExit(f"Dimension mismatch: onnx {local.shape[1]}, ollama {remote.shape[1]} (different models?)")
+        remote = remote / np.linalg.norm(remote, axis=1, keepdims=True)
+        cosine = np.sum(local * remote, axis=1)
+        print(f"cosine(onnx, ollama): mean {cosine.mean():.4f}, min {cosine.min():.4f}")
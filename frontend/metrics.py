@@ -0,0 +1,302 @@
+"""
+In-process metrics for the backends.
+
+Counters and fixed-bucket latency histograms, keyed by name + labels, are
+updated in place so recording them never touches the filesystem. Exposed as
+a JSON snapshot (for /api/status) and Prometheus text format (for /metrics).
+
+Under a pre-fork server every worker has its own copy. With METRICS_DIR set
+(gunicorn.conf.py sets it), each worker writes its values to
+METRICS_DIR/<pid>.json every FLUSH_INTERVAL seconds and when scraped, and a
+scrape sums the files of all workers, so any worker can answer /metrics
+(other workers' values are at most FLUSH_INTERVAL seconds old).
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds (upper bounds); the last one catches everything
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+HELP = {
+    "stage_seconds": "Pipeline stage latency",
+    "stage_total": "Pipeline stage runs by status",
+    "http_request_seconds": "HTTP request latency per endpoint",
+    "http_requests_total": "HTTP requests per endpoint and status code",
+    "llm_request_seconds": "Ollama call latency",
+    "llm_requests_total": "Ollama calls by status",
+    "llm_tokens_total": "Ollama prompt/completion tokens",
+    "inflight_requests": "Requests in flight per limited route",
+    "rejected_requests_total": "Requests rejected by per-route concurrency limits",
+    "interpret_total": "Query interpretations by path (fast = no LLM call)",
+    "interpret_llm_calls_total": "Interpretation LLM calls made or skipped by the fast path",
+    "interpret_llm_saved_seconds_total": "Estimated LLM seconds saved by skipped calls",
+    "dedup_saved_calls_total": "Classify/embed calls skipped for near-duplicate clauses",
+    "answer_total": "Answers by source (rules = no LLM call)",
+    "answer_llm_calls_total": "Answer LLM calls made or skipped by the rule-based synthesizer",
+    "answer_llm_saved_seconds_total": "Estimated answer LLM seconds saved by rule-based answers",
+    "search_total": "Vector searches by route (routed = partition-pruned, fallback = routed then full)",
+}
+
+METRICS_DIR = os.environ.get("METRICS_DIR")
+FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH", 1))
+
+_lock = threading.Lock()
+_counters = {}      # (name, labels) -> float
+_histograms = {}    # (name, labels) -> [bucket counts, sum, count]
+_gauges = {}        # (name, labels) -> float
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name, seconds, **labels):
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [[0] * len(BUCKETS), 0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                hist[0][i] += 1
+                break
+        hist[1] += seconds
+        hist[2] += 1
+
+
+@contextmanager
+def stage(name):
+    """Time a pipeline stage (scrape, extract, classify, embed, ner, retrieval, llm…)."""
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        observe("stage_seconds", time.perf_counter() - start, stage=name)
+        inc("stage_total", stage=name, status=status)
+
+
+def record_llm_call(kind, model, seconds, prompt_tokens=0, completion_tokens=0, error=False):
+    """One Ollama call: kind is "generate" or "embed"."""
+    observe("llm_request_seconds", seconds, kind=kind, model=model)
+    inc("llm_requests_total", kind=kind, model=model, status="error" if error else "ok")
+    if prompt_tokens:
+        inc("llm_tokens_total", prompt_tokens, kind=kind, model=model, type="prompt")
+    if completion_tokens:
+        inc("llm_tokens_total", completion_tokens, kind=kind, model=model, type="completion")
+
+
+# ---------------------------------------------------------------------------
+# Multi-process aggregation (METRICS_DIR)
+# ---------------------------------------------------------------------------
+
+def _local():
+    with _lock:
+        return (dict(_counters), dict(_gauges),
+                {k: (list(v[0]), v[1], v[2]) for k, v in _histograms.items()})
+
+
+def _write(path, counters, gauges, histograms):
+    data = {
+        "counters": [[name, list(labels), value] for (name, labels), value in counters.items()],
+        "gauges": [[name, list(labels), value] for (name, labels), value in gauges.items()],
+        "histograms": [[name, list(labels), *hist] for (name, labels), hist in histograms.items()],
+    }
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _read(path):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    def key(name, labels):
+        return name, tuple(tuple(pair) for pair in labels)
+
+    return ({key(n, l): v for n, l, v in data["counters"]},
+            {key(n, l): v for n, l, v in data["gauges"]},
+            {key(n, l): (counts, total, count) for n, l, counts, total, count in data["histograms"]})
+
+
+def flush():
+    """Write this process's values to METRICS_DIR (no-op without it)."""
+    if METRICS_DIR:
+        _write(os.path.join(METRICS_DIR, f"{os.getpid()}.json"), *_local())
+
+
+def start_flusher(interval=FLUSH_INTERVAL):
+    """Flush every `interval` seconds from a daemon thread (call once per worker)."""
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                flush()
+            except OSError:
+                pass
+
+    if METRICS_DIR:
+        threading.Thread(target=loop, name="metrics-flush", daemon=True).start()
+
+
+def mark_process_dead(pid):
+    """Keep an exited worker's counters and histograms; drop its gauges."""
+    path = os.path.join(METRICS_DIR, f"{pid}.json") if METRICS_DIR else None
+    if path and os.path.exists(path):
+        counters, _, histograms = _read(path)
+        _write(path, counters, {}, histograms)
+
+
+def _collect():
+    """(counters, gauges, histograms): this process's, or summed over workers."""
+    if not METRICS_DIR:
+        return _local()
+    flush()
+    counters, gauges, histograms = {}, {}, {}
+    for file in os.listdir(METRICS_DIR):
+        if not file.endswith(".json"):
+            continue
+        try:
+            c, g, h = _read(os.path.join(METRICS_DIR, file))
+        except (OSError, ValueError):
+            continue
+        for k, v in c.items():
+            counters[k] = counters.get(k, 0) + v
+        for k, v in g.items():
+            gauges[k] = gauges.get(k, 0) + v
+        for k, (counts, total, count) in h.items():
+            if k in histograms:
+                old = histograms[k]
+                counts = [a + b for a, b in zip(old[0], counts)]
+                total, count = old[1] + total, old[2] + count
+            histograms[k] = (counts, total, count)
+    return counters, gauges, histograms
+
+
+def _quantile(counts, total, q):
+    """Upper bucket bound containing the q-quantile."""
+    target = q * total
+    seen = 0
+    for bound, count in zip(BUCKETS, counts):
+        seen += count
+        if seen >= target:
+            return bound
+    return BUCKETS[-1]
+
+
+def snapshot():
+    """JSON-friendly view: counters, gauges and latency summaries."""
+    counters, gauges, histograms = _collect()
+
+    def label_str(labels):
+        return ",".join(f"{k}={v}" for k, v in labels)
+
+    out = {"counters": {}, "gauges": {}, "latency": {}}
+    for (name, labels), value in counters.items():
+        out["counters"].setdefault(name, {})[label_str(labels)] = value
+    for (name, labels), value in gauges.items():
+        out["gauges"].setdefault(name, {})[label_str(labels)] = value
+    for (name, labels), (counts, total_seconds, count) in histograms.items():
+        p95 = _quantile(counts, count, 0.95)
+        out["latency"].setdefault(name, {})[label_str(labels)] = {
+            "count": count,
+            "mean_ms": round(total_seconds / count * 1000, 2) if count else 0.0,
+            "p50_ms": round(_quantile(counts, count, 0.5) * 1000, 2),
+            "p95_ms": round(p95 * 1000, 2) if p95 != float("inf") else None,
+        }
+    return out
+
+
+def _prom_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in items)
+    return "{" + body + "}"
+
+
+def prometheus_text(prefix="contract_ai_"):
+    """Prometheus text exposition format (version 0.0.4)."""
+    counters, gauges, histograms = _collect()
+    counters, gauges, histograms = sorted(counters.items()), sorted(gauges.items()), sorted(histograms.items())
+
+    lines = []
+    seen = set()
+
+    def header(name, kind):
+        if name not in seen:
+            seen.add(name)
+            if name in HELP:
+                lines.append(f"# HELP {prefix}{name} {HELP[name]}")
+            lines.append(f"# TYPE {prefix}{name} {kind}")
+
+    for (name, labels), value in counters:
+        header(name, "counter")
+        lines.append(f"{prefix}{name}{_prom_labels(labels)} {value}")
+
+    for (name, labels), value in gauges:
+        header(name, "gauge")
+        lines.append(f"{prefix}{name}{_prom_labels(labels)} {value}")
+
+    for (name, labels), (counts, total_seconds, count) in histograms:
+        header(name, "histogram")
+        cumulative = 0
+        for bound, c in zip(BUCKETS, counts):
+            cumulative += c
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{prefix}{name}_bucket{_prom_labels(labels, [('le', le)])} {cumulative}")
+        lines.append(f"{prefix}{name}_sum{_prom_labels(labels)} {total_seconds}")
+        lines.append(f"{prefix}{name}_count{_prom_labels(labels)} {count}")
+
+    return "\n".join(lines) + "\n"
+
+
+def instrument_app(app):
+    """Per-endpoint latency and status counts for a Flask app, plus /metrics."""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        start = getattr(g, "_metrics_start", None)
+        if start is not None:
+            endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+            observe("http_request_seconds", time.perf_counter() - start,
+                    endpoint=endpoint, method=request.method)
+            inc("http_requests_total", endpoint=endpoint, method=request.method,
+                code=str(response.status_code))
+        return response
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        return Response(prometheus_text(), mimetype="text/plain; version=0.0.4")
+
+    return app
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _gauges.clear()
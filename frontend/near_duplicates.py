@@ -0,0 +1,187 @@
+"""
+Streaming near-duplicate detection for clauses (shingling + MinHash + LSH).
+
+Template pages and statutes repeat the same sentences many times. Each clause
+is reduced to word shingles and a NUM_PERM MinHash signature. The signature
+is split into BANDS bands, and clauses sharing a band bucket become
+candidates. A candidate whose estimated Jaccard similarity is at least
+THRESHOLD joins that clause's group, but only if both clauses have the same
+numbers and negation/exception words: "shall be liable" and "shall not be
+liable", or "Rs 500" and "Rs 5000", are similar text with different terms.
+Only the first clause of a group (the representative) needs to be classified
+and embedded; the others reuse its metadata. Identical normalized texts skip
+hashing altogether.
+
+    python near_duplicates.py clauses/ cleaned_docs/   # groups and LLM / embedding calls saved
+"""
+import os
+import re
+import zlib
+
+import numpy as np
+
+SHINGLE_SIZE = 3        # words per shingle
+NUM_PERM = 128
+BANDS = 16              # 16 bands x 8 rows: candidates from Jaccard ~0.7
+THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", 0.8))
+SEED = 1
+
+_MERSENNE = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+_rng = np.random.RandomState(SEED)
+_PERM_A = _rng.randint(1, _MERSENNE, NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, _MERSENNE, NUM_PERM, dtype=np.uint64)
+
+_WORD = re.compile(r"\w+")
+
+# Tokens that change a clause's meaning however similar the rest is
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+# Leading clause labels ("7.", "1.1", "II.", "(a)", "(iv)", as in
+# clause_segmenter) number the clause, they are not part of its terms
+_LABEL = re.compile(r"^\s*(?:(?:\d+\[)?(?:(?:\d+\.\d+\.?|\d{1,3}[A-Z]{0,2}\.|[IVX]{1,5}\.)\s+(?=[A-Z(])|\(\w{1,5}\)\s*))+")
+TERM_WORDS = {
+    "no", "not", "never", "nor", "neither", "none", "without", "cannot",
+    "except", "excepting", "excluding", "exclusive", "unless", "save",
+    "notwithstanding", "including", "inclusive", "only",
+}
+
+
+def normalize(text):
+    return " ".join(_WORD.findall(text.lower()))
+
+
+def shingles(text, k=SHINGLE_SIZE):
+    tokens = _WORD.findall(text.lower())
+    if len(tokens) <= k:
+        return {" ".join(tokens)}
+    return {" ".join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)}
+
+
+def terms(text):
+    """Numbers and negation/exception words of a clause, in order."""
+    lowered = _LABEL.sub("", text).lower()
+    numbers = [n.replace(",", "") for n in _NUMBER.findall(lowered)]
+    words = [w for w in _WORD.findall(lowered.replace("n't", " not")) if w in TERM_WORDS]
+    return tuple(numbers), tuple(words)
+
+
+def signature(text):
+    """MinHash signature (NUM_PERM uint64) of the clause's shingle set."""
+    hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingles(text)), dtype=np.uint64)
+    # uint64 products wrap around; still a fixed hash per permutation
+    permuted = (np.outer(hashes, _PERM_A) + _PERM_B) % _MERSENNE & _MAX_HASH
+    return permuted.min(axis=0)
+
+
+class NearDuplicateIndex:
+    """
+    Incremental LSH index. `add(key, text)` returns the key of the group's
+    representative: `key` itself for a new group, otherwise the earlier
+    clause it near-duplicates. Only representatives' signatures (and terms)
+    are kept.
+    """
+
+    def __init__(self, threshold=THRESHOLD, bands=BANDS):
+        if NUM_PERM % bands:
+            raise ValueError(f"bands must divide NUM_PERM ({NUM_PERM})")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = NUM_PERM // bands
+        self.buckets = [{} for _ in range(bands)]
+        self.signatures = {}    # representative -> signature
+        self.terms = {}         # representative -> terms()
+        self.exact = {}         # normalized text -> representative
+        self.members = {}       # key -> representative
+        self.groups = {}        # representative -> [keys]
+
+    def _find(self, sig, clause_terms):
+        seen = set()
+        for band in range(self.bands):
+            bucket = self.buckets[band].get(sig[band * self.rows:(band + 1) * self.rows].tobytes(), ())
+            for candidate in bucket:
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                if self.terms[candidate] != clause_terms:
+                    continue
+                if np.mean(self.signatures[candidate] == sig) >= self.threshold:
+                    return candidate
+        return None
+
+    def _register(self, key, sig, clause_terms):
+        self.signatures[key] = sig
+        self.terms[key] = clause_terms
+        for band in range(self.bands):
+            self.buckets[band].setdefault(sig[band * self.rows:(band + 1) * self.rows].tobytes(), []).append(key)
+
+    def add(self, key, text):
+        if key in self.members:
+            return self.members[key]
+
+        norm = normalize(text)
+        rep = self.exact.get(norm)
+        if rep is None:
+            sig = signature(text)
+            clause_terms = terms(text)
+            rep = self._find(sig, clause_terms)
+            if rep is None:
+                rep = key
+                self._register(key, sig, clause_terms)
+                self.groups[key] = []
+            self.exact[norm] = rep
+
+        self.members[key] = rep
+        self.groups[rep].append(key)
+        return rep
+
+    def stats(self):
+        clauses = len(self.members)
+        return {
+            "clauses": clauses,
+            "representatives": len(self.groups),
+            "duplicates": clauses - len(self.groups),
+            "largest_group": max((len(m) for m in self.groups.values()), default=0),
+        }
+
+
+def dedupe(items, index=None):
+    """Yield (key, text, representative) for an iterable of (key, text)."""
+    index = NearDuplicateIndex() if index is None else index
+    for key, text in items:
+        yield key, text, index.add(key, text)
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    import clause_segmenter
+
+    # Clauses are spans (clauses/spans.jsonl) into the cleaned documents
+    folder = sys.argv[1] if len(sys.argv) > 1 else "clauses"
+    store = clause_segmenter.DocumentStore(sys.argv[2] if len(sys.argv) > 2 else "cleaned_docs")
+
+    def read_clauses():
+        for span in clause_segmenter.load_spans(os.path.join(folder, "spans.jsonl")):
+            yield clause_segmenter.span_id(span), store.text(span)
+
+    index = NearDuplicateIndex()
+    start = time.perf_counter()
+    texts = {}
+    for key, text, rep in dedupe(read_clauses(), index):
+        texts[key] = text
+    elapsed = time.perf_counter() - start
+
+    stats = index.stats()
+    print(f"{stats['clauses']} clauses -> {stats['representatives']} groups "
+          f"(threshold {index.threshold}, {elapsed:.2f}s, "
+          f"{stats['clauses'] / max(elapsed, 1e-9):,.0f} clauses/s)")
+    print(f"  classify LLM calls saved: {stats['duplicates']} "
+          f"({stats['duplicates'] / max(stats['clauses'], 1):.0%})")
+    print(f"  embedding calls saved:    {stats['duplicates']}")
+
+    print("\nLargest groups:")
+    for rep, keys in sorted(index.groups.items(), key=lambda kv: -len(kv[1]))[:5]:
+        print(f"  {len(keys):5d} x {texts[rep][:90]!r}")
+    store.close()
@@ -0,0 +1,59 @@
+"""
+Thin Ollama client shared by the backends.
+
+Every call records latency, token counts and errors in metrics, runs in
+a tracing span and forwards the current request ID as X-Request-ID.
+"""
+import os
+import time
+
+import requests
+
+import metrics
+import tracing
+
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434/api/generate")
+EMBED_URL = os.environ.get("EMBED_URL", "http://localhost:11434/api/embed")
+MODEL = "llama3.1"
+EMBED_MODEL = "mxbai-embed-large"
+
+
+def generate(prompt, model=MODEL, url=OLLAMA_URL, timeout=None):
+    """Non-streaming generation; returns the response text."""
+    start = time.perf_counter()
+    try:
+        with tracing.span("ollama.generate", model=model):
+            response = requests.post(url, json={"model": model, "prompt": prompt, "stream": False},
+                                     headers=tracing.propagation_headers(), timeout=timeout)
+        data = response.json()
+        text = data["response"]
+    except Exception:
+        metrics.record_llm_call("generate", model, time.perf_counter() - start, error=True)
+        raise
+
+    metrics.record_llm_call(
+        "generate", model, time.perf_counter() - start,
+        prompt_tokens=data.get("prompt_eval_count", 0),
+        completion_tokens=data.get("eval_count", 0)
+    )
+    return text
+
+
+def embed(text, model=EMBED_MODEL, url=EMBED_URL, timeout=None):
+    """Embedding(s) for `text` (a string or a list of strings)."""
+    start = time.perf_counter()
+    try:
+        with tracing.span("ollama.embed", model=model):
+            response = requests.post(url, json={"model": model, "input": text},
+                                     headers=tracing.propagation_headers(), timeout=timeout)
+        data = response.json()
+        embeddings = data["embeddings"]
+    except Exception:
+        metrics.record_llm_call("embed", model, time.perf_counter() - start, error=True)
+        raise
+
+    metrics.record_llm_call(
+        "embed", model, time.perf_counter() - start,
+        prompt_tokens=data.get("prompt_eval_count", 0)
+    )
+    return embeddings
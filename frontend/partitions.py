@@ -0,0 +1,187 @@
+"""
+Clause partitions by jurisdiction and category, and query routing.
+
+Each clause goes into a partition named after its jurisdiction and category,
+e.g. "p_India__Penalty" (PARTITION_BY picks the fields). A search probes
+only the partitions that can answer the query:
+
+- a confident jurisdiction ("India") probes India, Global and Unknown
+  clauses, since global and unclassified clauses apply everywhere;
+- a confident category ("Penalty") probes that category, its RELATED
+  categories (force majeure clauses decide penalty questions) and Other;
+- a field the fast path is unsure about is not used for pruning.
+
+With Milvus these are collection partitions: `insert_partitioned` creates
+them as clauses are loaded, and the search passes `partition_names`.
+vector_store.InMemoryCollection keeps each partition as a contiguous shard.
+Routed names that do not exist in the collection are dropped, so an
+unpartitioned collection is still searched in full.
+
+    python partitions.py bench --sizes 20000,100000 --schemes "none;jurisdiction;jurisdiction,category"
+"""
+import os
+import re
+import time
+
+import query_analyzer
+
+PARTITION_BY = os.environ.get("PARTITION_BY", "jurisdiction,category")   # "" to disable
+ROUTE_THRESHOLD = float(os.environ.get("ROUTE_THRESHOLD", 0.8))
+REFRESH = 60            # seconds between partition list lookups per collection
+
+DEFAULT_PARTITION = "_default"
+
+JURISDICTIONS = sorted(set(query_analyzer.JURISDICTION_TERMS.values())) + ["Unknown"]
+CATEGORIES = sorted(query_analyzer.CATEGORY_TERMS) + ["Other"]
+
+# Always probed with a routed jurisdiction / category
+SHARED = {"jurisdiction": ["Global", "Unknown"], "category": ["Other"]}
+
+RELATED = {
+    "Penalty": ["Force Majeure", "Exceptions", "SLA"],
+    "Force Majeure": ["Penalty", "Exceptions"],
+    "SLA": ["Penalty"],
+    "Liability": ["Exceptions"],
+    "Pricing": ["Penalty"],
+}
+
+_JURISDICTION_LOOKUP = {j.lower(): j for j in JURISDICTIONS}
+_JURISDICTION_LOOKUP.update(query_analyzer.JURISDICTION_TERMS)
+_CATEGORY_LOOKUP = {c.lower(): c for c in CATEGORIES}
+
+_existing = {}          # collection name -> (partition names, looked up at)
+
+
+def _fields(scheme):
+    return [f for f in (scheme or "").replace(" ", "").split(",") if f]
+
+
+def normalize(field, value):
+    """Canonical jurisdiction / category; anything unrecognised is Unknown / Other."""
+    key = str(value or "").strip().lower()
+    if field == "jurisdiction":
+        return _JURISDICTION_LOOKUP.get(key, "Unknown")
+    return _CATEGORY_LOOKUP.get(key, "Other")
+
+
+def partition_name(jurisdiction, category, scheme=PARTITION_BY):
+    fields = _fields(scheme)
+    if not fields:
+        return DEFAULT_PARTITION
+    values = {"jurisdiction": jurisdiction, "category": category}
+    parts = [re.sub(r"\W", "_", normalize(f, values[f])) for f in fields]
+    return "p_" + "__".join(parts)
+
+
+def route(ner, scheme=PARTITION_BY, threshold=ROUTE_THRESHOLD):
+    """
+    Partition names to probe for an interpreted query (interpret_query or
+    query_analyzer.analyze output), or None to search everything.
+    """
+    fields = _fields(scheme)
+    confidence = ner.get("confidence", {})
+    allowed = {}
+    for field in fields:
+        value = normalize(field, ner.get(field))
+        if value not in ("Unknown", "Other") and confidence.get(field, 1.0) >= threshold:
+            allowed[field] = dict.fromkeys([value] + RELATED.get(value, []) + SHARED[field])
+    if not allowed:
+        return None
+
+    names = [""]
+    for field in fields:
+        values = allowed.get(field) or (JURISDICTIONS if field == "jurisdiction" else CATEGORIES)
+        names = [(n + "__" if n else "") + re.sub(r"\W", "_", v) for n in names for v in values]
+    return ["p_" + n for n in names]
+
+
+def existing(collection):
+    """Partition names of a collection, cached for REFRESH seconds."""
+    name = getattr(collection, "name", id(collection))
+    cached = _existing.get(name)
+    if cached is None or time.monotonic() - cached[1] > REFRESH:
+        cached = ({p.name for p in getattr(collection, "partitions", ())}, time.monotonic())
+        _existing[name] = cached
+    return cached[0]
+
+
+def probe(collection, names):
+    """Routed names present in `collection`, or None when none are (search all)."""
+    if not names:
+        return None
+    present = [n for n in names if n in existing(collection)]
+    return present or None
+
+
+def insert_partitioned(collection, columns, jurisdictions, categories, scheme=PARTITION_BY):
+    """
+    Insert column-major `columns` (schema order), each row into the
+    partition for its jurisdiction and category, creating partitions as
+    needed. Returns {partition: rows}.
+    """
+    groups = {}
+    for row, (jurisdiction, category) in enumerate(zip(jurisdictions, categories)):
+        groups.setdefault(partition_name(jurisdiction, category, scheme), []).append(row)
+
+    for name, rows in groups.items():
+        if name != DEFAULT_PARTITION and not collection.has_partition(name):
+            collection.create_partition(name)
+        collection.insert([[column[r] for r in rows] for column in columns], partition_name=name)
+    _existing.pop(getattr(collection, "name", id(collection)), None)
+    return {name: len(rows) for name, rows in groups.items()}
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    import numpy as np
+
+    from vector_store import InMemoryCollection
+
+    parser = argparse.ArgumentParser(description="Routed vs full search across partition counts")
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("--sizes", default="20000,50000,100000")
+    parser.add_argument("--schemes", default="none;jurisdiction;jurisdiction,category",
+                        help="PARTITION_BY values separated by ';' (none = one partition)")
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+    schemes = ["" if s == "none" else s for s in args.schemes.split(";")]
+
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dataset", "ner_dataset.jsonl")
+    with open(path, "r", encoding="utf-8") as f:
+        texts = [json.loads(line)["text"] for line in f if line.strip()]
+    routed_ner = [dict(r, confidence=c) for r, c, _ in (query_analyzer.analyze(t) for t in texts)]
+    routable = sum(route(ner, "jurisdiction,category") is not None for ner in routed_ner)
+    print(f"{routable}/{len(routed_ner)} dataset queries routable by jurisdiction/category\n")
+
+    rng = np.random.RandomState(0)
+    # Skewed like the corpus: most clauses Indian or global, categories uneven
+    j_weights = np.array([8 if j in ("India", "Global") else 1 for j in JURISDICTIONS], dtype=float)
+    c_weights = rng.dirichlet(np.ones(len(CATEGORIES)) * 2)
+
+    print(f"{'clauses':>8s} {'scheme':24s} {'partitions':>10s} {'scanned':>8s} {'ms/query':>9s} {'speedup':>8s}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        vectors = rng.randn(size, args.dim).astype(np.float32)
+        fields = {
+            "jurisdiction": list(rng.choice(JURISDICTIONS, size, p=j_weights / j_weights.sum())),
+            "category": list(rng.choice(CATEGORIES, size, p=c_weights)),
+            "risk_type": ["general"] * size,
+            "summary": [""] * size,
+        }
+        queries = rng.randn(args.queries, args.dim).astype(np.float32)
+        baseline = None
+        for scheme in schemes:
+            collection = InMemoryCollection([str(i) for i in range(size)], vectors, dict(fields), partition_by=scheme)
+            scanned = 0
+            start = time.perf_counter()
+            for q, ner in zip(queries, (routed_ner[i % len(routed_ner)] for i in range(args.queries))):
+                names = probe(collection, route(ner, scheme))
+                collection.search([q], limit=10, partition_names=names)
+                scanned += collection.rows(names)
+            ms = (time.perf_counter() - start) / args.queries * 1000
+            baseline = baseline or ms
+            print(f"{size:8d} {scheme or '(none)':24s} {len(collection.partitions):10d} "
+                  f"{scanned / (size * args.queries):8.0%} {ms:9.2f} {baseline / ms:7.1f}x")
+            _existing.clear()
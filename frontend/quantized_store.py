@@ -0,0 +1,341 @@
+"""
+Compressed in-process clause vectors with exact re-scoring.
+
+A 1024-dim float32 vector takes 4 KB. QuantizedCollection keeps only a
+compressed code per clause in memory and uses it to pick candidates:
+
+- int8:   per-dimension scalar quantization, 1 byte per dimension (1 KB)
+- binary: sign bits of the centered vector, Hamming distance (128 B)
+- pq:     product quantization, PQ_M sub-vectors x 256 centroids (64 B),
+          stored one sub-vector column at a time for the table lookups
+
+The top `limit * rerank` candidates are re-scored with exact cosine from the
+float originals. Those sit in a memory-mapped .npy, so only the candidate
+rows are paged in. The search signature matches InMemoryCollection and
+pymilvus' Collection.search, so contract_engine uses it with
+VECTOR_BACKEND=quantized:
+
+    python quantized_store.py build embeddings.jsonl vectors/
+    VECTOR_BACKEND=quantized VECTOR_DIR=vectors QUANT_MODE=int8 python simple-backend.py
+
+    python quantized_store.py bench vectors/                  # memory, recall@10, latency
+    python quantized_store.py bench --synthetic 200000        # same on generated vectors
+"""
+import json
+import os
+
+import numpy as np
+
+from vector_store import OUTPUT_FIELDS, Hit
+
+MODES = ("int8", "binary", "pq")
+RERANK = int(os.environ.get("QUANT_RERANK", 4))     # candidates re-scored = limit * RERANK
+CHUNK = 4096                                        # rows converted / scanned at a time (16 MB as float32)
+
+PQ_M = 64
+PQ_CENTROIDS = 256
+PQ_TRAIN = 20000
+PQ_ITERATIONS = 12
+
+# SWAR popcount constants for 64-bit words
+_M1, _M2, _M4, _H01 = (np.uint64(c) for c in (0x5555555555555555, 0x3333333333333333,
+                                               0x0F0F0F0F0F0F0F0F, 0x0101010101010101))
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def _kmeans(data, k, iterations, rng):
+    centroids = data[rng.choice(len(data), k, replace=len(data) < k)].copy()
+    for _ in range(iterations):
+        distances = (data ** 2).sum(1)[:, None] - 2 * data @ centroids.T + (centroids ** 2).sum(1)[None, :]
+        assign = distances.argmin(1)
+        counts = np.bincount(assign, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+
+def train_pq(sample, m=PQ_M, k=PQ_CENTROIDS, iterations=PQ_ITERATIONS, seed=0):
+    """Codebooks, shape (m, k, dim // m), trained on a sample of vectors."""
+    if sample.shape[1] % m:
+        raise ValueError(f"PQ_M ({m}) must divide the dimension ({sample.shape[1]})")
+    rng = np.random.RandomState(seed)
+    sub = sample.shape[1] // m
+    return np.stack([_kmeans(sample[:, i * sub:(i + 1) * sub], k, iterations, rng) for i in range(m)])
+
+
+def _popcount(words):
+    """Set bits per row of a uint64 array."""
+    words = words - ((words >> np.uint64(1)) & _M1)
+    words = (words & _M2) + ((words >> np.uint64(2)) & _M2)
+    words = (words + (words >> np.uint64(4))) & _M4
+    return ((words * _H01) >> np.uint64(56)).sum(1, dtype=np.int32)
+
+
+def pq_encode(vectors, codebooks):
+    m, _, sub = codebooks.shape
+    codes = np.empty((len(vectors), m), dtype=np.uint8)
+    for i in range(m):
+        part = vectors[:, i * sub:(i + 1) * sub]
+        distances = -2 * part @ codebooks[i].T + (codebooks[i] ** 2).sum(1)[None, :]
+        codes[:, i] = distances.argmin(1)
+    return codes
+
+
+def build(source, folder, modes=MODES, pq_m=PQ_M, seed=0):
+    """
+    Write the normalized float originals (vectors.npy), the codes for each
+    mode and the clause ids/fields from an embeddings.jsonl, in two
+    streaming passes (count, then fill).
+    """
+    os.makedirs(folder, exist_ok=True)
+    with open(source, "r", encoding="utf-8") as f:
+        first = json.loads(f.readline())
+        count = 1 + sum(1 for line in f if line.strip())
+    dim = len(first["values"])
+
+    vectors = np.lib.format.open_memmap(os.path.join(folder, "vectors.npy"), "w+", np.float32, (count, dim))
+    with open(source, "r", encoding="utf-8") as f, open(os.path.join(folder, "records.jsonl"), "w", encoding="utf-8") as out:
+        row = 0
+        for line in f:
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            meta = rec.get("metadata", {})
+            vectors[row] = _normalize(rec["values"])
+            out.write(json.dumps({"id": rec["id"], **{name: meta.get(name) or "unknown" for name in OUTPUT_FIELDS}}) + "\n")
+            row += 1
+    vectors.flush()
+    write_codes(vectors, folder, modes, pq_m, seed)
+    return count
+
+
+def write_codes(vectors, folder, modes=MODES, pq_m=PQ_M, seed=0):
+    """Codes for float originals `vectors` (normalized, possibly memory-mapped)."""
+    count, dim = vectors.shape
+    low = np.full(dim, np.inf, dtype=np.float32)
+    high = np.full(dim, -np.inf, dtype=np.float32)
+    total = np.zeros(dim, dtype=np.float64)
+    for start in range(0, count, CHUNK):
+        block = np.asarray(vectors[start:start + CHUNK])
+        low = np.minimum(low, block.min(0))
+        high = np.maximum(high, block.max(0))
+        total += block.sum(0)
+    mean = (total / count).astype(np.float32)
+
+    if "int8" in modes:
+        # x ~ offset + scale * code, code in [-127, 127]
+        scale = np.maximum((high - low) / 254, 1e-12).astype(np.float32)
+        offset = ((high + low) / 2).astype(np.float32)
+        codes = np.lib.format.open_memmap(os.path.join(folder, "int8.npy"), "w+", np.int8, (count, dim))
+        for start in range(0, count, CHUNK):
+            block = np.asarray(vectors[start:start + CHUNK])
+            codes[start:start + len(block)] = np.clip(np.rint((block - offset) / scale), -127, 127)
+        codes.flush()
+        np.save(os.path.join(folder, "int8_params.npy"), np.stack([scale, offset]))
+
+    if "binary" in modes:
+        # Padded to whole 64-bit words
+        width = (dim + 63) // 64 * 8
+        codes = np.lib.format.open_memmap(os.path.join(folder, "binary.npy"), "w+", np.uint8, (count, width))
+        for start in range(0, count, CHUNK):
+            block = np.asarray(vectors[start:start + CHUNK])
+            bits = np.packbits(block > mean, axis=1)
+            codes[start:start + len(block)] = np.pad(bits, ((0, 0), (0, width - bits.shape[1])))
+        codes.flush()
+        np.save(os.path.join(folder, "binary_mean.npy"), mean)
+
+    if "pq" in modes:
+        rng = np.random.RandomState(seed)
+        sample = np.asarray(vectors[np.sort(rng.choice(count, min(count, PQ_TRAIN), replace=False))])
+        codebooks = train_pq(sample, pq_m, seed=seed)
+        codes = np.lib.format.open_memmap(os.path.join(folder, "pq.npy"), "w+", np.uint8, (pq_m, count))
+        for start in range(0, count, CHUNK):
+            block = pq_encode(np.asarray(vectors[start:start + CHUNK]), codebooks)
+            codes[:, start:start + len(block)] = block.T
+        codes.flush()
+        np.save(os.path.join(folder, "pq_codebooks.npy"), codebooks)
+
+
+class QuantizedCollection:
+    """Compressed codes in memory, float originals memory-mapped for re-scoring."""
+
+    def __init__(self, folder, mode="int8", rerank=RERANK, records=True):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        self.folder = folder
+        self.mode = mode
+        self.rerank = rerank
+        self.vectors = np.load(os.path.join(folder, "vectors.npy"), mmap_mode="r")
+        self.codes = np.load(os.path.join(folder, mode + ".npy"))
+        self.count = len(self.vectors)
+        if mode == "int8":
+            self.scale, self.offset = np.load(os.path.join(folder, "int8_params.npy"))
+        elif mode == "binary":
+            self.mean = np.load(os.path.join(folder, "binary_mean.npy"))
+        else:
+            self.codebooks = np.load(os.path.join(folder, "pq_codebooks.npy"))
+
+        self.ids = []
+        self.fields = {name: [] for name in OUTPUT_FIELDS}
+        if records:
+            with open(os.path.join(folder, "records.jsonl"), "r", encoding="utf-8") as f:
+                for line in f:
+                    rec = json.loads(line)
+                    self.ids.append(rec["id"])
+                    for name in OUTPUT_FIELDS:
+                        self.fields[name].append(rec[name])
+
+    def load(self):
+        pass
+
+    @property
+    def num_entities(self):
+        return self.count
+
+    def bytes_per_vector(self):
+        """Resident bytes per clause: its code plus a share of the codebooks/params."""
+        if self.mode == "int8":
+            extra = self.scale.nbytes + self.offset.nbytes
+        elif self.mode == "binary":
+            extra = self.mean.nbytes
+        else:
+            extra = self.codebooks.nbytes
+        return self.codes.nbytes / max(self.count, 1) + extra / max(self.count, 1)
+
+    def approximate_scores(self, queries):
+        """(queries x clauses) similarity estimates from the codes alone."""
+        scores = np.empty((len(queries), self.count), dtype=np.float32)
+        if self.mode == "int8":
+            weighted = queries * self.scale
+            bias = queries @ self.offset
+            for start in range(0, self.count, CHUNK):
+                block = self.codes[start:start + CHUNK].astype(np.float32)
+                scores[:, start:start + len(block)] = weighted @ block.T + bias[:, None]
+        elif self.mode == "binary":
+            bits = np.packbits(queries > self.mean, axis=1)
+            bits = np.pad(bits, ((0, 0), (0, self.codes.shape[1] - bits.shape[1])))
+            words = self.codes.view(np.uint64)
+            for row, query_words in enumerate(bits.view(np.uint64)):
+                for start in range(0, self.count, CHUNK):
+                    block = words[start:start + CHUNK]
+                    scores[row, start:start + len(block)] = -_popcount(block ^ query_words)
+        else:
+            m, k, sub = self.codebooks.shape
+            tables = np.einsum("qms,mks->qmk", queries.reshape(len(queries), m, sub), self.codebooks)
+            for row, table in enumerate(tables):
+                scores[row] = 0
+                for i in range(m):
+                    scores[row] += table[i].take(self.codes[i])
+        return scores
+
+    def search(self, data, anns_field="embedding", param=None, limit=10, output_fields=None, **kwargs):
+        queries = _normalize(data)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        limit = min(limit, self.count)
+        shortlist = min(self.count, limit * max(self.rerank, 1))
+        output_fields = output_fields or []
+
+        approximate = self.approximate_scores(queries)
+        candidates = np.argpartition(-approximate, shortlist - 1, axis=1)[:, :shortlist]
+
+        results = []
+        for row, rows in enumerate(candidates):
+            rows = np.sort(rows)        # sequential page reads from the memory map
+            exact = np.asarray(self.vectors[rows]) @ queries[row]
+            order = np.argsort(-exact)[:limit]
+            results.append([
+                Hit(self.ids[rows[i]] if self.ids else int(rows[i]), float(exact[i]),
+                    {f: self.fields[f][rows[i]] for f in output_fields if f in self.fields and self.fields[f]})
+                for i in order
+            ])
+        return results
+
+
+def exact_top(vectors, queries, k):
+    """Brute-force float top-k row indices, in CHUNK blocks."""
+    scores = np.empty((len(queries), len(vectors)), dtype=np.float32)
+    for start in range(0, len(vectors), CHUNK):
+        block = np.asarray(vectors[start:start + CHUNK])
+        scores[:, start:start + len(block)] = queries @ block.T
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+
+def synthetic(folder, count, dim=1024, clusters=256, seed=0):
+    """Clustered unit vectors (clause-like: many near-topics) written as vectors.npy."""
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.RandomState(seed)
+    centers = _normalize(rng.randn(clusters, dim))
+    vectors = np.lib.format.open_memmap(os.path.join(folder, "vectors.npy"), "w+", np.float32, (count, dim))
+    for start in range(0, count, CHUNK):
+        n = min(CHUNK, count - start)
+        vectors[start:start + n] = _normalize(centers[rng.randint(clusters, size=n)] + 0.06 * rng.randn(n, dim))
+    vectors.flush()
+    return vectors
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+    import time
+
+    parser = argparse.ArgumentParser(description="Quantized clause vectors")
+    sub = parser.add_subparsers(dest="command", required=True)
+    make = sub.add_parser("build")
+    make.add_argument("source")
+    make.add_argument("folder")
+    make.add_argument("--pq-m", type=int, default=PQ_M)
+    bench = sub.add_parser("bench")
+    bench.add_argument("folder", nargs="?")
+    bench.add_argument("--synthetic", type=int, help="generate this many vectors instead")
+    bench.add_argument("--queries", type=int, default=100)
+    bench.add_argument("--rerank", default="1,4,10,25")
+    bench.add_argument("--noise", type=float, default=0.03, help="queries are perturbed stored vectors")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        count = build(args.source, args.folder, pq_m=args.pq_m)
+        print(f"{count} vectors -> {args.folder} ({time.perf_counter() - start:.1f}s)")
+        raise SystemExit
+
+    folder = args.folder
+    if args.synthetic:
+        folder = tempfile.mkdtemp(prefix="quantized_")
+        start = time.perf_counter()
+        write_codes(synthetic(folder, args.synthetic), folder)
+        print(f"{args.synthetic} synthetic vectors in {folder} ({time.perf_counter() - start:.1f}s)")
+    elif not folder:
+        raise SystemExit("bench needs a folder from `build` or --synthetic N")
+
+    vectors = np.load(os.path.join(folder, "vectors.npy"), mmap_mode="r")
+    rng = np.random.RandomState(1)
+    picks = rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)
+    queries = _normalize(np.asarray(vectors[np.sort(picks)]) + args.noise * rng.randn(len(picks), vectors.shape[1]))
+    k = min(10, len(vectors))
+
+    start = time.perf_counter()
+    truth = np.concatenate([exact_top(vectors, query[None, :], k) for query in queries])
+    float_ms = (time.perf_counter() - start) / len(queries) * 1000
+    print(f"{len(vectors)} vectors, dim {vectors.shape[1]}, {len(queries)} queries\n")
+    print(f"{'mode':8s} {'bytes/vec':>10s} {'rerank':>7s} {'recall@10':>10s} {'ms/query':>9s}")
+    print(f"{'float32':8s} {vectors.shape[1] * 4:10d} {'-':>7s} {1.0:10.3f} {float_ms:9.2f}")
+
+    for mode in MODES:
+        collection = QuantizedCollection(folder, mode, records=False)
+        for rerank in (int(r) for r in args.rerank.split(",")):
+            collection.rerank = rerank
+            found = 0
+            start = time.perf_counter()
+            for query, expected in zip(queries, truth):
+                hits = collection.search([query], limit=k)[0]
+                found += len({h.id for h in hits} & set(expected.tolist()))
+            ms = (time.perf_counter() - start) / len(queries) * 1000
+            print(f"{mode:8s} {collection.bytes_per_vector():10.1f} {rerank:7d} "
+                  f"{found / (len(queries) * k):10.3f} {ms:9.2f}")
@@ -0,0 +1,265 @@
+"""
+Compiled single-pass query analyzer (the fast path of interpret_query).
+
+One regex pass over the query picks up dates, amounts, percentages,
+durations and lexicon terms (categories, weather, delay reasons, damage,
+shipment types, jurisdictions). From those it fills the interpret_query
+schema with a confidence per field; only fields below the threshold are
+sent to the LLM.
+
+    python query_analyzer.py        # skip rate and agreement on ner_dataset.jsonl
+"""
+import os
+import re
+
+THRESHOLD = float(os.environ.get("FAST_PATH_THRESHOLD", 0.7))
+
+# Longer queries hide more than the lexicon knows; trust "absent" less
+SHORT_QUERY_WORDS = 30
+
+CATEGORY_TERMS = {
+    "Penalty": ["penalty", "penalties", "penalised", "penalized", "fine", "fines", "deduction", "deduct",
+                "liquidated damages", "charged"],
+    "Liability": ["liability", "liable", "compensate", "compensation", "reimburse", "claim", "insurance",
+                  "insured", "responsibility"],
+    "Force Majeure": ["force majeure", "act of god", "acts of god", "natural disaster"],
+    "SLA": ["sla", "service level", "on-time", "turnaround", "delivery window", "uptime", "pickup within",
+            "delivered within"],
+    "Pricing": ["surcharge", "surcharges", "rate", "rates", "price", "pricing", "tariff", "cost", "fee",
+                "fees", "invoice", "handling charge", "freight charge"],
+    "Termination": ["terminate", "termination", "cancel the contract", "exit clause"],
+    "Confidentiality": ["confidential", "confidentiality", "nda", "non-disclosure"],
+    "Dispute Resolution": ["dispute", "disputes", "arbitration", "arbitrator", "court", "governed by",
+                           "governing law"],
+    "Definitions": ["define", "definition", "meaning of", "what is meant"],
+    "Exceptions": ["exception", "exceptions", "exclusion", "exempt", "waived", "waiver"],
+}
+
+# Strong cues (multi-word or unambiguous) count double
+STRONG_TERMS = {"penalty", "penalties", "liquidated damages", "force majeure", "act of god", "acts of god",
+                "sla", "service level", "surcharge", "arbitration", "liability", "termination",
+                "confidentiality", "non-disclosure"}
+
+INTENTS = {
+    "Penalty": "penalty_inquiry",
+    "Liability": "liability_inquiry",
+    "Force Majeure": "force_majeure_inquiry",
+    "SLA": "sla_inquiry",
+    "Pricing": "pricing_inquiry",
+    "Termination": "termination_inquiry",
+    "Confidentiality": "confidentiality_inquiry",
+    "Dispute Resolution": "dispute_inquiry",
+    "Definitions": "definition_inquiry",
+    "Exceptions": "exception_inquiry",
+}
+
+WEATHER_TERMS = ["heavy rain", "rain", "rains", "rainfall", "monsoon", "flood", "floods", "flooding",
+                 "flash floods", "cyclone", "storm", "storms", "thunderstorm", "thunderstorms", "fog",
+                 "heavy snow", "snow", "snowfall", "heatwave", "heatwaves", "heat wave", "excessive heat",
+                 "humidity", "high tide", "landslide", "lightning", "extreme weather", "bad weather", "weather"]
+
+DELAY_REASON_TERMS = ["strike", "strikes", "union strike", "protest", "protests", "traffic",
+                      "traffic congestion", "congestion", "port congestion", "breakdown", "vehicle breakdown",
+                      "accident", "road blockage", "road closure", "road closures", "blocked highways",
+                      "customs", "customs clearance", "missing documents", "documentation", "negligence",
+                      "improper handling", "mishandling", "non-compliance", "compliance", "malfunction",
+                      "holiday", "festival", "festive rush", "peak season", "capacity shortage",
+                      "driver shortage", "fuel shortage", "fuel shortages", "disruption", "disruptions",
+                      "border closure", "border closures", "checkpoints", "construction work",
+                      "loose packaging", "packaging"]
+
+DAMAGE_TERMS = ["damage", "damaged", "damages", "broken", "breakage", "water damage", "crushed", "spoiled",
+                "spoilage", "theft", "stolen", "lost", "loss", "leak", "leakage", "contamination",
+                "temperature excursion"]
+
+SHIPMENT_TERMS = ["perishable", "perishables", "fragile", "hazardous", "hazardous-goods", "dangerous goods",
+                  "temperature-controlled", "cold chain", "frozen", "pharmaceuticals", "electronics",
+                  "oversized", "bulk", "container", "parcel", "express", "ftl", "ltl", "reefer"]
+
+EVENT_TERMS = {"delay": ["delay", "delays", "delayed", "late", "overdue", "held up", "stuck"],
+               "damage": ["damage", "damaged", "broken", "spoiled", "crushed"],
+               "loss": ["lost", "theft", "stolen", "missing"],
+               "cancellation": ["cancelled", "canceled", "cancellation"]}
+
+JURISDICTION_TERMS = {"india": "India", "indian": "India", "global": "Global", "international": "Global",
+                      "cross-border": "Global", "uae": "UAE", "us": "USA", "u.s.": "USA", "usa": "USA",
+                      "united states": "USA", "europe": "Europe", "eu": "Europe"}
+
+_PARTY_SUFFIX = r"(?:Logistics|Ltd\.?|Limited|Pvt\.?|Inc\.?|LLP|Corp\.?|Corporation|Express|Shipping|Transport|Carriers|Couriers|Freight)"
+PARTY_PATTERN = re.compile(r"\b(?:[A-Z][\w&.-]*\s+){0,3}" + _PARTY_SUFFIX + r"(?:\s+" + _PARTY_SUFFIX + r")*")
+
+# Sentence starters picked up in front of a party name
+LEADING_WORDS = {"can", "could", "does", "do", "did", "is", "are", "will", "would", "should", "what", "who",
+                 "when", "if", "the", "a", "an", "has", "have"}
+
+# Capitalised words after these are places, not parties
+PLACE_PREFIX = re.compile(r"\b(?:to|from|in|at|near|via|on)\s+$", re.I)
+
+
+def _alternation(terms):
+    return "|".join(re.escape(t) for t in sorted(set(terms), key=len, reverse=True))
+
+
+_TERM_FIELDS = {}
+for _category, _terms in CATEGORY_TERMS.items():
+    for _t in _terms:
+        _TERM_FIELDS.setdefault(_t, []).append(("category", _category))
+for _t in WEATHER_TERMS:
+    _TERM_FIELDS.setdefault(_t, []).append(("weather_condition", _t))
+for _t in DELAY_REASON_TERMS:
+    _TERM_FIELDS.setdefault(_t, []).append(("delay_reason", _t))
+for _t in DAMAGE_TERMS:
+    _TERM_FIELDS.setdefault(_t, []).append(("damage_type", _t))
+for _t in SHIPMENT_TERMS:
+    _TERM_FIELDS.setdefault(_t, []).append(("shipment_type", _t))
+for _event, _terms in EVENT_TERMS.items():
+    for _t in _terms:
+        _TERM_FIELDS.setdefault(_t, []).append(("event", _event))
+for _t, _j in JURISDICTION_TERMS.items():
+    _TERM_FIELDS.setdefault(_t, []).append(("jurisdiction", _j))
+
+# Order matters: amounts before bare years, durations before bare numbers
+QUERY_PATTERN = re.compile(
+    r"(?P<money>(?:Rs\.?|INR|₹|\$)\s?\d+(?:,\d{3})*(?:\.\d+)?\b)"
+    r"|(?P<percent>\b\d{1,3}%)"
+    r"|(?P<duration>\b\d+(?:\s?|-)(?P<unit>hours?|days?|weeks?|months?|years?)\b)"
+    r"|(?P<date>\b(?:\d{1,2}[/-]\d{1,2}[/-]\d{2,4}|\d{4})\b)"
+    r"|(?P<term>(?<![\w-])(?:" + _alternation(_TERM_FIELDS) + r")(?!\w))",
+    re.I
+)
+
+ENTITY_FIELDS = ["event", "shipment_type", "damage_type", "delay_reason", "weather_condition", "party_names"]
+
+
+def analyze(query, threshold=THRESHOLD):
+    """
+    Fast-path interpretation. Returns (result, confidence, missing):
+    `result` has the interpret_query schema (LLM entity fields included),
+    `confidence` maps each field to 0..1 and `missing` lists the fields
+    below `threshold` that should be asked of the LLM.
+    """
+    dates, amounts, percentages, duration = [], [], [], []
+    found = {}
+    category_scores = {}
+
+    for m in QUERY_PATTERN.finditer(query):
+        kind = m.lastgroup if m.lastgroup != "unit" else "duration"
+        if kind == "money":
+            amounts.append(m.group())
+        elif kind == "percent":
+            percentages.append(m.group())
+        elif kind == "duration":
+            duration.append((m.group("duration"), m.group("unit")))
+        elif kind == "date":
+            dates.append(m.group())
+        else:
+            term = m.group().lower()
+            if term == "us" and m.group() != "US":
+                continue  # the pronoun, not the jurisdiction
+            for field, value in _TERM_FIELDS[term]:
+                if field == "category":
+                    weight = 2 if term in STRONG_TERMS else 1
+                    category_scores[value] = category_scores.get(value, 0) + weight
+                else:
+                    found.setdefault(field, [])
+                    if value not in found[field]:
+                        found[field].append(value)
+
+    # Weather is the delay reason when nothing else is named
+    if "weather_condition" in found and "delay_reason" not in found and "delay" in found.get("event", []):
+        found["delay_reason"] = list(found["weather_condition"])
+    if "weather_condition" in found and "Force Majeure" not in category_scores and not category_scores:
+        category_scores["Force Majeure"] = 1
+
+    short = len(query.split()) <= SHORT_QUERY_WORDS
+    absent_confidence = 0.85 if short else 0.5
+    confidence = {}
+
+    # Category / intent: margin between the two best lexicon scores
+    ranked = sorted(category_scores.items(), key=lambda kv: kv[1], reverse=True)
+    if not ranked:
+        category, confidence["category"] = None, 0.0
+    else:
+        category, best = ranked[0]
+        second = ranked[1][1] if len(ranked) > 1 else 0
+        if second == 0:
+            confidence["category"] = 0.95 if best >= 2 else 0.8
+        else:
+            confidence["category"] = round(0.5 + 0.4 * (best - second) / best, 2)
+    confidence["intent"] = confidence["category"]
+
+    jurisdictions = found.pop("jurisdiction", [])
+    confidence["jurisdiction"] = 0.95 if jurisdictions else absent_confidence
+
+    entities = {}
+    for field in ENTITY_FIELDS[:-1]:
+        values = found.get(field)
+        entities[field] = (values[0] if len(values) == 1 else values) if values else None
+        confidence[field] = 0.9 if values else absent_confidence
+
+    parties = []
+    for m in PARTY_PATTERN.finditer(query):
+        words = m.group().split()
+        while words and words[0].lower() in LEADING_WORDS:
+            words.pop(0)
+        parties.append(" ".join(words))
+    entities["party_names"] = parties
+    if parties:
+        confidence["party_names"] = 0.9
+    else:
+        # Capitalised words that are not the first word, a lexicon term or a place may be names
+        unknown_names = [
+            m for m in re.finditer(r"(?<!^)\b[A-Z][a-z]+\b", query)
+            if m.group().lower() not in _TERM_FIELDS and not PLACE_PREFIX.search(query[:m.start()])
+        ]
+        confidence["party_names"] = 0.6 if unknown_names else absent_confidence
+
+    result = {
+        "intent": INTENTS[category] if category else "unknown",
+        "category": category or "unknown",
+        "jurisdiction": jurisdictions[0] if jurisdictions else "Unknown",
+        "entities": {
+            "dates": dates,
+            "amounts": amounts,
+            "percentages": percentages,
+            "duration": duration,
+            **entities
+        },
+        "raw_query": query
+    }
+    missing = [f for f, c in confidence.items() if c < threshold]
+    return result, confidence, missing
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+    import time
+
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dataset", "ner_dataset.jsonl")
+    with open(path, "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+
+    # Presence agreement with the annotated labels (offsets in the file are noisy)
+    checks = {"WEATHER": "weather_condition", "DELAY_REASON": "delay_reason", "AMOUNT": "amounts",
+              "DURATION": "duration"}
+    agree = {label: 0 for label in checks}
+    skip_classify = skip_entities = 0
+
+    start = time.perf_counter()
+    for rec in records:
+        result, confidence, missing = analyze(rec["text"])
+        skip_classify += not ({"intent", "category"} & set(missing))
+        skip_entities += not (set(ENTITY_FIELDS) & set(missing))
+        labels = {e["label"] for e in rec["entities"]}
+        for label, field in checks.items():
+            agree[label] += (label in labels) == bool(result["entities"][field])
+            if "-v" in sys.argv and (label in labels) != bool(result["entities"][field]):
+                print(f"  {label}: {rec['text']} -> {result['entities'][field]}")
+    elapsed = time.perf_counter() - start
+
+    n = len(records)
+    print(f"{n} queries, {elapsed / n * 1e6:.0f} µs/query")
+    print(f"LLM classify skipped: {skip_classify / n:.0%}, LLM entity extraction skipped: {skip_entities / n:.0%}")
+    for label, count in agree.items():
+        print(f"  {label:<13} presence agreement {count / n:.0%}")
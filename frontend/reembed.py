@@ -0,0 +1,309 @@
+"""
+Zero-downtime re-embedding when the embedding model changes.
+
+The backends search SERVING_ALIAS (contract_engine.serving). A migration:
+1. Creates a shadow collection for the new model, with the dimension taken
+   from a probe embedding.
+2. Streams clause texts from the embeddings file, embeds them in batches
+   and inserts them into jurisdiction/category partitions. A Throttle caps
+   the rate and backs off when Ollama slows down, because live queries
+   share it.
+3. Indexes and loads the shadow collection, then checks recall on a
+   sample of clauses.
+4. Points SERVING_ALIAS at the shadow with one atomic alter_alias.
+
+The previous collection stays loaded, so `rollback` is just another alias
+switch. `drop-old` removes collections that are neither serving nor the
+rollback target. Each collection's description records its embedding model,
+dimension and predecessor as JSON. The backends read the model together
+with the collection, so queries are never embedded with the wrong model.
+
+    python reembed.py status
+    python reembed.py migrate nomic-embed-text --rate 20 --sample 200
+    python reembed.py rollback
+    python reembed.py drop-old --yes
+"""
+import argparse
+import json
+import os
+import random
+import re
+import time
+
+import contract_engine
+import ollama_client
+import partitions
+
+try:
+    from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, utility
+except ImportError:
+    Collection = None
+
+EMBEDDINGS_FILE = os.environ.get("EMBEDDINGS_FILE", "embeddings.jsonl")
+
+BATCH_SIZE = 32
+MAX_RATE = 50.0         # texts/s sent to Ollama by the migration
+SLOWDOWN = 1.5          # back off when per-text latency exceeds the best seen by this factor
+SAMPLE_SIZE = 200
+MIN_SELF_RECALL = 0.9   # a clause's own text must find it in the top-k
+
+SCALAR_FIELDS = [("category", 200), ("risk_type", 200), ("jurisdiction", 200), ("summary", 500)]
+INDEX_PARAMS = {"index_type": "IVF_FLAT", "metric_type": "COSINE", "params": {"nlist": 1024}}
+
+
+class Throttle:
+    """
+    Rate limit for background embedding: at most `max_rate` texts/s, halved
+    whenever a batch's per-text latency rises SLOWDOWN x above the best seen
+    (Ollama is busy with live queries), and raised again as latency recovers.
+    """
+
+    def __init__(self, max_rate=MAX_RATE, slowdown=SLOWDOWN):
+        self.max_rate = max_rate
+        self.rate = max_rate
+        self.slowdown = slowdown
+        self.best = None
+        self.next_at = time.monotonic()
+        self.waited = 0.0
+
+    def wait(self, n):
+        now = time.monotonic()
+        if self.next_at > now:
+            time.sleep(self.next_at - now)
+            self.waited += self.next_at - now
+        self.next_at = max(now, self.next_at) + n / self.rate
+
+    def observe(self, n, seconds):
+        per_text = seconds / max(n, 1)
+        if self.best is None or per_text < self.best:
+            self.best = per_text
+        if per_text > self.best * self.slowdown:
+            self.rate = max(self.max_rate / 50, self.rate / 2)
+        else:
+            self.rate = min(self.max_rate, self.rate * 1.25)
+
+
+def _safe(value, default="unknown"):
+    if value is None or value == "":
+        return default
+    return str(value)
+
+
+def read_source(path=EMBEDDINGS_FILE):
+    """Clause records {id, values, metadata} from the notebook's embeddings file."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _batches(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def embed_throttled(texts, model, throttle):
+    throttle.wait(len(texts))
+    start = time.perf_counter()
+    vectors = ollama_client.embed(list(texts), model=model)
+    throttle.observe(len(texts), time.perf_counter() - start)
+    return vectors
+
+
+def shadow_name(model):
+    return f"{contract_engine.COLLECTION_NAME}__{re.sub(r'[^0-9A-Za-z]', '_', model)}__{int(time.time())}"
+
+
+def create_shadow(name, model, dim, previous):
+    fields = [
+        FieldSchema(name="id", dtype=DataType.VARCHAR, max_length=64, is_primary=True),
+        FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=dim),
+    ] + [FieldSchema(name=field, dtype=DataType.VARCHAR, max_length=size) for field, size in SCALAR_FIELDS]
+    info = {"embed_model": model, "dim": dim, "collection": name, "previous": previous, "created": int(time.time())}
+    return Collection(name, CollectionSchema(fields, description=json.dumps(info)))
+
+
+def point_alias(name):
+    """Atomically switch SERVING_ALIAS to `name` (created on the first migration)."""
+    try:
+        utility.alter_alias(name, contract_engine.SERVING_ALIAS)
+    except Exception:
+        utility.create_alias(name, contract_engine.SERVING_ALIAS)
+
+
+def check_recall(new, new_model, old, old_model, sample, top_k=contract_engine.TOP_K, throttle=None):
+    """
+    On sampled (id, text) clauses: self-recall in the new collection (the
+    clause is in its own top-k), overlap@k with the old collection's
+    results, and mean search latency of each.
+    """
+    throttle = throttle or Throttle()
+    hits_self = 0
+    overlap = 0.0
+    seconds = {"new": 0.0, "old": 0.0}
+
+    for batch in _batches(sample, BATCH_SIZE):
+        texts = [text for _, text in batch]
+        new_vectors = embed_throttled(texts, new_model, throttle)
+        old_vectors = embed_throttled(texts, old_model, throttle)
+
+        start = time.perf_counter()
+        new_hits = contract_engine.search_milvus_many(new_vectors, top_k, new)
+        seconds["new"] += time.perf_counter() - start
+        start = time.perf_counter()
+        old_hits = contract_engine.search_milvus_many(old_vectors, top_k, old)
+        seconds["old"] += time.perf_counter() - start
+
+        for (clause_id, _), new_h, old_h in zip(batch, new_hits, old_hits):
+            new_ids = {h["id"] for h in new_h}
+            hits_self += clause_id in new_ids
+            overlap += len(new_ids & {h["id"] for h in old_h}) / top_k
+
+    n = max(len(sample), 1)
+    batches = max((len(sample) + BATCH_SIZE - 1) // BATCH_SIZE, 1)
+    return {
+        "sample": len(sample),
+        "self_recall": hits_self / n,
+        "overlap_with_old": overlap / n,
+        "search_ms_new": seconds["new"] / batches * 1000,
+        "search_ms_old": seconds["old"] / batches * 1000,
+    }
+
+
+def migrate(model, source=EMBEDDINGS_FILE, batch_size=BATCH_SIZE, max_rate=MAX_RATE,
+            sample_size=SAMPLE_SIZE, min_self_recall=MIN_SELF_RECALL, swap=True, seed=0):
+    """Build, verify and (if recall passes) switch to a collection for `model`."""
+    current, info = contract_engine.resolve_serving()
+    dim = len(ollama_client.embed("dimension probe", model=model)[0])
+    name = shadow_name(model)
+    shadow = create_shadow(name, model, dim, previous=info["collection"])
+    print(f"Shadow {name} ({model}, dim {dim}); serving {info['collection']} ({info['embed_model']})")
+
+    throttle = Throttle(max_rate)
+    rng = random.Random(seed)
+    sample = []
+    stats = {"clauses": 0, "embedded": 0, "reused": 0}
+    start = time.perf_counter()
+
+    for batch in _batches(read_source(source), batch_size):
+        # Records already embedded with this model keep their vectors
+        vectors = [
+            r["values"] if r["metadata"].get("embedding_model") == model and len(r["values"]) == dim else None
+            for r in batch
+        ]
+        todo = [i for i, v in enumerate(vectors) if v is None]
+        if todo:
+            for i, vector in zip(todo, embed_throttled([batch[i]["metadata"]["text"] for i in todo], model, throttle)):
+                vectors[i] = vector
+        stats["embedded"] += len(todo)
+        stats["reused"] += len(batch) - len(todo)
+
+        scalars = {
+            field: [_safe(r["metadata"].get(field), "no-summary" if field == "summary" else "unknown") for r in batch]
+            for field, _ in SCALAR_FIELDS
+        }
+        partitions.insert_partitioned(shadow, [[r["id"] for r in batch], vectors] + list(scalars.values()),
+                                      scalars["jurisdiction"], scalars["category"])
+
+        for r in batch:
+            stats["clauses"] += 1
+            if len(sample) < sample_size:
+                sample.append((r["id"], r["metadata"]["text"]))
+            elif rng.random() < sample_size / stats["clauses"]:
+                sample[rng.randrange(sample_size)] = (r["id"], r["metadata"]["text"])
+
+        elapsed = time.perf_counter() - start
+        print(f"  {stats['clauses']} clauses, {stats['clauses'] / elapsed:.1f}/s, "
+              f"throttle {throttle.rate:.1f}/s", end="\r")
+
+    print()
+    shadow.flush()
+    shadow.create_index("embedding", INDEX_PARAMS)
+    shadow.load()
+
+    report = check_recall(shadow, model, current, info["embed_model"], sample, throttle=throttle)
+    report.update(stats, collection=name, seconds=time.perf_counter() - start, throttled_seconds=throttle.waited)
+    report["passed"] = report["self_recall"] >= min_self_recall
+
+    if report["passed"] and swap:
+        point_alias(name)
+        report["serving"] = name
+    else:
+        report["serving"] = info["collection"]
+    return report
+
+
+def rollback():
+    """Point SERVING_ALIAS back at the serving collection's predecessor."""
+    _, info = contract_engine.resolve_serving()
+    previous = info.get("previous")
+    if not previous or not utility.has_collection(previous):
+        raise RuntimeError(f"No rollback target for {info['collection']}")
+    Collection(previous).load()
+    point_alias(previous)
+    return previous
+
+
+def drop_old(confirm=False):
+    """Drop clause collections that are neither serving nor its rollback target."""
+    _, info = contract_engine.resolve_serving()
+    keep = {info["collection"], info.get("previous")}
+    stale = [name for name in utility.list_collections()
+             if name.startswith(contract_engine.COLLECTION_NAME) and name not in keep]
+    for name in stale:
+        if confirm:
+            utility.drop_collection(name)
+    return stale
+
+
+def status():
+    collection, info = contract_engine.resolve_serving()
+    print(f"{contract_engine.SERVING_ALIAS} -> {info['collection']} "
+          f"({info['embed_model']}, {collection.num_entities} clauses)")
+    print(f"  rollback target: {info.get('previous') or '-'}")
+    for name in utility.list_collections():
+        if name.startswith(contract_engine.COLLECTION_NAME) and name != info["collection"]:
+            other = contract_engine.collection_info(Collection(name))
+            print(f"  {name}: {other['embed_model']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Zero-downtime re-embedding")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status")
+    run = sub.add_parser("migrate")
+    run.add_argument("model")
+    run.add_argument("--source", default=EMBEDDINGS_FILE)
+    run.add_argument("--batch", type=int, default=BATCH_SIZE)
+    run.add_argument("--rate", type=float, default=MAX_RATE, help="max texts/s sent to Ollama")
+    run.add_argument("--sample", type=int, default=SAMPLE_SIZE)
+    run.add_argument("--min-recall", type=float, default=MIN_SELF_RECALL)
+    run.add_argument("--no-swap", action="store_true", help="build and check only")
+    sub.add_parser("rollback")
+    drop = sub.add_parser("drop-old")
+    drop.add_argument("--yes", action="store_true", help="drop (default: list only)")
+    args = parser.parse_args()
+
+    if Collection is None:
+        raise SystemExit("pymilvus is required: pip install pymilvus")
+
+    if args.command == "status":
+        status()
+    elif args.command == "migrate":
+        report = migrate(args.model, args.source, args.batch, args.rate, args.sample, args.min_recall,
+                         swap=not args.no_swap)
+        print(json.dumps(report, indent=2))
+        if not report["passed"]:
+            print(f"Self-recall below {args.min_recall}: alias not switched "
+                  f"({report['collection']} kept for inspection, remove with drop-old)")
+    elif args.command == "rollback":
+        print(f"{contract_engine.SERVING_ALIAS} -> {rollback()}")
+    else:
+        stale = drop_old(args.yes)
+        print(("Dropped: " if args.yes else "Would drop (pass --yes): ") + (", ".join(stale) or "nothing"))
@@ -6,9 +6,17 @@ import uuid
 import requests
 from datetime import datetime
 import re
+import time
+
+import metrics
+import tracing
+from contract_engine import ContractEngine, add_ask_routes
+from contract_template import ContractTemplate, clause_key, section_cache
 
 app = Flask(__name__)
 CORS(app)
+metrics.instrument_app(app)
+tracing.instrument_app(app)
 
 # Configuration
 OLLAMA_URL = "http://localhost:11434/api/generate"
@@ -25,6 +33,9 @@ NER_PATTERNS = {
     'FORCE_MAJEURE': ['force majeure', 'act of god', 'natural disaster', 'weather']
 }
 
+contract_engine = ContractEngine()
+add_ask_routes(app, contract_engine)
+
 # Contract clauses database
 CONTRACT_CLAUSES = {
     "penalty_delay": {
@@ -134,12 +145,10 @@ def generate_negotiation_summary(query, clauses):
     
     return summary
 
-def generate_contract(query, entities, clauses):
-    """Generate complete contract"""
-    contract = f"""
+AGREEMENT_TEMPLATE = ContractTemplate("""
 LOGISTICS SERVICE AGREEMENT
 
-This Logistics Service Agreement ("Agreement") is entered into on {datetime.now().strftime('%B %d, %Y')} between [CLIENT NAME] ("Client") and [SERVICE PROVIDER] ("Provider").
+This Logistics Service Agreement ("Agreement") is entered into on {date} between [CLIENT NAME] ("Client") and [SERVICE PROVIDER] ("Provider").
 
 RECITALS
 WHEREAS, Client requires comprehensive logistics and delivery services; and
@@ -162,13 +171,7 @@ Provider shall provide the following logistics services:
 2.4 Special Handling: Temperature-controlled and fragile item protocols
 
 3. SERVICE LEVEL AGREEMENTS AND PENALTIES
-"""
-    
-    # Add relevant clauses
-    for i, clause in enumerate(clauses[:4], 1):
-        contract += f"\n3.{i} {clause['category']}: {clause['text']}\n"
-    
-    contract += """
+{clauses}
 4. PRICING AND PAYMENT TERMS
 4.1 Base Service Fees: As specified in Schedule A attached hereto
 4.2 Fuel Surcharges: Applied monthly based on prevailing fuel costs
@@ -243,10 +246,21 @@ SCHEDULE C - GEOGRAPHIC SERVICE AREAS
 
 [Additional schedules and appendices as needed...]
 
-This contract represents a comprehensive logistics service agreement tailored to your specific requirements regarding {', '.join([e['text'] for e in entities[:3]])}.
-"""
-    
-    return contract.strip()
+This contract represents a comprehensive logistics service agreement tailored to your specific requirements regarding {topics}.
+""")
+
+@section_cache()
+def render_clause_section(clauses):
+    """Render the numbered SLA/penalty clauses for section 3"""
+    return "".join(f"\n3.{i} {category}: {text}\n" for i, (category, text) in enumerate(clauses, 1))
+
+def generate_contract(query, entities, clauses):
+    """Generate complete contract"""
+    return AGREEMENT_TEMPLATE.render(
+        date=datetime.now().strftime('%B %d, %Y'),
+        clauses=render_clause_section(clause_key(clauses, 4)),
+        topics=', '.join([e['text'] for e in entities[:3]])
+    )
 
 @app.route('/')
 def index():
@@ -270,28 +284,34 @@ def analyze_query():
         if not query:
             return jsonify({"error": "Query is required"}), 400
         
+        start = time.perf_counter()
+        
         # 1. Simple NER Analysis
-        entities = simple_ner(query)
+        with tracing.span("ner"):
+            entities = simple_ner(query)
         
         # 2. Find relevant clauses
-        relevant_clauses = find_relevant_clauses(query)
+        with tracing.span("retrieval"):
+            relevant_clauses = find_relevant_clauses(query)
         
         # 3. Generate negotiation summary
-        negotiation_summary = generate_negotiation_summary(query, relevant_clauses)
+        with tracing.span("negotiation"):
+            negotiation_summary = generate_negotiation_summary(query, relevant_clauses)
+        
+        # 4. Generate contract
+        with tracing.span("contract"):
+            contract_text = generate_contract(query, entities, relevant_clauses)
         
-        # 4. Generate final answer
+        # 5. Generate final answer
         final_answer = {
             "summary": f"Successfully analyzed query about contract terms and conditions",
             "entities_found": len(entities),
             "relevant_clauses": len(relevant_clauses),
             "contract_generated": True,
             "confidence": 0.85,
-            "processing_time": "2.3 seconds"
+            "processing_time": f"{time.perf_counter() - start:.3f} seconds"
         }
         
-        # 5. Generate contract
-        contract_text = generate_contract(query, entities, relevant_clauses)
-        
         return jsonify({
             "ner_result": {
                 "entities": entities,
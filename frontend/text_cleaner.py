@@ -0,0 +1,224 @@
+"""
+Streaming, bounded-memory document cleaner.
+
+Documents are read in CHUNK_CHARS blocks of whole lines. Each block gets
+one pass of a precompiled pattern, which removes page footers ("Page 3 of
+12") and copyright lines and turns bullets into "- "; whitespace is then
+collapsed per line by str.split/join. Line breaks are kept (the clause
+segmenter needs them), and runs of blank lines become one. Memory per
+document is one chunk plus the longest line (capped at MAX_LINE_CHARS),
+whatever the document size.
+
+Scraped pages repeat navigation and call-to-action lines ("Log in", "Book a
+demo", "Skip to content") that the scraper leaves in. A BoilerplateTable
+counts, across all documents, how many documents contain each short line.
+Lines found in at least MIN_DOCS documents are dropped in the second pass:
+
+    table = build_table(paths)
+    clean_file(src, dst, table)
+
+    python text_cleaner.py raw_docs_combined/ cleaned_docs/   # throughput and peak memory
+"""
+import os
+import re
+import zlib
+
+CHUNK_CHARS = 1 << 16
+MAX_LINE_CHARS = 1 << 20    # longer "lines" (no line breaks) are cut at whitespace
+
+MIN_DOCS = int(os.environ.get("BOILERPLATE_MIN_DOCS", 3))
+MAX_WORDS = 12              # longer lines are content even when repeated
+MAX_CHARS = 120
+MAX_TABLE = 1_000_000       # distinct lines tracked; singletons are pruned beyond this
+
+# The lookahead lets the engine skip positions no rule can start at
+CLEAN_PATTERN = re.compile(r"(?=[P©•])(?:(?P<page>Page \d+ of \d+)|(?P<copyright>©[^\n]*)|(?P<bullet>•))")
+REPLACEMENTS = {"page": "", "copyright": "", "bullet": "- "}
+
+# Structural markers are never boilerplate, however often they repeat
+MARKER_LINE = re.compile(r"^(?:\(?[0-9ivxlcdm]{1,6}[.)]|\([a-z]{1,5}\)|-|(?:CHAPTER|PART|ARTICLE|SCHEDULE)\b)", re.I)
+_LETTER = re.compile(r"[^\W\d_]")
+BLANK_RUNS = re.compile(r"\n{3,}")
+
+
+def _replace(m):
+    return REPLACEMENTS[m.lastgroup]
+
+
+def read_blocks(f, chunk_chars=CHUNK_CHARS):
+    """Text of a file object in blocks of whole lines (no trailing newline)."""
+    carry = ""
+    while True:
+        chunk = f.read(chunk_chars)
+        if not chunk:
+            break
+        text = carry + chunk
+        cut = text.rfind("\n")
+        if cut == -1:
+            if len(text) <= MAX_LINE_CHARS:
+                carry = text
+                continue
+            # One huge line: cut it at whitespace
+            cut = text.rfind(" ", 0, MAX_LINE_CHARS)
+            cut = cut if cut > 0 else MAX_LINE_CHARS
+        yield text[:cut]
+        carry = text[cut + 1:] if text[cut] == "\n" else text[cut:]
+    yield carry
+
+
+def line_key(line):
+    """Stable 64-bit key of a cleaned line (case-insensitive)."""
+    data = line.casefold().encode("utf-8")
+    return zlib.crc32(data) << 32 | zlib.adler32(data)
+
+
+def is_candidate(line):
+    """Short, wordy, non-structural lines can be boilerplate."""
+    return (0 < len(line) <= MAX_CHARS and len(line.split()) <= MAX_WORDS
+            and _LETTER.search(line) is not None and not MARKER_LINE.match(line))
+
+
+class BoilerplateTable:
+    """Document frequency of candidate lines across a corpus."""
+
+    def __init__(self, min_docs=MIN_DOCS, max_entries=MAX_TABLE):
+        self.min_docs = min_docs
+        self.max_entries = max_entries
+        self.counts = {}
+        self.docs = 0
+
+    def add_document(self, lines):
+        # Every short line is counted; is_candidate only runs on repeated ones
+        seen = {line_key(line) for line in lines if 0 < len(line) <= MAX_CHARS}
+        for key in seen:
+            self.counts[key] = self.counts.get(key, 0) + 1
+        self.docs += 1
+        if len(self.counts) > self.max_entries:
+            self.counts = {k: c for k, c in self.counts.items() if c > 1}
+
+    def is_boilerplate(self, line):
+        return (0 < len(line) <= MAX_CHARS and self.counts.get(line_key(line), 0) >= self.min_docs
+                and is_candidate(line))
+
+    def repeated_lines(self):
+        return sum(1 for c in self.counts.values() if c >= self.min_docs)
+
+
+def block_lines(block):
+    """Cleaned lines of a block: the one regex pass, then whitespace collapsed."""
+    return [" ".join(line.split()) for line in CLEAN_PATTERN.sub(_replace, block).split("\n")]
+
+
+class Cleaner:
+    """
+    Cleans one document block by block: rules applied, boilerplate lines
+    dropped, leading/trailing blank lines removed and runs of blank lines
+    collapsed to one, also across block boundaries.
+    """
+
+    def __init__(self, table=None):
+        self.table = table
+        self.started = False    # text has been written
+        self.blank = False      # a blank line is pending before the next text
+        self.dropped = 0
+
+    def feed(self, block):
+        lines = block_lines(block)
+        if self.table is not None:
+            kept = [line for line in lines if not self.table.is_boilerplate(line)]
+            self.dropped += len(lines) - len(kept)
+            lines = kept
+        text = "\n".join(lines)
+        core = text.strip("\n")
+        if not core:
+            self.blank = self.blank or (self.started and bool(lines))
+            return ""
+        lead = text[0] == "\n"
+        if self.started:
+            core = ("\n\n" if self.blank or lead else "\n") + core
+        self.started = True
+        self.blank = text[-1] == "\n"
+        return BLANK_RUNS.sub("\n\n", core)
+
+
+def clean_text(text, table=None):
+    """Whole-string variant of the streaming cleaner."""
+    return Cleaner(table).feed(text)
+
+
+def build_table(paths, min_docs=MIN_DOCS):
+    """First pass: a BoilerplateTable over the cleaned lines of `paths`."""
+    table = BoilerplateTable(min_docs)
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            table.add_document(line for block in read_blocks(f) for line in block_lines(block))
+    return table
+
+
+def clean_file(src, dst, table=None):
+    """Second pass: stream `src` through the cleaner into `dst`; returns stats."""
+    cleaner = Cleaner(table)
+    written = 0
+    with open(src, "r", encoding="utf-8") as f, open(dst, "w", encoding="utf-8") as out:
+        for block in read_blocks(f):
+            written += out.write(cleaner.feed(block))
+    return {"chars": written, "boilerplate": cleaner.dropped}
+
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+    import time
+    import tracemalloc
+
+    args = [a for a in sys.argv[1:] if a != "-v"]
+    verbose = "-v" in sys.argv
+    src_folder = args[0] if args else "raw_docs_combined"
+    dst_folder = args[1] if len(args) > 1 else tempfile.mkdtemp(prefix="cleaned_")
+    os.makedirs(dst_folder, exist_ok=True)
+    files = sorted(f for f in os.listdir(src_folder) if f.endswith(".txt"))
+    paths = [os.path.join(src_folder, f) for f in files]
+    total_bytes = sum(os.path.getsize(p) for p in paths)
+
+    def whole_document():
+        # The previous cleaner: read everything, six full-text passes
+        for path in paths:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            text = re.sub(r"Page \d+ of \d+", "", text)
+            text = re.sub(r"©[^\n]*", "", text)
+            text = text.replace("•", "- ")
+            text = re.sub(r"[^\S\n]+", " ", text)
+            text = re.sub(r" ?\n ?", "\n", text)
+            re.sub(r"\n{3,}", "\n\n", text).strip()
+
+    def table_pass():
+        return build_table(paths)
+
+    def clean_pass():
+        return {f: clean_file(p, os.path.join(dst_folder, f), table) for f, p in zip(files, paths)}
+
+    table = None
+    for name, run in (("whole-document", whole_document), ("table pass", table_pass), ("clean pass", clean_pass)):
+        start = time.perf_counter()
+        output = run()
+        seconds = time.perf_counter() - start
+        tracemalloc.start()
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{name:15s} {total_bytes / 1e6:7.2f} MB in {seconds:6.2f}s = {total_bytes / 1e6 / seconds:6.1f} MB/s, "
+              f"peak {peak / 1e6:6.2f} MB")
+        table = table or output
+
+    results = output
+    print(f"\n{len(files)} documents, {table.repeated_lines()} short lines in >= {table.min_docs} documents "
+          f"-> {dst_folder}")
+    for f, p in zip(files, paths):
+        stats = results[f]
+        print(f"  {f[:60]:60s} {os.path.getsize(p) / 1024:8.1f} KB -> {stats['chars'] / 1024:8.1f} KB, "
+              f"{stats['boilerplate']:5d} boilerplate lines")
+        if verbose:
+            with open(p, "r", encoding="utf-8") as fh:
+                dropped = {line for block in read_blocks(fh) for line in block_lines(block) if table.is_boilerplate(line)}
+            print(f"      {sorted(dropped)[:40]}")
@@ -0,0 +1,322 @@
+"""
+Per-request tracing and opt-in profiling.
+
+A trace is started for every request (request ID from the X-Request-ID
+header, or a new one) and carried in a context variable, so spans opened
+anywhere below - NER, clause matching, LLM calls, Milvus search - attach to
+it and outgoing calls can forward the ID. Spans also feed metrics.stage.
+
+Sending `X-Profile: cprofile` or `X-Profile: sample` attaches a profiler
+summary and the span tree to a JSON response. Set TRACE_FILE to append every
+finished trace to a JSONL file; `python tracing.py traces.jsonl` turns that
+file into folded stacks for flamegraph.pl / speedscope.
+"""
+import contextvars
+import cProfile
+import io
+import itertools
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+import metrics
+
+TRACE_FILE = os.environ.get("TRACE_FILE")
+REQUEST_ID_HEADER = "X-Request-ID"
+PROFILE_HEADER = "X-Profile"
+SAMPLE_INTERVAL = 0.005
+PROFILE_TOP = 25
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+_dump_lock = threading.Lock()
+
+
+class Trace:
+    """Spans recorded for one request."""
+
+    def __init__(self, name, request_id=None):
+        self.name = name
+        self.request_id = request_id or uuid.uuid4().hex
+        self.start = time.perf_counter()
+        self.wall_start = time.time()
+        self.end = None
+        self.spans = []
+        # Spans may be opened from several threads (ask_batch's pool);
+        # next() on a count is atomic, len(self.spans) before append is not
+        self.span_ids = itertools.count()
+
+    def finish(self):
+        self.end = time.perf_counter()
+        return self
+
+    def to_dict(self):
+        end = self.end or time.perf_counter()
+        return {
+            "request_id": self.request_id,
+            "name": self.name,
+            "timestamp": self.wall_start,
+            "duration_ms": round((end - self.start) * 1000, 3),
+            "spans": [
+                {
+                    "id": s["id"],
+                    "parent": s["parent"],
+                    "name": s["name"],
+                    "start_ms": round((s["start"] - self.start) * 1000, 3),
+                    "duration_ms": round(((s["end"] or end) - s["start"]) * 1000, 3),
+                    "status": s["status"],
+                    **({"attrs": s["attrs"]} if s["attrs"] else {}),
+                }
+                for s in list(self.spans)
+            ],
+        }
+
+
+def start_trace(name, request_id=None):
+    trace = Trace(name, request_id)
+    _current_trace.set(trace)
+    _current_span.set(None)
+    return trace
+
+
+def end_trace():
+    """Detach the current trace (the thread may serve another request next)."""
+    _current_trace.set(None)
+    _current_span.set(None)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def current_request_id():
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+
+def propagation_headers():
+    """Headers that carry the request ID into downstream HTTP calls."""
+    request_id = current_request_id()
+    return {REQUEST_ID_HEADER: request_id} if request_id else {}
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time a block as a child of the current span (and as a metrics stage)."""
+    trace = _current_trace.get()
+    record = None
+    token = None
+
+    if trace is not None:
+        record = {
+            "id": next(trace.span_ids),
+            "parent": _current_span.get(),
+            "name": name,
+            "start": time.perf_counter(),
+            "end": None,
+            "status": "ok",
+            "attrs": attrs,
+        }
+        trace.spans.append(record)
+        token = _current_span.set(record["id"])
+
+    try:
+        with metrics.stage(name):
+            yield record
+    except Exception:
+        if record is not None:
+            record["status"] = "error"
+        raise
+    finally:
+        if record is not None:
+            record["end"] = time.perf_counter()
+            _current_span.reset(token)
+
+
+def dump(trace, path=None):
+    """Append a finished trace to the JSONL trace file."""
+    path = path or TRACE_FILE
+    if not path:
+        return
+    line = json.dumps(trace.to_dict())
+    with _dump_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+# ---------------------------------------------------------------------------
+# Profilers
+# ---------------------------------------------------------------------------
+
+class CProfiler:
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def summary(self, top=PROFILE_TOP):
+        stats = pstats.Stats(self.profile, stream=io.StringIO())
+        rows = []
+        for (filename, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+            rows.append({
+                "function": f"{os.path.basename(filename)}:{line}({func})",
+                "calls": nc,
+                "own_ms": round(tt * 1000, 3),
+                "cumulative_ms": round(ct * 1000, 3),
+            })
+        rows.sort(key=lambda r: r["cumulative_ms"], reverse=True)
+        return {"type": "cprofile", "functions": rows[:top]}
+
+
+class SamplingProfiler:
+    """Samples the request thread's stack every SAMPLE_INTERVAL seconds."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def summary(self, top=PROFILE_TOP):
+        total = sum(self.stacks.values())
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return {
+            "type": "sample",
+            "interval_ms": self.interval * 1000,
+            "samples": total,
+            "hot_frames": [{"frame": f, "samples": c} for f, c in leaves.most_common(top)],
+            "folded": [f"{stack} {count}" for stack, count in self.stacks.most_common(top)],
+        }
+
+
+PROFILERS = {"cprofile": CProfiler, "sample": SamplingProfiler}
+
+
+# ---------------------------------------------------------------------------
+# Flask integration
+# ---------------------------------------------------------------------------
+
+def instrument_app(app):
+    """Trace every request; honour X-Request-ID and X-Profile."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_trace():
+        g._trace = start_trace(request.path, request.headers.get(REQUEST_ID_HEADER))
+        profiler_cls = PROFILERS.get(request.headers.get(PROFILE_HEADER, "").lower())
+        g._profiler = profiler_cls() if profiler_cls else None
+        if g._profiler:
+            g._profiler.start()
+
+    @app.after_request
+    def _finish_request_trace(response):
+        trace = getattr(g, "_trace", None)
+        if trace is None:
+            return response
+
+        profiler = getattr(g, "_profiler", None)
+        if profiler:
+            profiler.stop()
+
+        response.headers[REQUEST_ID_HEADER] = trace.request_id
+        if response.is_streamed:
+            # The body is produced after this hook; finish the trace when it closes
+            response.call_on_close(lambda: dump(trace.finish()))
+            return response
+
+        trace.finish()
+        response.headers["Server-Timing"] = ", ".join(
+            f'{s["name"]};dur={(s["end"] - s["start"]) * 1000:.1f}'
+            for s in trace.spans if s["parent"] is None and s["end"]
+        )
+
+        if profiler and response.is_json:
+            body = response.get_json()
+            if isinstance(body, dict):
+                body["_trace"] = trace.to_dict()
+                body["_profile"] = profiler.summary()
+                response.set_data(json.dumps(body))
+
+        dump(trace)
+        return response
+
+    @app.teardown_request
+    def _clear_request_trace(exc):
+        end_trace()
+
+    return app
+
+
+# ---------------------------------------------------------------------------
+# JSONL → folded stacks (flame graph input)
+# ---------------------------------------------------------------------------
+
+def folded_stacks(path):
+    """Self time per span path across all traces in a JSONL dump, in ms."""
+    folded = Counter()
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            trace = json.loads(line)
+            spans = {s["id"]: s for s in trace["spans"]}
+            child_time = Counter()
+            for s in trace["spans"]:
+                if s["parent"] is not None:
+                    child_time[s["parent"]] += s["duration_ms"]
+
+            root = trace["name"]
+            folded[root] += max(trace["duration_ms"] - sum(s["duration_ms"] for s in trace["spans"] if s["parent"] is None), 0)
+
+            for s in trace["spans"]:
+                names = [s["name"]]
+                parent = s["parent"]
+                while parent is not None:
+                    names.append(spans[parent]["name"])
+                    parent = spans[parent]["parent"]
+                stack = ";".join([root] + list(reversed(names)))
+                folded[stack] += max(s["duration_ms"] - child_time[s["id"]], 0)
+
+    return folded
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("usage: python tracing.py traces.jsonl > traces.folded")
+        sys.exit(1)
+
+    for stack, ms in sorted(folded_stacks(sys.argv[1]).items()):
+        # flamegraph.pl expects integer sample counts; use microseconds
+        print(f"{stack} {int(ms * 1000)}")
@@ -0,0 +1,115 @@
+"""
+In-memory stand-in for the Milvus clause collection.
+
+Loads the embeddings.jsonl written by the notebook ({id, values, metadata})
+and answers Collection.search calls with exact cosine similarity, so the
+backends can run (and be benchmarked) without a Milvus server. Selected by
+VECTOR_BACKEND=memory in contract_engine.
+
+Clauses are grouped into contiguous shards by partitions.partition_name, so
+a search with `partition_names` only scans those shards.
+"""
+import json
+from collections import namedtuple
+
+import numpy as np
+
+import partitions
+
+OUTPUT_FIELDS = ["category", "risk_type", "jurisdiction", "summary"]
+
+Partition = namedtuple("Partition", ["name", "num_entities"])
+
+
+class Hit:
+    """Mimics pymilvus' Hit: .id, .distance and .entity.get(field)."""
+
+    def __init__(self, id, distance, entity):
+        self.id = id
+        self.distance = distance
+        self.entity = entity
+
+
+class InMemoryCollection:
+
+    def __init__(self, ids, vectors, fields, partition_by=partitions.PARTITION_BY):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+
+        names = [partitions.partition_name(j, c, partition_by)
+                 for j, c in zip(fields["jurisdiction"], fields["category"])]
+        order = sorted(range(len(names)), key=names.__getitem__)
+        self.ids = [ids[i] for i in order]
+        self.vectors = vectors[order]
+        self.fields = {name: [values[i] for i in order] for name, values in fields.items()}
+
+        self.shards = {}        # partition -> (start, end) rows
+        for row, i in enumerate(order):
+            start, _ = self.shards.get(names[i], (row, row))
+            self.shards[names[i]] = (start, row + 1)
+
+    @classmethod
+    def from_embeddings_file(cls, path):
+        ids, vectors = [], []
+        fields = {name: [] for name in OUTPUT_FIELDS}
+
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                rec = json.loads(line)
+                meta = rec.get("metadata", {})
+                ids.append(rec["id"])
+                vectors.append(rec["values"])
+                for name in OUTPUT_FIELDS:
+                    fields[name].append(meta.get(name) or "unknown")
+
+        return cls(ids, vectors, fields)
+
+    def load(self):
+        pass
+
+    @property
+    def num_entities(self):
+        return len(self.ids)
+
+    @property
+    def partitions(self):
+        return [Partition(name, end - start) for name, (start, end) in self.shards.items()]
+
+    def has_partition(self, name):
+        return name in self.shards
+
+    def rows(self, partition_names=None):
+        """Rows a search over `partition_names` (None: all) scans."""
+        if partition_names is None:
+            return len(self.ids)
+        return sum(end - start for name, (start, end) in self.shards.items() if name in partition_names)
+
+    def search(self, data, anns_field="embedding", param=None, limit=10, output_fields=None,
+               partition_names=None, **kwargs):
+        queries = np.asarray(data, dtype=np.float32)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        if partition_names is None:
+            rows = np.arange(len(self.ids))
+            scores = queries @ self.vectors.T
+        else:
+            shards = sorted(self.shards[name] for name in set(partition_names) if name in self.shards)
+            rows = np.concatenate([np.arange(start, end) for start, end in shards] or [np.zeros(0, dtype=int)])
+            scores = np.concatenate([queries @ self.vectors[start:end].T for start, end in shards]
+                                    or [np.zeros((len(queries), 0), dtype=np.float32)], axis=1)
+
+        limit = min(limit, len(rows))
+        if limit == 0:
+            return [[] for _ in queries]
+        top = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+        output_fields = output_fields or []
+
+        results = []
+        for row, candidates in enumerate(top):
+            candidates = candidates[np.argsort(-scores[row, candidates])]
+            results.append([
+                Hit(self.ids[i], float(scores[row, c]), {f: self.fields[f][i] for f in output_fields if f in self.fields})
+                for c, i in zip(candidates, rows[candidates])
+            ])
+        return results
@@ -0,0 +1,28 @@
+"""
+WSGI entry point for production serving.
+
+    BACKEND=contract gunicorn -c gunicorn.conf.py wsgi:app
+
+The backend files have hyphenated names, so they are loaded by path. With
+gunicorn's preload_app the import (spaCy model, templates, clause data)
+happens once in the master and is shared copy-on-write by the workers.
+"""
+import importlib.util
+import os
+
+import limits
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKENDS = {"simple": "simple-backend.py", "contract": "contract-backend.py"}
+BACKEND = os.environ.get("BACKEND", "simple")
+
+
+def load_backend(name):
+    spec = importlib.util.spec_from_file_location(name + "_backend", os.path.join(HERE, BACKENDS[name]))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+backend = load_backend(BACKEND)
+app = limits.limit_routes(backend.app)